@@ -1,21 +1,46 @@
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, ORJSONResponse
 
-from core.database import Base, engine
-from app.routers import prediction, auth, users, history_upload, shop, admin, coupon  # Import router mới
+from core.database import Base, async_engine, engine
+from app.routers import prediction, auth, users, history_upload, shop, admin, analytics, coupon  # Import router mới
 from app.models.users import PasswordResetToken
 from app.models.coupon import Coupon
 from app.models.coupon_usage import CouponUsage
+from app.models.mail_outbox import MailOutbox
+from app.models.token_revocation import TokenRevocation
+from app.services.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.services.mail_service import close_connection
+from app.services.password_service import RETRY_AFTER_SECONDS, PasswordHasherBusy
+from app.services.product_search import init_search
+from app.services.rate_limit import RateLimitExceeded, RateLimitMiddleware, rate_limit_response
+from app.services.static_files import CachedStaticFiles
+from app.services.scheduler import SCHEDULER_ENABLED, register_default_jobs, scheduler
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Job định kỳ: trạng thái coupon, recommendations, analytics, đối soát thống kê, gửi email, dọn token
+    if SCHEDULER_ENABLED:
+        register_default_jobs()
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    close_connection()
+    await async_engine.dispose()
+
 def create_app() -> FastAPI:
     # Load env
     load_dotenv()
     app = FastAPI(
         title="LeafSense API",
         description="API for leaf disease detection",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan,
+        # orjson: serialize nhanh hơn json chuẩn, output giống hệt (JSON gọn, UTF-8)
+        default_response_class=ORJSONResponse
     )
 
     # CORS
@@ -23,6 +48,13 @@ def create_app() -> FastAPI:
         os.getenv("FRONTEND_ORIGIN", "http://localhost:5173"), "http://localhost:5174", "http://localhost:3000",
     ]
 
+    # Nén br/gzip các response JSON/text lớn hơn COMPRESSION_MIN_SIZE
+    if COMPRESSION_ENABLED:
+        app.add_middleware(CompressionMiddleware)
+
+    # Giới hạn tần suất (đặt trong CORS để response 429 vẫn có header CORS)
+    app.add_middleware(RateLimitMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=origins,
@@ -39,9 +71,10 @@ def create_app() -> FastAPI:
 
     # DB init (sau khi import models)
     Base.metadata.create_all(bind=engine)
+    init_search(engine)
 
-    # Static files for avatars
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+    # Static files for avatars (Cache-Control, ETag, Range, file nén sẵn)
+    app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
 
     # Routers
     app.include_router(prediction.router)
@@ -50,8 +83,22 @@ def create_app() -> FastAPI:
     app.include_router(history_upload.router, prefix="/api", tags=["History"])
     app.include_router(shop.router, prefix="/api/shop", tags=["Shop"])
     app.include_router(admin.router, prefix="/api", tags=["Admin"])
+    app.include_router(analytics.router, prefix="/api", tags=["Admin Analytics"])
     app.include_router(coupon.router, prefix="/api", tags=["Coupons"])
 
+    # Pool băm mật khẩu quá tải: báo client thử lại thay vì xếp hàng vô hạn
+    @app.exception_handler(PasswordHasherBusy)
+    async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Hệ thống đang bận, vui lòng thử lại sau giây lát"},
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+    @app.exception_handler(RateLimitExceeded)
+    async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+        return rate_limit_response(exc.retry_after)
+
     # Health check
     @app.get("/health")
     def health_check():
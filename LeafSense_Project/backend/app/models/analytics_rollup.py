@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, String, DECIMAL, Float, DateTime, UniqueConstraint, Index
+from core.database import Base
+
+# Các bảng tổng hợp theo bucket thời gian (granularity = "hour" | "day",
+# bucket_start theo giờ Việt Nam). Được ghi bởi analytics_service, endpoint
+# thống kê chỉ đọc các bảng này thay vì GROUP BY trên bảng gốc.
+
+class SalesRollup(Base):
+    __tablename__ = "sales_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    discount_amount = Column(DECIMAL(14, 2), nullable=False, default=0)
+    items_sold = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "status", name="uq_sales_rollups_bucket"),
+    )
+
+class CouponRollup(Base):
+    __tablename__ = "coupon_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    coupon_id = Column(Integer, nullable=False)
+    usage_count = Column(Integer, nullable=False, default=0)
+    discount_total = Column(Float, nullable=False, default=0)
+    order_amount_total = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "coupon_id", name="uq_coupon_rollups_bucket"),
+    )
+
+class PredictionRollup(Base):
+    __tablename__ = "prediction_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    disease_type = Column(String(50), nullable=False)
+    region = Column(String(100), nullable=False)
+    prediction_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "disease_type", "region", name="uq_prediction_rollups_bucket"
+        ),
+        Index("ix_prediction_rollups_disease", "granularity", "disease_type", "bucket_start"),
+    )
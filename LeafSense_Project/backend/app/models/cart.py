@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, DECIMAL, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from core.database import Base
 from datetime import datetime
 
 class Cart(Base):
     __tablename__ = "carts"
+    __table_args__ = (UniqueConstraint("user_id", name="uq_carts_user_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Tổng được tính lại mỗi khi giỏ thay đổi (xem cart_service.refresh_summary)
+    item_count = Column(Integer, nullable=False, default=0)
+    subtotal = Column(DECIMAL(10, 2), nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
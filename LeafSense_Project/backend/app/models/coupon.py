@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Enum, Text, Index, and_, literal_column, text
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 from core.database import Base
 import enum
@@ -12,9 +13,26 @@ class CouponStatusEnum(str, enum.Enum):
     ACTIVE = "active"
     INACTIVE = "inactive"
     EXPIRED = "expired"
+    EXHAUSTED = "exhausted"  # Đã dùng hết total_usage_limit
+
+# Điều kiện của partial index ix_coupons_active, viết đúng như SQL mà
+# Coupon.active_clause() sinh ra cho từng dialect (hằng số, không bind param)
+# để planner chọn được index
+ACTIVE_COUPON_WHERE = {
+    "sqlite": "status = 'ACTIVE' AND is_active = 1",
+    "postgresql": "status = 'ACTIVE' AND is_active",
+}
 
 class Coupon(Base):
     __tablename__ = "coupons"
+    __table_args__ = (
+        # Partial index: danh sách coupon khả dụng chỉ quét các coupon đang ACTIVE
+        Index(
+            "ix_coupons_active", "start_date",
+            sqlite_where=text(ACTIVE_COUPON_WHERE["sqlite"]),
+            postgresql_where=text(ACTIVE_COUPON_WHERE["postgresql"]),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String(50), unique=True, index=True, nullable=False)
@@ -42,14 +60,47 @@ class Coupon(Base):
     status = Column(Enum(CouponStatusEnum), default=CouponStatusEnum.ACTIVE)
     is_active = Column(Boolean, default=True)
     
+    # Đợt phát hành cho mã tạo/nhập hàng loạt (NULL: coupon tạo thủ công)
+    campaign = Column(String(100), index=True)
+    
     # Timestamps
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
+    @classmethod
+    def active_clause(cls):
+        """status == ACTIVE và is_active, viết khớp với partial index ix_coupons_active"""
+        return and_(cls.status == literal_column("'ACTIVE'"), cls.is_active)
+    
+    @staticmethod
+    def normalize_code(code: str) -> str:
+        """Mã lưu và tra cứu ở dạng viết hoa, bỏ khoảng trắng hai đầu"""
+        return code.strip().upper()
+    
+    @validates("code")
+    def _normalize_code(self, key, code):
+        return self.normalize_code(code) if code else code
+    
+    def lifecycle_status(self, now) -> CouponStatusEnum:
+        """Trạng thái theo thời hạn và số lượt dùng (giống job coupon_lifecycle); INACTIVE giữ nguyên"""
+        if self.status not in (CouponStatusEnum.ACTIVE, CouponStatusEnum.EXPIRED, CouponStatusEnum.EXHAUSTED):
+            return self.status
+        if self.end_date < now:
+            return CouponStatusEnum.EXPIRED
+        if self.total_usage_limit and self.total_usage_limit > 0 and (self.current_usage_count or 0) >= self.total_usage_limit:
+            return CouponStatusEnum.EXHAUSTED
+        return CouponStatusEnum.ACTIVE
+    
     def is_valid(self):
         """Kiểm tra coupon có còn hiệu lực không"""
         from datetime import datetime
         
+        if self.is_active and self.status == CouponStatusEnum.EXPIRED:
+            return False, "Mã giảm giá đã hết hạn"
+        
+        if self.is_active and self.status == CouponStatusEnum.EXHAUSTED:
+            return False, "Mã giảm giá đã được sử dụng hết"
+        
         if not self.is_active or self.status != CouponStatusEnum.ACTIVE:
             return False, "Mã giảm giá không khả dụng"
             
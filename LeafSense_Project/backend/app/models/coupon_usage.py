@@ -1,15 +1,23 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
 
 class CouponUsage(Base):
     __tablename__ = "coupon_usages"
+    __table_args__ = (
+        Index("ix_coupon_usages_used_at", "used_at"),
+        # Đếm số lần dùng của user cho một hoặc nhiều coupon
+        Index("ix_coupon_usages_coupon_user", "coupon_id", "user_id"),
+        # Lượt thứ n của một user cho một coupon chỉ được ghi một lần (xem coupon_service)
+        UniqueConstraint("coupon_id", "user_id", "usage_seq", name="uq_coupon_usages_user_seq"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     coupon_id = Column(Integer, ForeignKey("coupons.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    usage_seq = Column(Integer)  # Lượt dùng thứ mấy của user với coupon này (1, 2, ...); NULL nếu không giới hạn mỗi khách
     
     discount_amount = Column(Float, nullable=False)  # Số tiền đã giảm
     order_amount = Column(Float, nullable=False)     # Tổng tiền đơn hàng khi áp dụng
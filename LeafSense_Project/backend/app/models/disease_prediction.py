@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index
 from datetime import datetime
 from core.database import Base
 import pytz
@@ -13,7 +13,17 @@ class DiseasePrediction(Base):
     image_url = Column(String(500), nullable=False)
     # URL của ảnh highlight được lưu trên Firebase
     highlight_image_url = Column(String(500))
+    # URL thumbnail WebP (dùng cho danh sách lịch sử)
+    image_thumbnail_url = Column(String(500))
+    highlight_thumbnail_url = Column(String(500))
     disease_type = Column(String(50))
     confidence = Column(Float)
     treatment_recommendation = Column(Text)
     created_at = Column(DateTime, default=lambda: datetime.now(VN_TZ))
+
+    __table_args__ = (
+        # Lịch sử và gợi ý sản phẩm đều đọc các dự đoán mới nhất của một user
+        Index("ix_disease_predictions_user_created", "user_id", "created_at"),
+        # Thống kê theo thời gian (analytics_service)
+        Index("ix_disease_predictions_created_at", "created_at"),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Index
+from core.database import Base
+from datetime import datetime
+
+class MailOutbox(Base):
+    """Email chờ gửi; worker trong mail_service lấy theo lô và gửi qua một kết nối SMTP dùng lại"""
+    __tablename__ = "mail_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    template = Column(String(100), nullable=False)
+    context = Column(Text, nullable=False, default="{}")  # JSON, dùng để render template khi gửi
+    status = Column(Enum("pending", "sending", "sent", "failed", name="mail_status"), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = Column(String(32), index=True)  # lô đang được một worker gửi
+    last_error = Column(String(500))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_mail_outbox_due", "status", "next_attempt_at"),
+    )
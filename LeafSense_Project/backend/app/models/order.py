@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from core.database import Base
 from datetime import datetime
@@ -11,12 +11,29 @@ class OrderStatus(str, enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+def order_status_value(raw):
+    """Giá trị trạng thái ('pending', ...) từ chuỗi lưu trong DB (tên hoặc giá trị enum)
+
+    Trả về None với trạng thái không còn trong OrderStatus (dữ liệu cũ, ví dụ 'shipped').
+    """
+    if raw is None:
+        return None
+    member = OrderStatus.__members__.get(raw)
+    if member is not None:
+        return member.value
+    return raw if raw in OrderStatus._value2member_map_ else None
+
 class PaymentMethod(str, enum.Enum):
     COD = "COD"
     MOMO = "MoMo"
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Thống kê theo thời gian quét đơn mới/đơn vừa đổi trạng thái
+        Index("ix_orders_created_at", "created_at"),
+        Index("ix_orders_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -31,6 +48,7 @@ class Order(Base):
     shipping_phone = Column(String(20))
     shipping_address = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     shipped_at = Column(DateTime, nullable=True)
     delivered_at = Column(DateTime, nullable=True)
   # Relationships
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DECIMAL, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from core.database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_rating", "avg_rating", "review_count"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -11,10 +14,25 @@ class Product(Base):
     price = Column(DECIMAL(10, 2), nullable=False)
     stock = Column(Integer, default=0)
     image_url = Column(String(255))
+    thumbnail_url = Column(String(255))
     category_id = Column(Integer, ForeignKey("categories.id"))
+
+    # Tổng hợp đánh giá, cập nhật cùng lúc với reviews (xem rating_service)
+    avg_rating = Column(Float, nullable=False, default=0)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1_count = Column(Integer, nullable=False, default=0)
+    rating_2_count = Column(Integer, nullable=False, default=0)
+    rating_3_count = Column(Integer, nullable=False, default=0)
+    rating_4_count = Column(Integer, nullable=False, default=0)
+    rating_5_count = Column(Integer, nullable=False, default=0)
     
     # Relationships
     category = relationship("Category", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
     reviews = relationship("Review", back_populates="product")
-    cart_items = relationship("CartItem", back_populates="product")
\ No newline at end of file
+    cart_items = relationship("CartItem", back_populates="product")
+
+    @property
+    def rating_histogram(self):
+        return {level: getattr(self, f"rating_{level}_count") or 0 for level in range(1, 6)}
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from core.database import Base
+from datetime import datetime
+
+class ProductRecommendation(Base):
+    """Bảng gợi ý sản phẩm đã tính sẵn theo loại bệnh"""
+    __tablename__ = "product_recommendations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Loại bệnh (rust, phoma, ...) hoặc "general" cho gợi ý chung
+    disease_type = Column(String(50), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    product = relationship("Product")
+
+    __table_args__ = (
+        UniqueConstraint("disease_type", "product_id", name="uq_product_recommendations_disease_product"),
+        Index("ix_product_recommendations_disease_rank", "disease_type", "rank"),
+    )
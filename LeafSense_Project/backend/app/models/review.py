@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from core.database import Base
 from datetime import datetime
@@ -20,4 +20,5 @@ class Review(Base):
     # Constraints
     __table_args__ = (
         CheckConstraint('rating >= 1 AND rating <= 5', name='check_rating_range'),
+        Index('ix_reviews_product_created', 'product_id', 'created_at'),
     )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DECIMAL, DateTime
+from core.database import Base
+from datetime import datetime
+
+class StatCounter(Base):
+    """Bộ đếm thống kê được cập nhật tăng dần (số user/order theo trạng thái, doanh thu)"""
+    __tablename__ = "stat_counters"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(DECIMAL(14, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StatCounterDelta(Base):
+    """Thay đổi bộ đếm chưa được cộng vào stat_counters (chỉ chèn thêm, gộp định kỳ)"""
+    __tablename__ = "stat_counter_deltas"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    delta = Column(DECIMAL(14, 2), nullable=False)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Float, Enum
+from core.database import Base
+
+class TokenRevocation(Base):
+    """Thu hồi JWT: một token (jti) hoặc mọi token của user phát hành trước revoked_at
+
+    Các worker đọc bảng theo id tăng dần để đồng bộ danh sách thu hồi trong bộ nhớ.
+    Thời gian lưu dạng epoch (giây, có phần thập phân) để so sánh trực tiếp với iat.
+    """
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(Enum("token", "user", "lock", "unlock", name="revocation_kinds"), nullable=False)
+    value = Column(String(100), nullable=False)  # jti hoặc email
+    revoked_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)  # sau thời điểm này mọi token liên quan đã hết hạn
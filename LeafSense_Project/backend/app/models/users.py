@@ -12,6 +12,7 @@ class User(Base):
     email = Column(String(100), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=True)
     avatar_url = Column(String(250))
+    avatar_thumbnail_url = Column(String(250))
     phone = Column(String(20))
     address = Column(String(255))
     role = Column(Enum("farmer", "admin", name="user_roles"), default="farmer")
@@ -29,10 +30,10 @@ class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    token = Column(String(100), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token = Column(String(100), unique=True, nullable=False)  # unique -> đã có index cho lookup
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
     used = Column(Boolean, default=False)
     
     user = relationship("User", back_populates="reset_tokens")
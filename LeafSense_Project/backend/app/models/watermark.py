@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from core.database import Base
+from datetime import datetime
+
+class Watermark(Base):
+    """Vị trí đã xử lý của các job tổng hợp chạy tăng dần (id/thời điểm cuối cùng)"""
+    __tablename__ = "watermarks"
+
+    name = Column(String(100), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    last_value = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
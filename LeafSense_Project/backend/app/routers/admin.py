@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from decimal import Decimal
+import os
+import uuid
 
-from core.database import get_db
-from core.security import get_current_user, verify_password, get_password_hash
+from core.database import get_async_db, get_db
 from app.models.users import User
 from app.models.product import Product
 from app.models.category import Category
@@ -18,9 +19,19 @@ from app.schemas.admin_schema import (
     OrderResponse, OrderUpdate, DashboardStats
 )
 from app.schemas.user_schema import ChangePassword
+from app.services import cart_service, password_service, product_search, stats_service, token_service
+from app.services.auth_service import get_async_current_user, get_current_user, invalidate_user
+from app.services.catalog_cache import invalidate_catalog
+from app.services.rate_limit import LOGIN_ACCOUNT, login_account_key, rate_limiter
+from app.services.thumbnail_service import save_thumbnail
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
+# Thư mục lưu ảnh sản phẩm upload từ trang admin
+PRODUCT_UPLOAD_DIR = "uploads/products"
+PRODUCT_THUMBNAIL_DIR = os.path.join(PRODUCT_UPLOAD_DIR, "thumbs")
+os.makedirs(PRODUCT_UPLOAD_DIR, exist_ok=True)
+
 # ==================== ADMIN AUTHENTICATION ====================
 
 def get_admin_user(current_user: User = Depends(get_current_user)):
@@ -32,15 +43,32 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+async def get_async_admin_user(current_user: User = Depends(get_async_current_user)):
+    """get_admin_user cho handler async dùng AsyncSession"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin role required."
+        )
+    return current_user
+
 @router.post("/login", response_model=dict)
-def admin_login(login_data: AdminLogin, db: Session = Depends(get_db)):
+async def admin_login(login_data: AdminLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Admin login"""
-    admin = db.query(User).filter(
+    await rate_limiter.enforce(LOGIN_ACCOUNT, login_account_key(request, login_data.email))
+
+    admin = (await db.execute(select(User).where(
         User.email == login_data.email,
         User.role == "admin"
-    ).first()
+    ))).scalar_one_or_none()
     
-    if not admin or not verify_password(login_data.password, admin.password):
+    # Trả connection về pool trong lúc kiểm tra mật khẩu
+    await db.commit()
+
+    valid, new_hash = False, None
+    if admin:
+        valid, new_hash = await password_service.verify_password(login_data.password, admin.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin credentials"
@@ -51,20 +79,14 @@ def admin_login(login_data: AdminLogin, db: Session = Depends(get_db)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin account is inactive"
         )
+
+    # Băm lại mật khẩu nếu cost factor đã thay đổi (hoặc còn là hash SHA-256 cũ)
+    if new_hash:
+        admin.password = new_hash
+        await db.commit()
+        invalidate_user(admin.email)
     
-    from core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-    from datetime import timedelta
-    
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": admin.email}, expires_delta=access_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "admin": admin
-    }
+    return {**token_service.issue_tokens(admin), "admin": admin}
 
 @router.get("/profile", response_model=AdminResponse)
 def get_admin_profile(admin: User = Depends(get_admin_user)):
@@ -85,6 +107,7 @@ def update_admin_profile(
     """Cập nhật thông tin profile admin"""
 
     # Cập nhật thông tin cơ bản
+    old_email = admin.email
     admin.name = name
     admin.email = email
     admin.phone = phone
@@ -92,6 +115,7 @@ def update_admin_profile(
 
     try:
         db.commit()
+        invalidate_user(old_email, admin.email)
         db.refresh(admin)
         return admin
     except Exception as e:
@@ -99,10 +123,10 @@ def update_admin_profile(
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 @router.put("/change-password")
-def change_admin_password(
+async def change_admin_password(
     password_data: ChangePassword,
-    admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin: User = Depends(get_async_admin_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Đổi mật khẩu admin"""
 
@@ -113,24 +137,30 @@ def change_admin_password(
             detail="Không thể thay đổi mật khẩu cho tài khoản đăng nhập bằng Google"
         )
 
-    # Kiểm tra mật khẩu cũ
-    if not verify_password(password_data.old_password, admin.password):
+    # Kiểm tra mật khẩu cũ (trả connection về pool trong lúc băm)
+    await db.commit()
+    valid, _ = await password_service.verify_password(password_data.old_password, admin.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
         )
 
+    # Hash mật khẩu mới (chạy trong pool băm mật khẩu riêng)
+    hashed_password = await password_service.hash_password(password_data.new_password)
+
     try:
-        # Hash và cập nhật mật khẩu
-        hashed_password = get_password_hash(password_data.new_password)
+        # Cập nhật mật khẩu
         admin.password = hashed_password
+        # Đăng xuất mọi phiên đang dùng mật khẩu cũ (kể cả refresh token)
+        token_service.revoke_user(db, admin.email)
 
-        db.commit()
-        db.refresh(admin)
+        await db.commit()
+        invalidate_user(admin.email)
         return {"message": "Admin password changed successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==================== USER MANAGEMENT ====================
@@ -175,11 +205,16 @@ def update_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    old_email, old_status = user.email, user.status
     update_data = user_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(user, field, value)
     
+    # Token cũ mang email/trạng thái cũ trong claims
+    if user.email != old_email or user.status != old_status:
+        token_service.revoke_user(db, old_email, lock=user.status == "inactive")
     db.commit()
+    invalidate_user(old_email, user.email)
     db.refresh(user)
     return user
 
@@ -195,7 +230,10 @@ def toggle_user_status(
         raise HTTPException(status_code=404, detail="User not found")
     
     user.status = "inactive" if user.status == "active" else "active"
+    token_service.revoke_user(db, user.email, lock=user.status == "inactive")
     db.commit()
+    # Khóa có hiệu lực ngay ở worker này, các worker khác sau tối đa TOKEN_REVOCATION_SYNC_INTERVAL giây
+    invalidate_user(user.email)
     
     action = "khóa" if user.status == "inactive" else "mở khóa"
     return {"message": f"Đã {action} tài khoản user thành công", "status": user.status}
@@ -211,8 +249,11 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    email = user.email
     db.delete(user)
+    token_service.revoke_user(db, email)
     db.commit()
+    invalidate_user(email)
     return {"message": "User deleted successfully"}
 
 # ==================== PRODUCT MANAGEMENT ====================
@@ -230,7 +271,7 @@ def get_all_products(
     query = db.query(Product)
     
     if search:
-        query = query.filter(Product.name.contains(search))
+        query = product_search.apply_search(query, search)
     
     if category_id:
         query = query.filter(Product.category_id == category_id)
@@ -255,6 +296,7 @@ def create_product(
     db_product = Product(**product.dict())
     db.add(db_product)
     db.commit()
+    invalidate_catalog()
     db.refresh(db_product)
     return db_product
 
@@ -273,8 +315,56 @@ def update_product(
     update_data = product_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
+
+    # Ảnh đổi sang URL khác thì thumbnail cũ không còn đúng
+    if "image_url" in update_data:
+        product.thumbnail_url = None
+
+    # Giá đổi thì tạm tính của các giỏ đang chứa sản phẩm cũng đổi
+    if "price" in update_data:
+        db.flush()
+        cart_service.refresh_summary(db, product_ids=[product.id])
     
     db.commit()
+    invalidate_catalog()
+    db.refresh(product)
+    return product
+
+@router.post("/products/{product_id}/image", response_model=ProductResponse)
+def upload_product_image(
+    product_id: int,
+    image: UploadFile = File(...),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Upload ảnh product và tạo thumbnail"""
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    if not image.content_type or not image.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image"
+        )
+
+    file_extension = os.path.splitext(image.filename)[1] or ".jpg"
+    basename = str(uuid.uuid4())
+    filename = f"{basename}{file_extension}"
+
+    try:
+        content = image.file.read()
+        with open(os.path.join(PRODUCT_UPLOAD_DIR, filename), "wb") as buffer:
+            buffer.write(content)
+        thumb_name = save_thumbnail(content, PRODUCT_THUMBNAIL_DIR, basename)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not save product image: {e}")
+
+    product.image_url = f"/uploads/products/{filename}"
+    product.thumbnail_url = f"/uploads/products/thumbs/{thumb_name}"
+
+    db.commit()
+    invalidate_catalog()
     db.refresh(product)
     return product
 
@@ -291,6 +381,7 @@ def delete_product(
     
     db.delete(product)
     db.commit()
+    invalidate_catalog()
     return {"message": "Product deleted successfully"}
 
 # ==================== CATEGORY MANAGEMENT ====================
@@ -310,6 +401,7 @@ def create_category(
     db_category = Category(**category.dict())
     db.add(db_category)
     db.commit()
+    invalidate_catalog()
     db.refresh(db_category)
     return db_category
 
@@ -330,6 +422,7 @@ def update_category(
         setattr(category, field, value)
     
     db.commit()
+    invalidate_catalog()
     db.refresh(category)
     return category
 
@@ -354,6 +447,7 @@ def delete_category(
     
     db.delete(category)
     db.commit()
+    invalidate_catalog()
     return {"message": "Category deleted successfully"}
 
 # ==================== ORDER MANAGEMENT ====================
@@ -367,7 +461,7 @@ def get_all_orders(
     db: Session = Depends(get_db)
 ):
     """Lấy danh sách tất cả orders"""
-    query = db.query(Order)
+    query = db.query(Order).options(selectinload(Order.order_items))
     
     if status_filter:
         query = query.filter(Order.status == status_filter)
@@ -377,7 +471,7 @@ def get_all_orders(
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 def get_order(order_id: int, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
     """Lấy thông tin chi tiết order"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = db.query(Order).options(selectinload(Order.order_items)).filter(Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
@@ -406,31 +500,24 @@ def update_order(
 
 @router.get("/dashboard", response_model=DashboardStats)
 def get_dashboard_stats(admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    """Lấy thống kê dashboard"""
-    total_users = db.query(User).filter(User.role == "farmer").count()
-    total_products = db.query(Product).count()
-    total_orders = db.query(Order).count()
-    
-    # Tính tổng doanh thu
-    total_revenue_result = db.query(func.sum(Order.total_amount)).filter(
-        Order.status.in_(["completed", "delivered"])
-    ).scalar()
-    total_revenue = total_revenue_result or Decimal('0')
-    
-    # Đơn hàng chờ xử lý
-    pending_orders = db.query(Order).filter(Order.status == "pending").count()
-    
-    # Users đang hoạt động
-    active_users = db.query(User).filter(
-        User.role == "farmer",
-        User.status == "active"
-    ).count()
+    """Lấy thống kê dashboard (từ bộ đếm tăng dần, một query)"""
+    counters = stats_service.get_counters(db)
     
     return DashboardStats(
-        total_users=total_users,
-        total_products=total_products,
-        total_orders=total_orders,
-        total_revenue=total_revenue,
-        pending_orders=pending_orders,
-        active_users=active_users
+        total_users=sum(int(counters[f"users.{status}"]) for status in stats_service.USER_STATUSES),
+        total_products=int(counters[stats_service.PRODUCTS]),
+        total_orders=sum(int(counters[f"orders.{status}"]) for status in stats_service.ORDER_STATUSES),
+        total_revenue=counters[stats_service.REVENUE],
+        pending_orders=int(counters["orders.pending"]),
+        active_users=int(counters["users.active"])
     )
+
+@router.post("/dashboard/reconcile")
+def reconcile_dashboard_stats(
+    fix: bool = True,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Đối soát bộ đếm dashboard với số liệu thật"""
+    drift = stats_service.reconcile(db, fix=fix)
+    return {"drift": drift, "fixed": bool(drift) and fix}
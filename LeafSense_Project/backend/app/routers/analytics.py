@@ -0,0 +1,97 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, timedelta
+
+from core.database import get_db
+from app.models.users import User
+from app.models.analytics_rollup import CouponRollup, PredictionRollup, SalesRollup
+from app.routers.admin import get_admin_user
+from app.schemas.admin_schema import CouponRollupResponse, PredictionRollupResponse, SalesRollupResponse
+from app.services import analytics_service
+
+router = APIRouter(prefix="/admin/analytics", tags=["Admin Analytics"])
+
+# Khoảng thời gian mặc định và tối đa cho mỗi loại bucket
+DEFAULT_SPAN = {"hour": timedelta(days=2), "day": timedelta(days=30)}
+MAX_SPAN = {"hour": timedelta(days=31), "day": timedelta(days=366 * 3)}
+
+GRANULARITY_PATTERN = "^(hour|day)$"
+
+def _time_range(granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    """Chuẩn hóa khoảng [start, end) theo giờ Việt Nam"""
+    # Tham số có múi giờ được đổi về giờ Việt Nam (naive); tham số naive đã là giờ Việt Nam
+    start = analytics_service._to_local(start, stored_utc=False) if start is not None else None
+    end = analytics_service._to_local(end, stored_utc=False) if end is not None else None
+    if end is None:
+        end = analytics_service.bucket_start(
+            datetime.now(analytics_service.LOCAL_TZ).replace(tzinfo=None), granularity
+        ) + (timedelta(hours=1) if granularity == "hour" else timedelta(days=1))
+    if start is None:
+        start = end - DEFAULT_SPAN[granularity]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > MAX_SPAN[granularity]:
+        raise HTTPException(status_code=400, detail=f"Range too large for granularity '{granularity}'")
+    return start, end
+
+def _schedule_refresh(background_tasks: BackgroundTasks):
+    if analytics_service.needs_refresh():
+        background_tasks.add_task(analytics_service.refresh_in_background)
+
+@router.get("/sales", response_model=List[SalesRollupResponse])
+def get_sales_analytics(
+    background_tasks: BackgroundTasks,
+    granularity: str = Query("day", pattern=GRANULARITY_PATTERN),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Số đơn, doanh thu, giảm giá và số sản phẩm bán theo trạng thái đơn mỗi giờ/ngày"""
+    start, end = _time_range(granularity, start, end)
+    _schedule_refresh(background_tasks)
+    return analytics_service.query_rollups(db, SalesRollup, granularity, start, end, status=status)
+
+@router.get("/coupons", response_model=List[CouponRollupResponse])
+def get_coupon_analytics(
+    background_tasks: BackgroundTasks,
+    granularity: str = Query("day", pattern=GRANULARITY_PATTERN),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    coupon_id: Optional[int] = None,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Số lượt dùng coupon và tổng tiền giảm mỗi giờ/ngày"""
+    start, end = _time_range(granularity, start, end)
+    _schedule_refresh(background_tasks)
+    return analytics_service.query_rollups(db, CouponRollup, granularity, start, end, coupon_id=coupon_id)
+
+@router.get("/predictions", response_model=List[PredictionRollupResponse])
+def get_prediction_analytics(
+    background_tasks: BackgroundTasks,
+    granularity: str = Query("day", pattern=GRANULARITY_PATTERN),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    disease_type: Optional[str] = None,
+    region: Optional[str] = None,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Số lượt dự đoán theo bệnh và vùng mỗi giờ/ngày"""
+    start, end = _time_range(granularity, start, end)
+    _schedule_refresh(background_tasks)
+    return analytics_service.query_rollups(
+        db, PredictionRollup, granularity, start, end, disease_type=disease_type, region=region
+    )
+
+@router.post("/refresh")
+def refresh_analytics(
+    full: bool = False,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Tính lại rollup (full=true để tính lại toàn bộ, ví dụ sau khi xóa dữ liệu)"""
+    return {"refreshed_days": analytics_service.refresh_rollups(db, full=full)}
@@ -1,18 +1,22 @@
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Optional
 from urllib.parse import quote
-from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from authlib.integrations.starlette_client import OAuth
 from fastapi.responses import RedirectResponse
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import smtplib
 
 from app.models.users import User, PasswordResetToken
-from app.schemas.user_schema import UserCreate, UserLogin, UserResponse, Token
-from core.database import get_db
-from core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_password, get_password_hash
+from fastapi.security import HTTPAuthorizationCredentials
+from app.schemas.user_schema import UserCreate, UserLogin, UserResponse, Token, RefreshRequest
+from core.database import get_async_db, get_db
+from app.services import mail_service, password_service, token_service
+from app.services.auth_service import bearer_scheme, invalidate_user
+from app.services.token_service import AccountLocked, InvalidToken
+from app.services.rate_limit import FORGOT_PASSWORD_ACCOUNT, LOGIN_ACCOUNT, login_account_key, rate_limiter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,17 +26,19 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 # Đăng ký
 @router.post("/signup", response_model=UserResponse)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Kiểm tra email tồn tại
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email đã được đăng ký"
         )
-    
-    # Hash password
-    hashed_password = get_password_hash(user.password)
+    # Trả connection về pool trong lúc băm mật khẩu
+    await db.commit()
+
+    # Hash password (chạy trong pool băm mật khẩu riêng)
+    hashed_password = await password_service.hash_password(user.password)
 
     # Tạo user mới
     new_user = User(
@@ -42,17 +48,24 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         provider="normal"  # Đánh dấu đây là tài khoản đăng ký thông thường
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
 
     return new_user
 
 # Đăng nhập
 @router.post("/login", response_model=Token)
-def login(form_data: UserLogin, db: Session = Depends(get_db)):
+async def login(form_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Giới hạn số lần thử theo tài khoản + IP (giới hạn theo IP nằm ở middleware)
+    await rate_limiter.enforce(LOGIN_ACCOUNT, login_account_key(request, form_data.email))
+
     # Tìm user theo email
-    db_user = db.query(User).filter(User.email == form_data.email).first()
-    if not db_user or not verify_password(form_data.password, db_user.password):
+    db_user = (await db.execute(select(User).where(User.email == form_data.email))).scalar_one_or_none()
+    await db.commit()
+
+    valid, new_hash = False, None
+    if db_user:
+        valid, new_hash = await password_service.verify_password(form_data.password, db_user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Sai email hoặc mật khẩu",
@@ -66,17 +79,57 @@ def login(form_data: UserLogin, db: Session = Depends(get_db)):
             detail="Tài khoản của bạn đã bị khóa. Vui lòng liên hệ email leafsensehotro@gmail.com.vn để được mở tài khoản",
         )
 
-    # Tạo access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+    # Băm lại mật khẩu nếu cost factor đã thay đổi
+    if new_hash:
+        db_user.password = new_hash
+        await db.commit()
+        invalidate_user(db_user.email)
+
+    # Tạo access token + refresh token
+    return {**token_service.issue_tokens(db_user), "user": db_user}
+
+# Đổi refresh token lấy cặp token mới (refresh token cũ bị thu hồi)
+@router.post("/refresh", response_model=Token)
+def refresh_tokens(payload: RefreshRequest, db: Session = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
     )
+    try:
+        claims = token_service.authenticate(payload.refresh_token, token_type="refresh")
+    except InvalidToken:
+        raise credentials_exception
+    except AccountLocked:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Tài khoản của bạn đã bị khóa")
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": db_user
-    }
+    user = db.query(User).filter(User.email == claims["sub"]).first()
+    if not user:
+        raise credentials_exception
+    if user.status == "inactive":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Tài khoản của bạn đã bị khóa")
+
+    token_service.revoke_token(db, claims)
+    db.commit()
+    return {**token_service.issue_tokens(user), "user": user}
+
+# Đăng xuất: thu hồi access token hiện tại và refresh token (nếu gửi kèm)
+@router.post("/logout")
+def logout(
+    payload: Optional[RefreshRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+):
+    tokens = [(credentials.credentials, "access")] if credentials else []
+    if payload:
+        tokens.append((payload.refresh_token, "refresh"))
+    for token, token_type in tokens:
+        try:
+            token_service.revoke_token(db, token_service.authenticate(token, token_type=token_type))
+        except (InvalidToken, AccountLocked):
+            continue
+    db.commit()
+    return {"detail": "Logged out"}
 
 # Cấu hình OAuth Google
 
@@ -97,7 +150,7 @@ async def google_login(request: Request):
 
 # === B2: Google callback ===
 @router.get("/google/callback", name="google_callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
+async def google_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         token = await oauth.google.authorize_access_token(request)
         user_info = token.get("userinfo")
@@ -110,7 +163,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         picture = user_info.get("picture")
 
         # 🔍 Kiểm tra hoặc tạo user mới
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
         if not user:
             user = User(
                 name=name,
@@ -122,8 +175,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
                 provider="google"  # Đánh dấu đây là tài khoản Google
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
 
         # Kiểm tra tài khoản có bị khóa không
         if user.status == "inactive":
@@ -132,8 +184,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             return RedirectResponse(url=error_url)
 
         # 🔑 Tạo JWT token
-        expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(data={"sub": user.email}, expires_delta=expires)
+        access_token = token_service.issue_tokens(user)["access_token"]
 
         # ✅ Redirect thẳng về trang chủ
         redirect_url = (
@@ -149,130 +200,96 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         print(f"❌ Lỗi Google OAuth: {e}")
         raise HTTPException(status_code=500, detail=f"Lỗi Google OAuth: {e}")
 
-def send_reset_email(email_to: str, user_name: str, reset_url: str):
-    # Email settings
-    smtp_server = os.getenv("MAIL_SERVER")
-    smtp_port = int(os.getenv("MAIL_PORT", "587"))
-    smtp_username = os.getenv("MAIL_USERNAME")
-    smtp_password = os.getenv("MAIL_PASSWORD")
-
-    # Create message
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = "Đặt Lại Mật Khẩu - LeafSense"
-    msg["From"] = smtp_username
-    msg["To"] = email_to
-
-    # HTML Content
-    html = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <img src="https://i.imgur.com/XYZ123.png" alt="LeafSense Logo" style="max-width: 200px; margin-bottom: 20px;">
-        <div style="background-color: #ffffff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-            <h2 style="color: #2E7D32; margin-bottom: 20px;">Đặt Lại Mật Khẩu</h2>
-            <p style="color: #333333;">Xin chào {user_name},</p>
-            <p style="color: #333333;">Chúng tôi nhận được yêu cầu đặt lại mật khẩu cho tài khoản LeafSense của bạn.</p>
-            <p style="color: #333333;">Vui lòng click vào nút bên dưới để đặt lại mật khẩu:</p>
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{reset_url}" 
-                   style="background-color: #2E7D32; 
-                          color: white; 
-                          padding: 12px 24px; 
-                          text-decoration: none; 
-                          border-radius: 4px;
-                          display: inline-block;">
-                    Đặt Lại Mật Khẩu
-                </a>
-            </div>
-            <p style="color: #666666; font-size: 14px;">Link này sẽ hết hạn sau 1 giờ.</p>
-            <p style="color: #666666; font-size: 14px;">Nếu bạn không yêu cầu đặt lại mật khẩu, vui lòng bỏ qua email này.</p>
-            <hr style="border: none; border-top: 1px solid #eeeeee; margin: 20px 0;">
-            <p style="color: #999999; font-size: 12px;">
-                Trân trọng,<br>
-                Đội ngũ LeafSense
-            </p>
-        </div>
-    </div>
-    """
-
-    msg.attach(MIMEText(html, "html"))
-
-    # Send email
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        raise HTTPException(status_code=500, detail="Error sending email")
-
 @router.post("/forgot-password")
 async def forgot_password(
-    background_tasks: BackgroundTasks,
     email: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == email).first()
+    await rate_limiter.enforce(FORGOT_PASSWORD_ACCOUNT, email.strip().lower())
+
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
     if not user:
         # For security reasons, don't reveal if email exists
         return {"detail": "If the email exists, a password reset link will be sent."}
     
     # Delete any existing unused tokens for this user
-    db.query(PasswordResetToken).filter(
+    await db.execute(delete(PasswordResetToken).where(
         PasswordResetToken.user_id == user.id,
         PasswordResetToken.used == False
-    ).delete()
+    ))
     
     # Create new token
     reset_token = PasswordResetToken(user_id=user.id)
     db.add(reset_token)
-    db.commit()
     
     # Generate reset URL
     frontend_url = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
     reset_url = f"{frontend_url}/reset-password/{reset_token.token}"
     
-    # Send email asynchronously
-    background_tasks.add_task(
-        send_reset_email,
-        email_to=user.email,
-        user_name=user.name,
-        reset_url=reset_url
+    # Xếp email vào outbox cùng transaction với token; worker gửi ngay sau commit
+    mail_service.enqueue_mail(
+        db,
+        to_email=user.email,
+        subject="Đặt Lại Mật Khẩu - LeafSense",
+        template="password_reset.html",
+        context={"user_name": user.name, "reset_url": reset_url}
     )
+    await db.commit()
+    mail_service.notify_worker()
     
     return {"detail": "If the email exists, a password reset link will be sent."}
 
 @router.post("/reset-password/{token}")
-def reset_password(
+async def reset_password(
     token: str,
     new_password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Find valid token
-    token_record = db.query(PasswordResetToken).filter(
-        PasswordResetToken.token == token,
-        PasswordResetToken.used == False,
-        PasswordResetToken.expires_at > datetime.utcnow()
-    ).first()
+    # Đánh dấu token đã dùng bằng một câu UPDATE có điều kiện trước khi băm:
+    # hai request cùng token thì chỉ một request đổi được mật khẩu
+    user_id = (await db.execute(
+        update(PasswordResetToken)
+        .where(
+            PasswordResetToken.token == token,
+            PasswordResetToken.used == False,
+            PasswordResetToken.expires_at > datetime.utcnow()
+        )
+        .values(used=True)
+        .returning(PasswordResetToken.user_id)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
     
-    if not token_record:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token"
         )
     
     # Get user
-    user = db.query(User).filter(User.id == token_record.user_id).first()
+    user = await db.get(User, user_id)
     if not user:
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Update password
-    user.password = get_password_hash(new_password)
-    token_record.used = True
+    # Update password (trả connection về pool trong lúc băm)
+    await db.commit()
+    try:
+        user.password = await password_service.hash_password(new_password)
+    except Exception:
+        # Băm thất bại (pool quá tải...): trả lại token để người dùng thử lại
+        await db.execute(
+            update(PasswordResetToken).where(PasswordResetToken.token == token).values(used=False)
+        )
+        await db.commit()
+        raise
+    # Đăng xuất mọi phiên đang dùng mật khẩu cũ
+    token_service.revoke_user(db, user.email)
     
-    db.commit()
+    await db.commit()
+    invalidate_user(user.email)
     
     return {"detail": "Password has been reset successfully"}
 
@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from datetime import datetime
+import codecs
+import csv
+import io
 
 from core.database import get_db
-from core.security import get_current_user, get_optional_current_user
-from app.models.users import User
+from app.services.auth_service import get_current_principal, get_optional_principal
+from app.services.token_service import Principal
 from app.models.coupon import Coupon, CouponStatusEnum
 from app.models.coupon_usage import CouponUsage
+from app.services import coupon_bulk, coupon_service
+from app.services.coupon_index import coupon_index, invalidate_coupon
 from app.schemas.coupon_schema import (
     CouponCreate, CouponUpdate, CouponResponse, 
     CouponApplyRequest, CouponApplyResponse,
-    AvailableCouponResponse, CouponUsageResponse
+    AvailableCouponResponse, CouponUsageResponse,
+    CouponBulkGenerateRequest, CouponBulkResult
 )
 
 router = APIRouter(prefix="/coupons", tags=["Coupons"])
@@ -22,15 +29,12 @@ router = APIRouter(prefix="/coupons", tags=["Coupons"])
 def validate_coupon(
     request: CouponApplyRequest,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user)
+    current_user: Optional[Principal] = Depends(get_optional_principal)
 ):
     """Validate coupon code and calculate discount (public endpoint)"""
     
-    # Tìm coupon theo code
-    coupon = db.query(Coupon).filter(
-        Coupon.code.ilike(request.coupon_code.strip()),
-        Coupon.is_active == True
-    ).first()
+    # Tìm coupon theo code (đã chuẩn hóa) qua index trong bộ nhớ
+    coupon = coupon_index.lookup(db, request.coupon_code)
     
     if not coupon:
         return CouponApplyResponse(
@@ -48,12 +52,9 @@ def validate_coupon(
     
     # Kiểm tra giới hạn sử dụng per user (nếu user đã đăng nhập)
     if current_user:
-        user_usage_count = db.query(CouponUsage).filter(
-            CouponUsage.coupon_id == coupon.id,
-            CouponUsage.user_id == current_user.id
-        ).count()
+        user_usage_count = coupon_service.user_usage_count(db, coupon.id, current_user.id)
         
-        if user_usage_count >= coupon.usage_limit_per_customer:
+        if coupon.usage_limit_per_customer and user_usage_count >= coupon.usage_limit_per_customer:
             return CouponApplyResponse(
                 valid=False,
                 message=f"Bạn đã sử dụng hết lượt áp dụng mã này (tối đa {coupon.usage_limit_per_customer} lần)"
@@ -80,17 +81,33 @@ def validate_coupon(
 def get_available_coupons(
     order_amount: Optional[float] = Query(None, description="Số tiền đơn hàng để kiểm tra tính khả dụng"),
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user)
+    current_user: Optional[Principal] = Depends(get_optional_principal)
 ):
     """Get list of available coupons"""
     
-    # Lấy tất cả coupon đang hoạt động
-    coupons = db.query(Coupon).filter(
-        Coupon.is_active == True,
-        Coupon.status == CouponStatusEnum.ACTIVE,
-        Coupon.start_date <= datetime.utcnow(),
-        Coupon.end_date >= datetime.utcnow()
-    ).all()
+    # Lấy tất cả coupon đang hoạt động: hết hạn/hết lượt đã được job coupon_lifecycle
+    # chuyển trạng thái, nên chỉ cần lọc theo status (partial index ix_coupons_active)
+    now = datetime.utcnow()
+    coupons = [
+        coupon for coupon in db.query(Coupon).filter(
+            Coupon.active_clause(),
+            Coupon.start_date <= now,
+            # Mã phát hành hàng loạt được gửi riêng cho từng khách, không hiển thị công khai
+            Coupon.campaign.is_(None)
+        ).all()
+        # Coupon vừa hết hạn nhưng job chưa chạy tới
+        if coupon.end_date >= now
+    ]
+    
+    # Số lần user đã dùng từng coupon: một query gộp thay vì COUNT cho mỗi coupon
+    usage_counts = {}
+    if current_user and coupons:
+        usage_counts = dict(
+            db.query(CouponUsage.coupon_id, func.count(CouponUsage.id)).filter(
+                CouponUsage.coupon_id.in_([coupon.id for coupon in coupons]),
+                CouponUsage.user_id == current_user.id
+            ).group_by(CouponUsage.coupon_id).all()
+        )
     
     result = []
     for coupon in coupons:
@@ -104,18 +121,16 @@ def get_available_coupons(
             reason = "Mã giảm giá đã được sử dụng hết"
         
         # Kiểm tra user usage limit (nếu user đã đăng nhập)
-        elif current_user:
-            user_usage_count = db.query(CouponUsage).filter(
-                CouponUsage.coupon_id == coupon.id,
-                CouponUsage.user_id == current_user.id
-            ).count()
-            
-            if user_usage_count >= coupon.usage_limit_per_customer:
-                can_use = False
-                reason = f"Bạn đã sử dụng hết lượt áp dụng mã này"
+        elif (
+            current_user
+            and coupon.usage_limit_per_customer
+            and usage_counts.get(coupon.id, 0) >= coupon.usage_limit_per_customer
+        ):
+            can_use = False
+            reason = f"Bạn đã sử dụng hết lượt áp dụng mã này"
         
         # Kiểm tra minimum order amount (nếu có order_amount)
-        elif order_amount is not None and order_amount < coupon.minimum_order_amount:
+        elif order_amount is not None and order_amount < (coupon.minimum_order_amount or 0):
             can_use = False
             reason = f"Đơn hàng tối thiểu ${coupon.minimum_order_amount}"
         
@@ -142,7 +157,7 @@ def apply_coupon(
     order_amount: float,
     order_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Apply coupon to user's order (requires authentication)"""
     
@@ -150,44 +165,29 @@ def apply_coupon(
     if not coupon:
         raise HTTPException(status_code=404, detail="Coupon not found")
     
+    if coupon.total_usage_limit and coupon.current_usage_count >= coupon.total_usage_limit:
+        raise HTTPException(status_code=409, detail="Mã giảm giá đã được sử dụng hết")
+    
     # Validate coupon
     is_valid, reason = coupon.is_valid()
     if not is_valid:
         raise HTTPException(status_code=400, detail=reason)
     
-    # Check user usage limit
-    user_usage_count = db.query(CouponUsage).filter(
-        CouponUsage.coupon_id == coupon.id,
-        CouponUsage.user_id == current_user.id
-    ).count()
-    
-    if user_usage_count >= coupon.usage_limit_per_customer:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Bạn đã sử dụng hết lượt áp dụng mã này (tối đa {coupon.usage_limit_per_customer} lần)"
-        )
-    
     # Calculate discount
     discount_info = coupon.calculate_discount(order_amount)
     if not discount_info["can_apply"]:
         raise HTTPException(status_code=400, detail=discount_info["reason"])
     
-    # Create usage record
-    usage = CouponUsage(
-        coupon_id=coupon.id,
-        user_id=current_user.id,
-        order_id=order_id,
-        discount_amount=discount_info["discount_amount"],
-        order_amount=order_amount
-    )
-    
-    db.add(usage)
-    
-    # Update coupon usage count
-    coupon.current_usage_count += 1
-    
-    db.commit()
-    db.refresh(usage)
+    # Ghi nhận lượt dùng và tăng bộ đếm nguyên tử; hết lượt thì trả về 409
+    try:
+        usage = coupon_service.redeem_coupon(
+            db, coupon, current_user.id,
+            order_amount=order_amount,
+            discount_amount=discount_info["discount_amount"],
+            order_id=order_id
+        )
+    except coupon_service.CouponConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {
         "message": "Áp dụng mã giảm giá thành công",
@@ -199,11 +199,11 @@ def apply_coupon(
 @router.get("/my-usage", response_model=List[CouponUsageResponse])
 def get_my_coupon_usage(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get current user's coupon usage history"""
     
-    usages = db.query(CouponUsage).filter(
+    usages = db.query(CouponUsage).options(joinedload(CouponUsage.coupon)).filter(
         CouponUsage.user_id == current_user.id
     ).order_by(CouponUsage.used_at.desc()).all()
     
@@ -216,8 +216,9 @@ def get_all_coupons_admin(
     skip: int = 0,
     limit: int = 100,
     status: Optional[CouponStatusEnum] = None,
+    campaign: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all coupons (Admin only)"""
     
@@ -229,27 +230,25 @@ def get_all_coupons_admin(
     if status:
         query = query.filter(Coupon.status == status)
     
+    if campaign:
+        query = query.filter(Coupon.campaign == campaign)
+    
     coupons = query.offset(skip).limit(limit).all()
     return coupons
 
 @router.get("/admin/stats")
 def get_coupon_stats_admin(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get coupon statistics (Admin only)"""
     
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    from sqlalchemy import func
-    
     # Basic stats
     total_coupons = db.query(Coupon).count()
-    active_coupons = db.query(Coupon).filter(
-        Coupon.status == CouponStatusEnum.ACTIVE,
-        Coupon.is_active == True
-    ).count()
+    active_coupons = db.query(Coupon).filter(Coupon.active_clause()).count()
     
     # Usage stats
     total_usage = db.query(func.sum(Coupon.current_usage_count)).scalar() or 0
@@ -285,7 +284,7 @@ def get_coupon_stats_admin(
 def get_coupon_usage_admin(
     coupon_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get usage history for a specific coupon (Admin only)"""
     
@@ -296,7 +295,7 @@ def get_coupon_usage_admin(
     if not coupon:
         raise HTTPException(status_code=404, detail="Coupon not found")
     
-    usages = db.query(CouponUsage).filter(
+    usages = db.query(CouponUsage).options(joinedload(CouponUsage.coupon)).filter(
         CouponUsage.coupon_id == coupon_id
     ).order_by(CouponUsage.used_at.desc()).all()
     
@@ -306,22 +305,24 @@ def get_coupon_usage_admin(
 def create_coupon_admin(
     coupon: CouponCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Create new coupon (Admin only)"""
     
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Check if code already exists
-    existing_coupon = db.query(Coupon).filter(Coupon.code.ilike(coupon.code)).first()
+    # Check if code already exists (code đã được chuẩn hóa bởi schema)
+    existing_coupon = db.query(Coupon).filter(Coupon.code == coupon.code).first()
     if existing_coupon:
         raise HTTPException(status_code=400, detail="Mã giảm giá đã tồn tại")
     
     db_coupon = Coupon(**coupon.dict())
+    db_coupon.status = db_coupon.lifecycle_status(datetime.utcnow())
     db.add(db_coupon)
     db.commit()
     db.refresh(db_coupon)
+    invalidate_coupon(db_coupon.code)
     
     return db_coupon
 
@@ -330,7 +331,7 @@ def update_coupon_admin(
     coupon_id: int,
     coupon_update: CouponUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Update coupon (Admin only)"""
     
@@ -345,8 +346,13 @@ def update_coupon_admin(
     for field, value in update_data.items():
         setattr(coupon, field, value)
     
+    # Đổi hạn dùng/giới hạn lượt thì tính lại EXPIRED/EXHAUSTED (trừ khi admin đặt status)
+    if "status" not in update_data:
+        coupon.status = coupon.lifecycle_status(datetime.utcnow())
+    
     db.commit()
     db.refresh(coupon)
+    invalidate_coupon(coupon.code)
     
     return coupon
 
@@ -354,7 +360,7 @@ def update_coupon_admin(
 def delete_coupon_admin(
     coupon_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Delete coupon (Admin only)"""
     
@@ -370,5 +376,67 @@ def delete_coupon_admin(
     coupon.status = CouponStatusEnum.INACTIVE
     
     db.commit()
+    invalidate_coupon(coupon.code)
+    
+    return {"message": "Coupon deleted successfully"}
+
+@router.post("/admin/bulk-generate", response_model=CouponBulkResult)
+def bulk_generate_coupons_admin(
+    request: CouponBulkGenerateRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Generate many unique random coupon codes for a campaign (Admin only)"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return coupon_bulk.generate_coupons(db, request)
+
+@router.post("/admin/import", response_model=CouponBulkResult)
+def import_coupons_admin(
+    file: UploadFile = File(...),
+    campaign: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Import coupons from a CSV file (Admin only)"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    return {"message": "Coupon deleted successfully"}
\ No newline at end of file
+    # Đọc file theo dòng (utf-8, bỏ BOM của Excel) thay vì nạp toàn bộ vào bộ nhớ
+    lines = codecs.iterdecode(file.file, "utf-8-sig")
+    try:
+        return coupon_bulk.import_csv(db, lines, campaign=campaign)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/admin/campaigns/{campaign}/export")
+def export_campaign_codes_admin(
+    campaign: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Export a campaign's coupon codes as CSV (Admin only)"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    rows = coupon_bulk.campaign_codes(db, campaign)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["code", "current_usage_count", "status"])
+    writer.writerows(
+        (code, count, getattr(coupon_status, "value", coupon_status)) for code, count, coupon_status in rows
+    )
+    
+    filename = campaign.replace('"', "")
+    return Response(
+        content=output.getvalue(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+    )
@@ -4,17 +4,17 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from datetime import datetime
 
-from ..models.users import User
 from ..models.disease_prediction import DiseasePrediction
 from core.database import get_db
-from core.security import get_current_user
+from app.services.auth_service import get_current_principal
+from app.services.token_service import Principal
 
 router = APIRouter()
 
 @router.get("/history")
 def get_history(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     limit: int = Query(50, ge=1, le=100, description="Number of records to return"),
     offset: int = Query(0, ge=0, description="Number of records to skip"),
     disease_filter: Optional[str] = Query(None, description="Filter by disease type")
@@ -63,6 +63,8 @@ def get_history(
                 "id": record.id,
                 "image": record.image_url,
                 "highlight_image": record.highlight_image_url,
+                "thumbnail": record.image_thumbnail_url or record.image_url,
+                "highlight_thumbnail": record.highlight_thumbnail_url or record.highlight_image_url,
                 "disease": record.disease_type or "Unknown",
                 "confidence": confidence_percent,
                 "severity": severity,
@@ -89,7 +91,7 @@ def get_history(
 def get_prediction_detail(
     prediction_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Get detailed information for a specific prediction
@@ -115,6 +117,8 @@ def get_prediction_detail(
             "id": prediction.id,
             "image_url": prediction.image_url,
             "highlight_image_url": prediction.highlight_image_url,
+            "image_thumbnail_url": prediction.image_thumbnail_url,
+            "highlight_thumbnail_url": prediction.highlight_thumbnail_url,
             "disease_type": prediction.disease_type,
             "confidence": confidence_percent,
             "treatment_recommendation": prediction.treatment_recommendation,
@@ -131,7 +135,7 @@ def get_prediction_detail(
 def delete_prediction(
     prediction_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Delete a specific prediction record
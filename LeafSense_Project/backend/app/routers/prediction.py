@@ -1,21 +1,23 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 from ultralytics import YOLO
 from PIL import Image, ImageDraw
+import asyncio
 import io, os, base64
 import logging
 import traceback
 from dotenv import load_dotenv
 import google.generativeai as genai
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from jose import jwt, JWTError
 
-from core.database import get_db
-from core.security import get_current_user
+from core.database import get_async_db
+from app.services.auth_service import get_current_user, get_optional_current_user, get_optional_principal
 from app.models.users import User
+from app.services.token_service import Principal
 from app.models.disease_prediction import DiseasePrediction
-from app.services.firebase_service import upload_pil_image_to_firebase
+from app.services.firebase_service import upload_pil_image_to_firebase, upload_thumbnail_to_firebase
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -103,43 +105,14 @@ def get_treatment_suggestion(disease_name: str, confidence: float) -> str:
     except Exception as e:
         return f"Không thể lấy được giải pháp điều trị. Lỗi: {str(e)}"
 
-# ---- Function: Get optional current user ----
-def get_optional_current_user(
-    db: Session = Depends(get_db),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
-) -> Optional[User]:
-    """Get current user if token is provided, otherwise return None"""
-    
-    if not credentials:
-        return None
-    
-    try:
-        # Manually call get_current_user with the token
-        from core.security import SECRET_KEY, ALGORITHM
-        
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        
-        if email is None:
-            return None
-        
-        user = db.query(User).filter(User.email == email).first()
-        return user
-    except JWTError:
-        return None
-    except Exception:
-        return None
+# ---- Inference (đồng bộ, chạy ngoài event loop) ----
+# Model YOLO không an toàn khi gọi song song từ nhiều thread: dùng một worker riêng
+INFERENCE_WORKERS = 1
+_inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
 
-# ---- API: Analyze Image ----
-@router.post("/analyze")
-async def analyze_image(
-    file: UploadFile = File(...), 
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user),
-    request: Request = None
-):
+def run_inference(contents: bytes):
+    """Phân loại + phân vùng bệnh; trả về (ảnh gốc, ảnh highlight, cls_prediction, seg_predictions, data_uri)"""
     # 1️⃣ Đọc ảnh
-    contents = await file.read()
     original_image = Image.open(io.BytesIO(contents)).convert("RGB")
     image = original_image.copy()  # Tạo copy để xử lý
 
@@ -189,58 +162,91 @@ async def analyze_image(
             except Exception:
                 continue
 
-    # 4️⃣ Gọi Gemini để lấy hướng dẫn điều trị
-    disease_name = cls_prediction["class"]
-    confidence = cls_prediction["confidence"]
-    treatment_suggestion = get_treatment_suggestion(disease_name, confidence)
-
-    # 5️⃣ Chuyển ảnh thành base64
+    # Chuyển ảnh highlight thành base64
     buf = io.BytesIO()
     image.save(buf, format="PNG")
     b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
     data_uri = f"data:image/png;base64,{b64}"
 
-    # 6️⃣ Upload ảnh lên Firebase và lưu vào database (chỉ nếu user đã đăng nhập)
+    return original_image, image, cls_prediction, seg_predictions, data_uri
+
+def upload_prediction_images(original_image: Image.Image, image: Image.Image, user_id: int) -> dict:
+    """Upload ảnh gốc, ảnh highlight và thumbnail WebP lên Firebase"""
+    return {
+        "image_url": upload_pil_image_to_firebase(
+            original_image,
+            folder="originals",
+            filename_prefix=f"original_{user_id}"
+        ),
+        # Ảnh đã được vẽ highlight
+        "highlight_image_url": upload_pil_image_to_firebase(
+            image,
+            folder="highlights",
+            filename_prefix=f"highlight_{user_id}"
+        ),
+        # Thumbnail cho trang lịch sử
+        "image_thumbnail_url": upload_thumbnail_to_firebase(
+            original_image,
+            folder="thumbnails/originals",
+            filename_prefix=f"original_{user_id}"
+        ),
+        "highlight_thumbnail_url": upload_thumbnail_to_firebase(
+            image,
+            folder="thumbnails/highlights",
+            filename_prefix=f"highlight_{user_id}"
+        ),
+    }
+
+# ---- API: Analyze Image ----
+@router.post("/analyze")
+async def analyze_image(
+    file: UploadFile = File(...), 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_optional_principal),
+    request: Request = None
+):
+    contents = await file.read()
+
+    # 1️⃣-3️⃣ Đọc ảnh, phân loại, phân vùng trong worker inference (không chặn event loop)
+    loop = asyncio.get_running_loop()
+    original_image, image, cls_prediction, seg_predictions, data_uri = await loop.run_in_executor(
+        _inference_executor, run_inference, contents
+    )
+
+    # 4️⃣ Gọi Gemini để lấy hướng dẫn điều trị (HTTP đồng bộ: chạy trong thread pool)
+    disease_name = cls_prediction["class"]
+    confidence = cls_prediction["confidence"]
+    treatment_suggestion = await run_in_threadpool(get_treatment_suggestion, disease_name, confidence)
+
+    # 5️⃣ Upload ảnh lên Firebase và lưu vào database (chỉ nếu user đã đăng nhập)
     prediction_record = None
     
     if current_user:
         try:
-            # Upload ảnh gốc lên Firebase
-            original_image_url = upload_pil_image_to_firebase(
-                original_image, 
-                folder="originals", 
-                filename_prefix=f"original_{current_user.id}"
-            )
-            
-            # Upload ảnh highlight lên Firebase
-            highlight_image_url = upload_pil_image_to_firebase(
-                image,  # Ảnh đã được vẽ highlight
-                folder="highlights", 
-                filename_prefix=f"highlight_{current_user.id}"
-            )
+            image_urls = await run_in_threadpool(upload_prediction_images, original_image, image, current_user.id)
             
             # Lưu thông tin vào database
             prediction_record = DiseasePrediction(
                 user_id=current_user.id,
-                image_url=original_image_url,
-                highlight_image_url=highlight_image_url,
                 disease_type=disease_name,
                 confidence=confidence,
-                treatment_recommendation=treatment_suggestion
+                treatment_recommendation=treatment_suggestion,
+                **image_urls
             )
             
             db.add(prediction_record)
-            db.commit()
-            db.refresh(prediction_record)
+            await db.commit()
             
         except Exception as e:
+            logger.error(f"Could not save prediction: {str(e)}")
+            prediction_record = None
             # Rollback nếu có lỗi
             try:
-                db.rollback()
+                await db.rollback()
             except Exception as rollback_error:
                 logger.error(f"Rollback error: {str(rollback_error)}")
 
-    # 7️⃣ Trả về kết quả (cho cả trường hợp đã đăng nhập hoặc chưa)
+    # 6️⃣ Trả về kết quả (cho cả trường hợp đã đăng nhập hoặc chưa)
     response_data = {
         "filename": file.filename,
         "classification": cls_prediction,
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
+from collections import defaultdict
 from decimal import Decimal
 
 from core.database import get_db
@@ -12,45 +15,85 @@ from app.models.order import Order
 from app.models.order_item import OrderItem as OrderItemModel
 from app.models.review import Review
 from app.models.users import User
+from app.services import cart_service, product_search, rating_service, recommendation_service
+from app.services.catalog_cache import cached_json_response, invalidate_catalog, invalidate_products
 from app.schemas.shop_schema import (
     ProductCreate, ProductUpdate, Product as ProductSchema,
     CategoryCreate, Category as CategorySchema,
-    CartItemCreate, CartItemUpdate, Cart as CartSchema,
+    CartItemCreate, CartItemsBulkCreate, CartItemUpdate, Cart as CartSchema, CartSummary,
     OrderCreate, OrderUpdate, Order as OrderSchema,
     ReviewCreate, ReviewUpdate, Review as ReviewSchema,
-    CartItem as CartItemSchema,
+    CartItem as CartItemSchema, ProductSort,
 )
 
 router = APIRouter()
 
+# Eager loading cho các schema lồng nhau (Product.category, CartItem.product,
+# Order.order_items) để serialize danh sách với số query cố định, tránh N+1.
+# Tạo option khi gọi (không phải lúc import) để mapper được cấu hình đủ model.
+def product_options():
+    return (joinedload(Product.category),)
+
+def cart_options():
+    return (selectinload(Cart.cart_items).joinedload(CartItemModel.product).joinedload(Product.category),)
+
+def cart_item_options():
+    return (joinedload(CartItemModel.product).joinedload(Product.category),)
+
+def order_options():
+    return (selectinload(Order.order_items).joinedload(OrderItemModel.product).joinedload(Product.category),)
+
+# Sắp xếp dựa trên cột tổng hợp trên products, không đọc bảng reviews
+def product_ordering(sort_by: ProductSort):
+    if sort_by == ProductSort.RATING:
+        return (Product.avg_rating.desc(), Product.review_count.desc(), Product.id)
+    if sort_by == ProductSort.REVIEWS:
+        return (Product.review_count.desc(), Product.avg_rating.desc(), Product.id)
+    if sort_by == ProductSort.PRICE_ASC:
+        return (Product.price, Product.id)
+    return (Product.price.desc(), Product.id)
+
 # ==================== PRODUCT ENDPOINTS ====================
 
 @router.get("/products", response_model=List[ProductSchema])
 def get_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     category_id: Optional[int] = None,
     search: Optional[str] = None,
+    sort_by: Optional[ProductSort] = None,
     db: Session = Depends(get_db)
 ):
-    """Get list of products with optional filtering"""
-    query = db.query(Product)
-    
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-    
-    if search:
-        query = query.filter(Product.name.contains(search))
-    
-    return query.offset(skip).limit(limit).all()
+    """Get list of products with optional filtering and sorting"""
+    def build():
+        query = db.query(Product).options(*product_options())
+        
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        
+        if search:
+            query = product_search.apply_search(query, search)
+        
+        if sort_by:
+            # Thay thứ tự theo độ liên quan (nếu có) bằng thứ tự được chọn
+            query = query.order_by(None).order_by(*product_ordering(sort_by))
+        
+        return [ProductSchema.model_validate(p) for p in query.offset(skip).limit(limit).all()]
+
+    key = ("products", skip, limit, category_id, search, sort_by)
+    return cached_json_response(request, key, build)
 
 @router.get("/products/{product_id}", response_model=ProductSchema)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, request: Request, db: Session = Depends(get_db)):
     """Get product details by ID"""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    def build():
+        product = db.query(Product).options(*product_options()).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return ProductSchema.model_validate(product)
+
+    return cached_json_response(request, ("product", product_id), build)
 
 @router.post("/products", response_model=ProductSchema)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
@@ -58,6 +101,7 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     db_product = Product(**product.dict())
     db.add(db_product)
     db.commit()
+    invalidate_catalog()
     db.refresh(db_product)
     return db_product
 
@@ -75,8 +119,18 @@ def update_product(
     update_data = product_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
+
+    # Ảnh đổi sang URL khác thì thumbnail cũ không còn đúng
+    if "image_url" in update_data:
+        product.thumbnail_url = None
+
+    # Giá đổi thì tạm tính của các giỏ đang chứa sản phẩm cũng đổi
+    if "price" in update_data:
+        db.flush()
+        cart_service.refresh_summary(db, product_ids=[product.id])
     
     db.commit()
+    invalidate_catalog()
     db.refresh(product)
     return product
 
@@ -89,14 +143,18 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
     
     db.delete(product)
     db.commit()
+    invalidate_catalog()
     return {"message": "Product deleted successfully"}
 
 # ==================== CATEGORY ENDPOINTS ====================
 
 @router.get("/categories", response_model=List[CategorySchema])
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_db)):
     """Get all categories"""
-    return db.query(Category).all()
+    def build():
+        return [CategorySchema.model_validate(c) for c in db.query(Category).all()]
+
+    return cached_json_response(request, ("categories",), build)
 
 @router.post("/categories", response_model=CategorySchema)
 def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
@@ -104,6 +162,7 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
     db_category = Category(**category.dict())
     db.add(db_category)
     db.commit()
+    invalidate_catalog()
     db.refresh(db_category)
     return db_category
 
@@ -112,15 +171,48 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
 @router.get("/cart", response_model=CartSchema)
 def get_cart(user_id: int = Query(...), db: Session = Depends(get_db)):
     """Get user's cart"""
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+    cart = db.query(Cart).options(*cart_options()).filter(Cart.user_id == user_id).first()
     if not cart:
         # Create cart if it doesn't exist
-        cart = Cart(user_id=user_id)
-        db.add(cart)
+        cart_service.ensure_cart(db, user_id)
         db.commit()
-        db.refresh(cart)
+        cart = db.query(Cart).options(*cart_options()).filter(Cart.user_id == user_id).first()
     return cart
 
+@router.get("/cart/summary", response_model=CartSummary)
+def get_cart_summary(user_id: int = Query(...), db: Session = Depends(get_db)):
+    """Get item count and subtotal of user's cart (for the header badge)"""
+    return cart_service.get_summary(db, user_id)
+
+def _merge_cart_items(items: List[CartItemCreate]) -> dict:
+    quantities = defaultdict(int)
+    for item in items:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
+        quantities[item.product_id] += item.quantity
+    if not quantities:
+        raise HTTPException(status_code=400, detail="No items to add")
+    return quantities
+
+def _add_items_to_cart(db: Session, user_id: int, items: List[CartItemCreate]) -> int:
+    """Upsert các sản phẩm vào giỏ và tính lại tổng, commit một lần"""
+    quantities = _merge_cart_items(items)
+    try:
+        cart_id = cart_service.ensure_cart(db, user_id)
+        added = cart_service.add_items(db, cart_id, quantities)
+        missing = set(quantities) - set(added)
+        if missing:
+            db.rollback()
+            raise HTTPException(status_code=404, detail=f"Products not found: {sorted(missing)}")
+        cart_service.refresh_summary(db, cart_ids=[cart_id])
+        db.commit()
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return cart_id
+
 @router.post("/cart/items", response_model=CartItemSchema)
 def add_to_cart(
     cart_item: CartItemCreate,
@@ -128,35 +220,21 @@ def add_to_cart(
     db: Session = Depends(get_db)
 ):
     """Add item to cart"""
-    # Get or create cart
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if not cart:
-        cart = Cart(user_id=user_id)
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-    
-    # Check if item already exists in cart
-    existing_item = db.query(CartItemModel).filter(
-        CartItemModel.cart_id == cart.id,
+    cart_id = _add_items_to_cart(db, user_id, [cart_item])
+    return db.query(CartItemModel).options(*cart_item_options()).filter(
+        CartItemModel.cart_id == cart_id,
         CartItemModel.product_id == cart_item.product_id
     ).first()
-    
-    if existing_item:
-        existing_item.quantity += cart_item.quantity
-        db.commit()
-        db.refresh(existing_item)
-        return existing_item
-    else:
-        new_item = CartItemModel(
-            cart_id=cart.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity
-        )
-        db.add(new_item)
-        db.commit()
-        db.refresh(new_item)
-        return new_item
+
+@router.post("/cart/items/bulk", response_model=CartSchema)
+def add_many_to_cart(
+    payload: CartItemsBulkCreate,
+    user_id: int = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Add several items to cart in one request"""
+    cart_id = _add_items_to_cart(db, user_id, payload.items)
+    return db.query(Cart).options(*cart_options()).filter(Cart.id == cart_id).first()
 
 @router.put("/cart/items/{item_id}", response_model=CartItemSchema)
 def update_cart_item(
@@ -165,83 +243,120 @@ def update_cart_item(
     db: Session = Depends(get_db)
 ):
     """Update cart item quantity"""
-    cart_item = db.query(CartItemModel).filter(CartItemModel.id == item_id).first()
-    if not cart_item:
+    if cart_item_update.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
+    
+    cart_id = db.execute(
+        update(CartItemModel)
+        .where(CartItemModel.id == item_id)
+        .values(quantity=cart_item_update.quantity)
+        .returning(CartItemModel.cart_id)
+    ).scalar()
+    if cart_id is None:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    cart_item.quantity = cart_item_update.quantity
+    cart_service.refresh_summary(db, cart_ids=[cart_id])
     db.commit()
-    db.refresh(cart_item)
-    return cart_item
+    return db.query(CartItemModel).options(*cart_item_options()).filter(CartItemModel.id == item_id).first()
 
 @router.delete("/cart/items/{item_id}")
 def remove_from_cart(item_id: int, db: Session = Depends(get_db)):
     """Remove item from cart"""
-    cart_item = db.query(CartItemModel).filter(CartItemModel.id == item_id).first()
-    if not cart_item:
+    cart_id = cart_service.remove_item(db, item_id)
+    if cart_id is None:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    db.delete(cart_item)
+    cart_service.refresh_summary(db, cart_ids=[cart_id])
     db.commit()
     return {"message": "Item removed from cart"}
 
 @router.delete("/cart")
 def clear_cart(user_id: int = Query(...), db: Session = Depends(get_db)):
     """Clear user's cart"""
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if cart:
-        db.query(CartItemModel).filter(CartItemModel.cart_id == cart.id).delete()
-        db.commit()
+    cart_service.clear_items(db, user_id)
+    db.commit()
     return {"message": "Cart cleared"}
 
 # ==================== ORDER ENDPOINTS ====================
 
 @router.post("/orders", response_model=OrderSchema)
 def create_order(order: OrderCreate, user_id: int = Query(...), db: Session = Depends(get_db)):
-    """Create new order"""
-    # Calculate total amount
-    total_amount = sum(item.price * item.quantity for item in order.order_items)
+    """Create new order in one transaction, reserving stock"""
+    # Gộp số lượng theo sản phẩm (client có thể gửi trùng product_id)
+    quantities = defaultdict(int)
+    for item in order.order_items:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
+        quantities[item.product_id] += item.quantity
+    if not quantities:
+        raise HTTPException(status_code=400, detail="Order must contain at least one item")
     
-    # Create order
-    db_order = Order(
-        user_id=user_id,
-        total_amount=total_amount,
-        payment_method=order.payment_method,
-        shipping_name=order.shipping_name,
-        shipping_phone=order.shipping_phone,
-        shipping_address=order.shipping_address
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    # Giá lấy từ database, không tin giá client gửi lên
+    prices = dict(db.query(Product.id, Product.price).filter(Product.id.in_(quantities)).all())
+    missing = set(quantities) - set(prices)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {sorted(missing)}")
     
-    # Create order items
-    for item in order.order_items:
-        order_item = OrderItemModel(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
+    try:
+        # Trừ kho có điều kiện cho tất cả sản phẩm trong một câu UPDATE;
+        # nếu có sản phẩm không đủ hàng thì số dòng cập nhật sẽ thiếu
+        reserved = case(quantities, value=Product.id)
+        result = db.execute(
+            update(Product)
+            .where(Product.id.in_(quantities), Product.stock >= reserved)
+            .values(stock=Product.stock - reserved)
+            .execution_options(synchronize_session=False)
         )
-        db.add(order_item)
-    
-    # Clear user's cart after order creation
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if cart:
-        db.query(CartItemModel).filter(CartItemModel.cart_id == cart.id).delete()
+        if result.rowcount != len(quantities):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Insufficient stock for one or more products")
+        
+        total_amount = sum(prices[product_id] * quantity for product_id, quantity in quantities.items())
+        db_order = Order(
+            user_id=user_id,
+            total_amount=total_amount,
+            original_amount=total_amount,
+            payment_method=order.payment_method,
+            shipping_name=order.shipping_name,
+            shipping_phone=order.shipping_phone,
+            shipping_address=order.shipping_address
+        )
+        db.add(db_order)
+        db.flush()
+        
+        db.execute(insert(OrderItemModel), [
+            {
+                "order_id": db_order.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": prices[product_id],
+            }
+            for product_id, quantity in quantities.items()
+        ])
+        
+        # Clear user's cart after order creation
+        cart_service.clear_items(db, user_id)
+        
+        db.commit()
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
     
-    db.commit()
-    return db_order
+    # Chỉ tồn kho thay đổi: xóa cache chi tiết của các sản phẩm trong đơn
+    invalidate_products(quantities)
+    return db.query(Order).options(*order_options()).filter(Order.id == db_order.id).first()
 
 @router.get("/orders", response_model=List[OrderSchema])
 def get_user_orders(user_id: int = Query(...), db: Session = Depends(get_db)):
     """Get user's orders"""
-    return db.query(Order).filter(Order.user_id == user_id).all()
+    return db.query(Order).options(*order_options()).filter(Order.user_id == user_id).all()
 
 @router.get("/orders/{order_id}", response_model=OrderSchema)
 def get_order(order_id: int, db: Session = Depends(get_db)):
     """Get order details"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = db.query(Order).options(*order_options()).filter(Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
@@ -262,14 +377,16 @@ def update_order(
         setattr(order, field, value)
     
     db.commit()
-    db.refresh(order)
-    return order
+    return db.query(Order).options(*order_options()).filter(Order.id == order_id).first()
 
 # ==================== REVIEW ENDPOINTS ====================
 
 @router.post("/reviews", response_model=ReviewSchema)
 def create_review(review: ReviewCreate, user_id: int = Query(...), db: Session = Depends(get_db)):
     """Create product review"""
+    if not db.query(Product.id).filter(Product.id == review.product_id).first():
+        raise HTTPException(status_code=404, detail="Product not found")
+    
     db_review = Review(
         user_id=user_id,
         product_id=review.product_id,
@@ -277,14 +394,29 @@ def create_review(review: ReviewCreate, user_id: int = Query(...), db: Session =
         comment=review.comment
     )
     db.add(db_review)
+    rating_service.apply_review_change(db, review.product_id, added=review.rating)
     db.commit()
+    invalidate_catalog()
     db.refresh(db_review)
     return db_review
 
 @router.get("/products/{product_id}/reviews", response_model=List[ReviewSchema])
-def get_product_reviews(product_id: int, db: Session = Depends(get_db)):
-    """Get product reviews"""
-    return db.query(Review).filter(Review.product_id == product_id).all()
+def get_product_reviews(
+    product_id: int,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get product reviews, newest first (total in X-Total-Count header)"""
+    review_count = db.query(Product.review_count).filter(Product.id == product_id).scalar()
+    if review_count is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    response.headers["X-Total-Count"] = str(review_count)
+    
+    return db.query(Review).filter(Review.product_id == product_id).order_by(
+        Review.created_at.desc(), Review.id.desc()
+    ).offset(skip).limit(limit).all()
 
 @router.put("/reviews/{review_id}", response_model=ReviewSchema)
 def update_review(
@@ -297,11 +429,15 @@ def update_review(
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     
+    old_rating = review.rating
     update_data = review_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(review, field, value)
     
+    if review.rating != old_rating:
+        rating_service.apply_review_change(db, review.product_id, added=review.rating, removed=old_rating)
     db.commit()
+    invalidate_catalog()
     db.refresh(review)
     return review
 
@@ -312,23 +448,31 @@ def delete_review(review_id: int, db: Session = Depends(get_db)):
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     
+    rating_service.apply_review_change(db, review.product_id, removed=review.rating)
     db.delete(review)
     db.commit()
+    invalidate_catalog()
     return {"message": "Review deleted successfully"}
 
 # ==================== RECOMMENDATION ENDPOINTS ====================
 
 @router.get("/recommendations", response_model=List[ProductSchema])
 def get_product_recommendations(
+    background_tasks: BackgroundTasks,
     category_id: Optional[int] = Query(None, description="Category ID to get recommendations for"),
+    user_id: Optional[int] = Query(None, description="User ID to personalize by recently detected disease"),
+    disease_type: Optional[str] = Query(None, description="Disease type to get treatment products for"),
     db: Session = Depends(get_db)
 ):
-    """Get product recommendations based on category"""
-    query = db.query(Product)
+    """Get product recommendations from the precomputed disease-aware ranking"""
+    disease = disease_type
+    if not disease and user_id:
+        disease = recommendation_service.recent_disease(db, user_id)
     
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
+    # Refresh luôn chạy ở background; khi bảng còn trống (lần đầu) thì
+    # get_recommendations trả về xếp hạng trực tiếp trong catalog
+    if not recommendation_service.has_recommendations(db) or recommendation_service.needs_refresh():
+        background_tasks.add_task(recommendation_service.refresh_in_background)
     
     # Limit to top 10 recommended products
-    products = query.limit(10).all()
-    return products
+    return recommendation_service.get_recommendations(db, disease, category_id, limit=10)
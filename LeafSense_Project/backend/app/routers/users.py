@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from core.database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
 from app.models.users import User
 from app.schemas.user_schema import UserResponse, ChangePassword
-from core.security import get_current_user, verify_password, get_password_hash
+from app.services import avatar_service, password_service, token_service
+from app.services.auth_service import get_async_current_user, get_current_user, invalidate_user
 from sqlalchemy.exc import SQLAlchemyError
 import os
-import uuid
+import time
 
 router = APIRouter()
 
 # Tạo thư mục uploads nếu chưa có
-UPLOAD_DIR = "uploads/avatars"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(avatar_service.AVATAR_DIR, exist_ok=True)
 
 
 @router.get("/profile", response_model=UserResponse)
@@ -23,18 +23,24 @@ def get_user_profile(current_user: User = Depends(get_current_user)):
 
 @router.put("/profile", response_model=UserResponse)
 async def update_user_profile(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     email: str = Form(...),
     phone: str = Form(None),
     address: str = Form(None),
     avatar: UploadFile = File(None),
     remove_avatar: str = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cập nhật thông tin profile của user"""
 
+    # Không giữ connection trong lúc xử lý ảnh
+    await db.commit()
+
     # Cập nhật thông tin cơ bản
+    old_email = current_user.email
+    old_avatar_urls = (current_user.avatar_url, current_user.avatar_thumbnail_url)
     current_user.name = name
     current_user.email = email
     current_user.phone = phone
@@ -43,16 +49,8 @@ async def update_user_profile(
     # Xử lý avatar
     if remove_avatar == "true":
         # Xóa avatar hiện tại
-        if current_user.avatar_url:
-            try:
-                # Xóa file cũ nếu có
-                old_file_path = current_user.avatar_url.replace("/uploads/avatars/", "")
-                full_old_path = os.path.join(UPLOAD_DIR, old_file_path)
-                if os.path.exists(full_old_path):
-                    os.remove(full_old_path)
-            except Exception:
-                pass  # Ignore errors when deleting old files
         current_user.avatar_url = None
+        current_user.avatar_thumbnail_url = None
         
     elif avatar:
         # Kiểm tra loại file
@@ -62,57 +60,38 @@ async def update_user_profile(
                 detail="File must be an image"
             )
 
-        # Xóa avatar cũ nếu có
-        if current_user.avatar_url:
-            try:
-                old_file_path = current_user.avatar_url.replace("/uploads/avatars/", "")
-                full_old_path = os.path.join(UPLOAD_DIR, old_file_path)
-                if os.path.exists(full_old_path):
-                    os.remove(full_old_path)
-            except Exception:
-                pass  # Ignore errors when deleting old files
-
-        # Tạo tên file unique
-        file_extension = os.path.splitext(avatar.filename)[1] or ".jpg"
-        filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-
-        # Lưy file với async I/O
+        # Resize + chuyển sang WebP trong pool xử lý ảnh (file trùng nội dung được dùng lại)
         try:
-            content = await avatar.read()
-            # Sử dụng aiofiles để write async (nếu có) hoặc thread pool
-            import asyncio
-            
-            def write_file(path, content):
-                with open(path, "wb") as buffer:
-                    buffer.write(content)
-            
-            # Write file in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, write_file, file_path, content)
+            avatar_url, thumbnail_url = await avatar_service.save_avatar(avatar.file)
+        except avatar_service.InvalidAvatar as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Could not save avatar: {e}")
 
-        # Cập nhật avatar_url
-        current_user.avatar_url = f"/uploads/avatars/{filename}"
+        current_user.avatar_url = avatar_url
+        current_user.avatar_thumbnail_url = thumbnail_url
 
     try:
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        invalidate_user(old_email, current_user.email)
+        # Xóa file avatar cũ sau khi response đã gửi (nếu không còn user nào dùng)
+        replaced = [url for url in old_avatar_urls if url not in (current_user.avatar_url, current_user.avatar_thumbnail_url)]
+        if replaced:
+            background_tasks.add_task(avatar_service.remove_unreferenced, replaced, time.time())
         return current_user
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 
 @router.put("/change-password")
-def change_password(
+async def change_password(
     password_data: ChangePassword,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Đổi mật khẩu"""
 
@@ -123,22 +102,28 @@ def change_password(
             detail="Không thể thay đổi mật khẩu cho tài khoản đăng nhập bằng Google"
         )
 
-    # Kiểm tra mật khẩu cũ
-    if not verify_password(password_data.old_password, current_user.password):
+    # Kiểm tra mật khẩu cũ (trả connection về pool trong lúc băm)
+    await db.commit()
+    valid, _ = await password_service.verify_password(password_data.old_password, current_user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
         )
 
+    # Hash mật khẩu mới (chạy trong pool băm mật khẩu riêng)
+    hashed_password = await password_service.hash_password(password_data.new_password)
+
     try:
-        # Hash và cập nhật mật khẩu
-        hashed_password = get_password_hash(password_data.new_password)
+        # Cập nhật mật khẩu
         current_user.password = hashed_password
+        # Đăng xuất mọi phiên đang dùng mật khẩu cũ (kể cả refresh token)
+        token_service.revoke_user(db, current_user.email)
 
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        invalidate_user(current_user.email)
         return {"message": "Password changed successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -65,7 +65,10 @@ class ProductResponse(BaseModel):
     price: Decimal
     stock: int
     image_url: Optional[str]
+    thumbnail_url: Optional[str] = None
     category_id: Optional[int]
+    avg_rating: float = 0
+    review_count: int = 0
     
     class Config:
         from_attributes = True
@@ -120,3 +123,35 @@ class DashboardStats(BaseModel):
     total_revenue: Decimal
     pending_orders: int
     active_users: int
+
+# Analytics (đọc từ các bảng rollup)
+class SalesRollupResponse(BaseModel):
+    bucket_start: datetime
+    status: str
+    order_count: int
+    revenue: Decimal
+    discount_amount: Decimal
+    items_sold: int
+    
+    class Config:
+        from_attributes = True
+
+class CouponRollupResponse(BaseModel):
+    bucket_start: datetime
+    coupon_id: int
+    usage_count: int
+    discount_total: float
+    order_amount_total: float
+    
+    class Config:
+        from_attributes = True
+
+class PredictionRollupResponse(BaseModel):
+    bucket_start: datetime
+    disease_type: str
+    region: str
+    prediction_count: int
+    confidence_sum: float
+    
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, validator
-from typing import Optional
+from pydantic import BaseModel, Field, validator
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -12,10 +12,10 @@ class CouponStatusEnum(str, Enum):
     ACTIVE = "active"
     INACTIVE = "inactive"
     EXPIRED = "expired"
+    EXHAUSTED = "exhausted"
 
-# Base Coupon schemas
-class CouponBase(BaseModel):
-    code: str
+# Các thuộc tính chung của coupon (mọi field trừ code), dùng lại cho tạo hàng loạt
+class CouponTemplate(BaseModel):
     name: str
     description: Optional[str] = None
     coupon_type: CouponTypeEnum
@@ -28,6 +28,7 @@ class CouponBase(BaseModel):
     end_date: datetime
     status: Optional[CouponStatusEnum] = CouponStatusEnum.ACTIVE
     is_active: Optional[bool] = True
+    campaign: Optional[str] = None  # Đợt phát hành (mã tạo hàng loạt)
     
     @validator('value')
     def validate_value(cls, v, values):
@@ -47,9 +48,40 @@ class CouponBase(BaseModel):
             raise ValueError('Ngày kết thúc phải sau ngày bắt đầu')
         return v
 
+# Base Coupon schemas
+class CouponBase(CouponTemplate):
+    code: str
+    
+    @validator('code')
+    def normalize_code(cls, v):
+        v = v.strip().upper()
+        if not v:
+            raise ValueError('Mã giảm giá không được để trống')
+        return v
+
 class CouponCreate(CouponBase):
     pass
 
+# Schema cho tạo/nhập coupon hàng loạt
+class CouponBulkGenerateRequest(CouponTemplate):
+    count: int = Field(..., ge=1, le=100000)
+    prefix: Optional[str] = Field(None, max_length=20)
+    code_length: int = Field(10, ge=6, le=24)  # Số ký tự ngẫu nhiên sau prefix
+    # Mặc định mỗi mã chỉ dùng được một lần
+    total_usage_limit: Optional[int] = 1
+    
+    @validator('prefix')
+    def normalize_prefix(cls, v):
+        return v.strip().upper() if v else v
+
+class CouponBulkResult(BaseModel):
+    campaign: Optional[str] = None
+    inserted: int
+    skipped_existing: int = 0
+    duplicates: int = 0
+    errors: List[str] = []
+    sample_codes: List[str] = []
+
 class CouponUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -77,6 +109,10 @@ class CouponResponse(CouponBase):
 class CouponApplyRequest(BaseModel):
     coupon_code: str
     order_amount: float
+    
+    @validator('coupon_code')
+    def normalize_coupon_code(cls, v):
+        return v.strip().upper()
 
 class CouponApplyResponse(BaseModel):
     valid: bool
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
@@ -16,6 +16,12 @@ class PaymentMethod(str, Enum):
     COD = "COD"
     MOMO = "MoMo"
 
+class ProductSort(str, Enum):
+    RATING = "rating"
+    REVIEWS = "reviews"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+
 # Category Schemas
 class CategoryBase(BaseModel):
     name: str
@@ -51,6 +57,10 @@ class ProductUpdate(BaseModel):
 
 class Product(ProductBase):
     id: int
+    thumbnail_url: Optional[str] = None
+    avg_rating: float = 0
+    review_count: int = 0
+    rating_histogram: Dict[int, int] = {}
     category: Optional[Category] = None
     
     class Config:
@@ -64,6 +74,9 @@ class CartItemBase(BaseModel):
 class CartItemCreate(CartItemBase):
     pass
 
+class CartItemsBulkCreate(BaseModel):
+    items: List[CartItemCreate]
+
 class CartItemUpdate(BaseModel):
     quantity: int
 
@@ -78,12 +91,19 @@ class Cart(BaseModel):
     id: int
     user_id: int
     cart_items: List[CartItem] = []
+    item_count: int = 0
+    subtotal: Decimal = Decimal("0")
     created_at: datetime
     updated_at: datetime
     
     class Config:
         from_attributes = True
 
+class CartSummary(BaseModel):
+    cart_id: Optional[int] = None
+    item_count: int
+    subtotal: Decimal
+
 # Order Schemas
 class OrderItemBase(BaseModel):
     product_id: int
@@ -16,6 +16,7 @@ class UserResponse(BaseModel):
     name: str
     email: str
     avatar_url: Optional[str] = None
+    avatar_thumbnail_url: Optional[str] = None
     phone: Optional[str] = None
     address: Optional[str] = None
     role: str
@@ -28,9 +29,13 @@ class UserResponse(BaseModel):
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class UserUpdate(BaseModel):
     name: Optional[str]
     email: Optional[EmailStr]
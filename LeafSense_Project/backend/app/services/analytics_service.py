@@ -0,0 +1,229 @@
+"""
+Thống kê theo thời gian cho admin (doanh thu, đơn hàng, coupon, dự đoán bệnh)
+
+Dữ liệu gốc (Order/OrderItem, CouponUsage, DiseasePrediction) được tổng hợp
+vào các bảng rollup theo bucket giờ và ngày. Mỗi lượt refresh chỉ đọc các dòng
+mới từ sau watermark (với orders: cả đơn vừa đổi trạng thái qua updated_at),
+xác định những ngày bị ảnh hưởng rồi tính lại bucket của đúng những ngày đó
+— không cần cộng dồn nên chạy lại nhiều lần vẫn cho cùng kết quả.
+
+Bucket tính theo giờ Việt Nam: orders/coupon_usages lưu giờ UTC, còn
+disease_predictions lưu giờ Việt Nam, nên timestamp được quy đổi trước khi
+chia bucket. Dự đoán bị xóa không làm đổi watermark — chạy refresh full để
+tính lại toàn bộ.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Set
+
+import pytz
+from sqlalchemy import String, cast, func, or_
+from sqlalchemy.orm import Session
+
+from app.models.analytics_rollup import CouponRollup, PredictionRollup, SalesRollup
+from app.models.coupon_usage import CouponUsage
+from app.models.disease_prediction import DiseasePrediction
+from app.models.order import Order, order_status_value
+from app.models.order_item import OrderItem
+from app.models.users import User
+from app.models.watermark import Watermark
+from app.services.watermarks import IncrementalRefresh, get_watermark, max_id
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = pytz.timezone("Asia/Ho_Chi_Minh")
+GRANULARITIES = ("hour", "day")
+UNKNOWN_REGION = "unknown"
+REFRESH_INTERVAL = int(os.getenv("ANALYTICS_REFRESH_INTERVAL", "300"))
+
+# ==================== THỜI GIAN ====================
+
+def _to_local(value: datetime, stored_utc: bool) -> datetime:
+    """Quy đổi timestamp lưu trong DB về giờ Việt Nam (naive)"""
+    if value.tzinfo is not None:
+        return value.astimezone(LOCAL_TZ).replace(tzinfo=None)
+    if stored_utc:
+        return pytz.utc.localize(value).astimezone(LOCAL_TZ).replace(tzinfo=None)
+    return value
+
+def _to_stored(value: datetime, stored_utc: bool) -> datetime:
+    """Quy đổi giờ Việt Nam (naive) về dạng đang lưu trong DB"""
+    if stored_utc:
+        return LOCAL_TZ.localize(value).astimezone(pytz.utc).replace(tzinfo=None)
+    return value
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        value = value.replace(hour=0)
+    return value
+
+def _region(address: Optional[str]) -> str:
+    """Vùng lấy từ phần cuối địa chỉ (tỉnh/thành), ví dụ '..., Đắk Lắk' -> 'Đắk Lắk'"""
+    parts = [part.strip() for part in (address or "").split(",") if part.strip()]
+    return parts[-1][:100] if parts else UNKNOWN_REGION
+
+# ==================== NGUỒN DỮ LIỆU ====================
+# Mỗi nguồn: đọc dòng gốc trong [start, end) (giờ lưu trong DB) và trả về
+# {(granularity, bucket_start, *dimensions): {measure: value}}
+
+def _aggregate_sales(db: Session, start: datetime, end: datetime) -> Dict[tuple, dict]:
+    # Trạng thái dạng chuỗi: dòng cũ có trạng thái ngoài OrderStatus làm Enum lỗi LookupError
+    orders = db.query(
+        Order.id, Order.created_at, cast(Order.status, String), Order.total_amount, Order.discount_amount
+    ).filter(Order.created_at >= start, Order.created_at < end).all()
+    items = dict(
+        db.query(OrderItem.order_id, func.sum(OrderItem.quantity)).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(Order.created_at >= start, Order.created_at < end).group_by(OrderItem.order_id).all()
+    )
+
+    buckets = defaultdict(lambda: {"order_count": 0, "revenue": Decimal(0), "discount_amount": Decimal(0), "items_sold": 0})
+    for order_id, created_at, status, total_amount, discount_amount in orders:
+        local = _to_local(created_at, stored_utc=True)
+        # Trạng thái cũ không còn trong OrderStatus vẫn được thống kê theo chuỗi gốc
+        status = order_status_value(status) or status or "unknown"
+        for granularity in GRANULARITIES:
+            bucket = buckets[(granularity, bucket_start(local, granularity), status)]
+            bucket["order_count"] += 1
+            bucket["revenue"] += Decimal(total_amount or 0)
+            bucket["discount_amount"] += Decimal(discount_amount or 0)
+            bucket["items_sold"] += int(items.get(order_id) or 0)
+    return buckets
+
+def _aggregate_coupons(db: Session, start: datetime, end: datetime) -> Dict[tuple, dict]:
+    usages = db.query(
+        CouponUsage.used_at, CouponUsage.coupon_id, CouponUsage.discount_amount, CouponUsage.order_amount
+    ).filter(CouponUsage.used_at >= start, CouponUsage.used_at < end).all()
+
+    buckets = defaultdict(lambda: {"usage_count": 0, "discount_total": 0.0, "order_amount_total": 0.0})
+    for used_at, coupon_id, discount_amount, order_amount in usages:
+        local = _to_local(used_at, stored_utc=True)
+        for granularity in GRANULARITIES:
+            bucket = buckets[(granularity, bucket_start(local, granularity), coupon_id)]
+            bucket["usage_count"] += 1
+            bucket["discount_total"] += discount_amount or 0
+            bucket["order_amount_total"] += order_amount or 0
+    return buckets
+
+def _aggregate_predictions(db: Session, start: datetime, end: datetime) -> Dict[tuple, dict]:
+    predictions = db.query(
+        DiseasePrediction.created_at, DiseasePrediction.disease_type,
+        DiseasePrediction.confidence, User.address
+    ).outerjoin(User, User.id == DiseasePrediction.user_id).filter(
+        DiseasePrediction.created_at >= start, DiseasePrediction.created_at < end
+    ).all()
+
+    buckets = defaultdict(lambda: {"prediction_count": 0, "confidence_sum": 0.0})
+    for created_at, disease_type, confidence, address in predictions:
+        local = _to_local(created_at, stored_utc=False)
+        region = _region(address)
+        for granularity in GRANULARITIES:
+            bucket = buckets[(granularity, bucket_start(local, granularity), disease_type or "unknown", region)]
+            bucket["prediction_count"] += 1
+            bucket["confidence_sum"] += confidence or 0
+    return buckets
+
+@dataclass
+class _Source:
+    name: str
+    model: type
+    time_column: object
+    stored_utc: bool
+    rollup: type
+    dimensions: tuple
+    aggregate: Callable
+    updated_column: object = None
+
+def _sources() -> List[_Source]:
+    return [
+        _Source("analytics.orders", Order, Order.created_at, True, SalesRollup,
+                ("status",), _aggregate_sales, updated_column=Order.updated_at),
+        _Source("analytics.coupon_usages", CouponUsage, CouponUsage.used_at, True, CouponRollup,
+                ("coupon_id",), _aggregate_coupons),
+        _Source("analytics.disease_predictions", DiseasePrediction, DiseasePrediction.created_at, False,
+                PredictionRollup, ("disease_type", "region"), _aggregate_predictions),
+    ]
+
+# ==================== REFRESH ====================
+
+def _affected_days(db: Session, source: _Source, watermark: Watermark, full: bool) -> Set[datetime]:
+    query = db.query(source.time_column).filter(source.time_column.isnot(None))
+    if not full:
+        changed = source.model.id > watermark.last_id
+        if source.updated_column is not None and watermark.last_value is not None:
+            changed = or_(changed, source.updated_column > watermark.last_value)
+        query = query.filter(changed)
+    return {
+        bucket_start(_to_local(value, source.stored_utc), "day")
+        for (value,) in query.distinct().all()
+    }
+
+def _rebuild_day(db: Session, source: _Source, day: datetime):
+    rollup = source.rollup
+    next_day = day + timedelta(days=1)
+    buckets = source.aggregate(
+        db, _to_stored(day, source.stored_utc), _to_stored(next_day, source.stored_utc)
+    )
+    db.query(rollup).filter(
+        rollup.bucket_start >= day, rollup.bucket_start < next_day
+    ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(rollup, [
+        {"granularity": key[0], "bucket_start": key[1], **dict(zip(source.dimensions, key[2:])), **measures}
+        for key, measures in buckets.items()
+    ])
+
+def refresh_rollups(db: Session, full: bool = False) -> Dict[str, int]:
+    """Tính lại bucket của các ngày có dữ liệu mới; trả về số ngày đã tính theo nguồn"""
+    refreshed = {}
+    for source in _sources():
+        watermark = get_watermark(db, source.name)
+
+        new_last_id = max_id(db, source.model)
+        new_last_value = None
+        if source.updated_column is not None:
+            new_last_value = db.query(func.max(source.updated_column)).scalar()
+
+        days = _affected_days(db, source, watermark, full)
+        if full:
+            db.query(source.rollup).delete(synchronize_session=False)
+        for day in sorted(days):
+            _rebuild_day(db, source, day)
+
+        watermark.last_id = new_last_id
+        if new_last_value is not None:
+            watermark.last_value = new_last_value
+        db.commit()
+        refreshed[source.name] = len(days)
+
+    if any(refreshed.values()):
+        logger.info(f"Refreshed analytics rollups: {refreshed}")
+    return refreshed
+
+_background = IncrementalRefresh("Analytics", lambda db: refresh_rollups(db))
+
+def refresh_in_background():
+    """Refresh với session riêng; bỏ qua nếu đang có lượt refresh khác"""
+    _background.run()
+
+def needs_refresh() -> bool:
+    return _background.elapsed() > REFRESH_INTERVAL
+
+# ==================== TRUY VẤN ====================
+
+def query_rollups(db: Session, rollup, granularity: str, start: datetime, end: datetime, **filters):
+    """Đọc các bucket trong [start, end) (giờ Việt Nam), lọc theo chiều nếu có"""
+    query = db.query(rollup).filter(
+        rollup.granularity == granularity,
+        rollup.bucket_start >= start,
+        rollup.bucket_start < end,
+    )
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(getattr(rollup, column) == value)
+    return query.order_by(rollup.bucket_start, rollup.id).all()
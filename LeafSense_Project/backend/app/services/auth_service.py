@@ -0,0 +1,176 @@
+"""
+Xác thực request bằng JWT kèm cache user trong bộ nhớ
+
+get_current_principal / get_optional_principal chỉ kiểm tra token
+(token_service: chữ ký, hạn, danh sách thu hồi) và trả về Principal lấy từ
+claims, không chạm database. Route chỉ cần id/role nên dùng hai dependency này.
+
+get_async_current_user dành cho handler `async def`: User được đọc bằng
+session async (get_async_db) theo id trong token, không qua cache.
+
+get_current_user / get_optional_current_user trả về User đầy đủ: user theo
+email được lấy từ cache thay vì query database ở mọi request. Cache lưu bản
+detached của User và trả về bản merge(load=False) vào session của request,
+nên route vẫn sửa và commit user như bình thường.
+
+Các thao tác ghi vào users (admin khóa/sửa/xóa, user đổi profile/mật khẩu)
+gọi invalidate_user() sau khi commit. Khóa tài khoản, đổi quyền và xóa user
+còn thu hồi token (token_service.revoke_user); worker khác áp dụng sau tối đa
+TOKEN_REVOCATION_SYNC_INTERVAL giây.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.database import get_async_db, get_db
+from app.models.users import User
+from app.services import token_service
+from app.services.token_service import AccountLocked, InvalidToken, Principal
+
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+class PrincipalCache:
+    def __init__(self, ttl: int = AUTH_USER_CACHE_TTL, max_entries: int = AUTH_USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = {}  # email -> (User detached, expires_at)
+        self._lock = threading.Lock()
+
+    def get_user(self, db: Session, email: str) -> Optional[User]:
+        """User theo email, gắn vào session db; None nếu không tồn tại (không cache)"""
+        entry = self._entries.get(email)
+        if entry is None or entry[1] < time.time():
+            version = self.version
+            user = db.query(User).filter(User.email == email).first()
+            if user is None:
+                return None
+            if self.ttl <= 0:
+                return user
+            db.expunge(user)
+            entry = (user, time.time() + self.ttl)
+            with self._lock:
+                # Bỏ qua nếu user vừa bị invalidate trong lúc đang đọc database
+                if version == self.version:
+                    if email not in self._entries and len(self._entries) >= self.max_entries:
+                        self._entries.pop(next(iter(self._entries)))
+                    self._entries[email] = entry
+        return db.merge(entry[0], load=False)
+
+    def invalidate(self, *emails: str):
+        """Xóa các email (hoặc toàn bộ cache nếu không truyền email)"""
+        with self._lock:
+            self.version += 1
+            if not emails:
+                self._entries.clear()
+            for email in emails:
+                self._entries.pop(email, None)
+
+principal_cache = PrincipalCache()
+
+def invalidate_user(*emails: str):
+    """Gọi sau khi commit thay đổi của user (truyền cả email cũ nếu email bị đổi)"""
+    principal_cache.invalidate(*[email for email in emails if email])
+
+def token_subject(token: str) -> Optional[str]:
+    """Email (sub) trong access token, None nếu token không hợp lệ, hết hạn hoặc đã bị thu hồi"""
+    try:
+        return token_service.authenticate(token)["sub"]
+    except (InvalidToken, AccountLocked):
+        return None
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _locked_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Tài khoản của bạn đã bị khóa"
+    )
+
+def _principal(token: str, db: Session) -> Principal:
+    """Principal của access token; raise InvalidToken / AccountLocked"""
+    claims = token_service.authenticate(token)
+    principal = token_service.principal_from_claims(claims)
+    if principal is None:
+        # Token phát hành trước khi có uid/role trong claims
+        user = principal_cache.get_user(db, claims["sub"])
+        if user is None:
+            raise InvalidToken("Unknown user")
+        principal = Principal(user.id, user.email, user.role, user.status)
+    if principal.status == "inactive":
+        raise AccountLocked()
+    return principal
+
+def get_current_principal(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    if credentials is None:
+        raise _credentials_exception()
+    try:
+        return _principal(credentials.credentials, db)
+    except InvalidToken:
+        raise _credentials_exception()
+    except AccountLocked:
+        raise _locked_exception()
+
+def get_optional_principal(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    """Principal hiện tại nếu có token hợp lệ, ngược lại None"""
+    if credentials is None:
+        return None
+    try:
+        return _principal(credentials.credentials, db)
+    except (InvalidToken, AccountLocked):
+        return None
+
+def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    user = principal_cache.get_user(db, principal.email)
+    if user is None:
+        raise _credentials_exception()
+    if user.status == "inactive":
+        raise _locked_exception()
+    return user
+
+async def get_async_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    user = await db.get(User, principal.id)
+    if user is None:
+        raise _credentials_exception()
+    if user.status == "inactive":
+        raise _locked_exception()
+    return user
+
+def get_optional_current_user(
+    principal: Optional[Principal] = Depends(get_optional_principal),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """User hiện tại nếu có token hợp lệ, ngược lại None"""
+    if principal is None:
+        return None
+    user = principal_cache.get_user(db, principal.email)
+    if user is None or user.status == "inactive":
+        return None
+    return user
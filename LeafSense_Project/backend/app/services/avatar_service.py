@@ -0,0 +1,151 @@
+"""
+Xử lý avatar upload: chuẩn hóa sang WebP, khử trùng lặp theo nội dung
+
+- Starlette đã spool file upload lớn xuống đĩa; ảnh được đọc từ đó theo từng
+  khối AVATAR_CHUNK_SIZE để tính SHA-256 và kiểm tra AVATAR_MAX_BYTES (413),
+  không giữ cả ảnh trong bộ nhớ. Ảnh gốc không được lưu lại.
+- Giải mã + resize chạy trong AVATAR_WORKERS thread riêng. JPEG được giải mã
+  ở tỉ lệ thu nhỏ (draft), nên ảnh chụp nhiều MB vẫn xử lý nhanh. Mỗi ảnh tạo
+  hai biến thể WebP: ảnh hiển thị (cạnh dài tối đa AVATAR_MAX_SIZE px) và
+  thumbnail THUMBNAIL_SIZE (thumbnail_service).
+- Tên file là hash nội dung ảnh gốc: upload trùng nội dung dùng lại file sẵn có.
+  Vì nhiều user có thể dùng chung file, file cũ chỉ bị xóa (remove_unreferenced,
+  chạy nền sau response) khi không còn user nào trỏ tới.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Tuple
+
+from PIL import Image, ImageOps
+
+from app.services.thumbnail_service import make_thumbnail, THUMBNAIL_QUALITY
+
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = "uploads/avatars"
+AVATAR_THUMBNAIL_DIR = os.path.join(AVATAR_DIR, "thumbs")
+AVATAR_URL_PREFIX = "/uploads/avatars/"
+
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(10 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", str(50_000_000)))
+AVATAR_MAX_SIZE = int(os.getenv("AVATAR_MAX_SIZE", "512"))
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "80"))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", str(min(4, os.cpu_count() or 2))))
+AVATAR_CHUNK_SIZE = 64 * 1024
+
+class InvalidAvatar(Exception):
+    """File upload không phải ảnh hợp lệ hoặc quá lớn"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+_executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatar")
+
+# ==================== HÀM ĐỒNG BỘ (CHẠY TRONG POOL) ====================
+
+def _digest(source: BinaryIO) -> str:
+    """SHA-256 của file upload, đọc theo khối; raise InvalidAvatar nếu quá lớn"""
+    source.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(AVATAR_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > AVATAR_MAX_BYTES:
+            raise InvalidAvatar(413, f"Avatar must be at most {AVATAR_MAX_BYTES // (1024 * 1024)}MB")
+        digest.update(chunk)
+    if size == 0:
+        raise InvalidAvatar(400, "File must be an image")
+    source.seek(0)
+    return digest.hexdigest()[:32]
+
+def _write_webp(image: Image.Image, path: str, quality: int):
+    """Ghi file tạm rồi đổi tên để request khác không đọc phải file đang ghi dở"""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        image.save(temp_path, format="WEBP", quality=quality, method=4)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _render(source: BinaryIO, avatar_path: str, thumbnail_path: str):
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+            if width * height > AVATAR_MAX_PIXELS:
+                raise InvalidAvatar(400, "Image dimensions are too large")
+            # JPEG: giải mã thẳng ở tỉ lệ 1/2, 1/4, 1/8 gần AVATAR_MAX_SIZE nhất
+            image.draft("RGB", (AVATAR_MAX_SIZE, AVATAR_MAX_SIZE))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.thumbnail((AVATAR_MAX_SIZE, AVATAR_MAX_SIZE), Image.LANCZOS)
+    except InvalidAvatar:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise InvalidAvatar(400, "File must be an image")
+
+    _write_webp(image, avatar_path, AVATAR_QUALITY)
+    _write_webp(make_thumbnail(image), thumbnail_path, THUMBNAIL_QUALITY)
+
+def store_avatar(source: BinaryIO) -> Tuple[str, str]:
+    """Lưu các biến thể WebP của ảnh; trả về (avatar_url, avatar_thumbnail_url)"""
+    name = f"{_digest(source)}.webp"
+    avatar_path = os.path.join(AVATAR_DIR, name)
+    thumbnail_path = os.path.join(AVATAR_THUMBNAIL_DIR, name)
+
+    if os.path.exists(avatar_path) and os.path.exists(thumbnail_path):
+        # Đã có ảnh cùng nội dung: đánh dấu vừa dùng để remove_unreferenced bỏ qua
+        for path in (avatar_path, thumbnail_path):
+            os.utime(path)
+    else:
+        os.makedirs(AVATAR_THUMBNAIL_DIR, exist_ok=True)
+        _render(source, avatar_path, thumbnail_path)
+
+    return f"{AVATAR_URL_PREFIX}{name}", f"{AVATAR_URL_PREFIX}thumbs/{name}"
+
+def remove_unreferenced(urls: Iterable[str], scheduled_at: float = None):
+    """Xóa file avatar cũ không còn user nào dùng (chạy nền sau khi commit)"""
+    from core.database import SessionLocal
+    from app.models.users import User
+
+    urls = {url for url in urls if url and url.startswith(AVATAR_URL_PREFIX)}
+    if not urls:
+        return
+    scheduled_at = scheduled_at or time.time()
+
+    db = SessionLocal()
+    try:
+        in_use = {
+            url for row in db.query(User.avatar_url, User.avatar_thumbnail_url).filter(
+                (User.avatar_url.in_(urls)) | (User.avatar_thumbnail_url.in_(urls))
+            ) for url in row
+        }
+    finally:
+        db.close()
+
+    for url in urls - in_use:
+        path = url.lstrip("/")
+        try:
+            # File vừa được upload trùng dùng lại (có thể chưa commit): giữ lại
+            if os.path.getmtime(path) < scheduled_at:
+                os.remove(path)
+        except OSError:
+            pass  # File đã bị xóa hoặc không tồn tại
+
+# ==================== HÀM ASYNC (DÙNG TRONG HANDLER) ====================
+
+async def save_avatar(source: BinaryIO) -> Tuple[str, str]:
+    """store_avatar chạy trong pool xử lý ảnh riêng"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, store_avatar, source)
@@ -0,0 +1,131 @@
+"""
+Thao tác giỏ hàng bằng câu lệnh upsert
+
+Mỗi user có đúng một giỏ (unique carts.user_id) và mỗi sản phẩm xuất hiện
+một lần trong giỏ (unique cart_items(cart_id, product_id)), nên thêm vào giỏ
+là INSERT ... ON CONFLICT DO UPDATE cộng dồn số lượng — không có đọc-rồi-ghi,
+double-click không tạo dòng trùng. Tổng số lượng và tạm tính được lưu sẵn
+trên bảng carts và tính lại bằng một câu UPDATE sau mỗi lần ghi, để badge
+trên header chỉ cần đọc một dòng.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.cart import Cart
+from app.models.cart_item import CartItem
+from app.models.product import Product
+
+_UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _insert_for(db: Session):
+    return _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+
+def ensure_cart(db: Session, user_id: int) -> int:
+    """Lấy id giỏ hàng của user, tạo mới nếu chưa có (một câu lệnh)"""
+    insert = _insert_for(db)
+    if insert is None:
+        cart_id = db.query(Cart.id).filter(Cart.user_id == user_id).scalar()
+        if cart_id is None:
+            cart = Cart(user_id=user_id)
+            db.add(cart)
+            db.flush()
+            cart_id = cart.id
+        return cart_id
+
+    # DO UPDATE (thay vì DO NOTHING) để RETURNING luôn trả về dòng đã tồn tại
+    stmt = insert(Cart).values(user_id=user_id, item_count=0, subtotal=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id], set_={"user_id": stmt.excluded.user_id}
+    ).returning(Cart.id)
+    return db.execute(stmt).scalar_one()
+
+def add_items(db: Session, cart_id: int, quantities: Dict[int, int]) -> List[int]:
+    """Cộng dồn số lượng cho các sản phẩm; trả về product_id đã được thêm.
+
+    Sản phẩm không tồn tại bị bỏ qua (INSERT ... SELECT từ products), caller
+    so sánh với danh sách yêu cầu để báo lỗi.
+    """
+    if not quantities:
+        return []
+    insert = _insert_for(db)
+    if insert is None:
+        return _add_items_orm(db, cart_id, quantities)
+
+    source = select(
+        literal(cart_id), Product.id, case(quantities, value=Product.id)
+    ).where(Product.id.in_(quantities))
+    stmt = insert(CartItem).from_select(["cart_id", "product_id", "quantity"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.cart_id, CartItem.product_id],
+        set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+    ).returning(CartItem.product_id)
+    return list(db.execute(stmt).scalars())
+
+def _add_items_orm(db: Session, cart_id: int, quantities: Dict[int, int]) -> List[int]:
+    existing_products = {
+        product_id for (product_id,) in db.query(Product.id).filter(Product.id.in_(quantities))
+    }
+    items = {
+        item.product_id: item
+        for item in db.query(CartItem).filter(
+            CartItem.cart_id == cart_id, CartItem.product_id.in_(existing_products)
+        )
+    }
+    for product_id in existing_products:
+        if product_id in items:
+            items[product_id].quantity += quantities[product_id]
+        else:
+            db.add(CartItem(cart_id=cart_id, product_id=product_id, quantity=quantities[product_id]))
+    db.flush()
+    return list(existing_products)
+
+def remove_item(db: Session, item_id: int) -> Optional[int]:
+    """Xóa một dòng khỏi giỏ; trả về cart_id hoặc None nếu không tìm thấy"""
+    cart_id = db.query(CartItem.cart_id).filter(CartItem.id == item_id).scalar()
+    if cart_id is not None:
+        db.execute(delete(CartItem).where(CartItem.id == item_id))
+    return cart_id
+
+def clear_items(db: Session, user_id: int):
+    """Xóa toàn bộ sản phẩm trong giỏ của user và đưa tổng về 0"""
+    cart_ids = select(Cart.id).where(Cart.user_id == user_id)
+    db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids)))
+    db.execute(
+        update(Cart).where(Cart.user_id == user_id)
+        .values(item_count=0, subtotal=0, updated_at=datetime.utcnow())
+    )
+
+# ==================== TỔNG GIỎ HÀNG ====================
+
+def refresh_summary(db: Session, cart_ids: Optional[Iterable[int]] = None, product_ids: Optional[Iterable[int]] = None):
+    """Tính lại item_count/subtotal bằng một câu UPDATE.
+
+    Truyền cart_ids để tính cho các giỏ cụ thể, hoặc product_ids để tính cho
+    mọi giỏ đang chứa các sản phẩm đó (ví dụ khi đổi giá).
+    """
+    item_count = select(func.coalesce(func.sum(CartItem.quantity), 0)).where(
+        CartItem.cart_id == Cart.id
+    ).scalar_subquery()
+    subtotal = select(func.coalesce(func.sum(CartItem.quantity * Product.price), 0)).join(
+        Product, Product.id == CartItem.product_id
+    ).where(CartItem.cart_id == Cart.id).scalar_subquery()
+
+    stmt = update(Cart).values(item_count=item_count, subtotal=subtotal, updated_at=datetime.utcnow())
+    if cart_ids is not None:
+        stmt = stmt.where(Cart.id.in_(list(cart_ids)))
+    if product_ids is not None:
+        stmt = stmt.where(Cart.id.in_(
+            select(CartItem.cart_id).where(CartItem.product_id.in_(list(product_ids)))
+        ))
+    db.execute(stmt.execution_options(synchronize_session=False))
+
+def get_summary(db: Session, user_id: int) -> dict:
+    row = db.query(Cart.id, Cart.item_count, Cart.subtotal).filter(Cart.user_id == user_id).first()
+    if row is None:
+        return {"cart_id": None, "item_count": 0, "subtotal": 0}
+    return {"cart_id": row.id, "item_count": row.item_count or 0, "subtotal": row.subtotal or 0}
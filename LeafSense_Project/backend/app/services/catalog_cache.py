@@ -0,0 +1,140 @@
+"""
+Cache in-process cho các endpoint catalog (products, categories)
+
+Mỗi entry lưu sẵn body JSON đã serialize cùng ETag (hash nội dung) và
+Last-Modified, nên request lặp lại không chạm tới database và trình duyệt/CDN
+có thể revalidate bằng If-None-Match / If-Modified-Since để nhận 304.
+Cache bị xóa toàn bộ khi admin ghi vào products/categories; TTL giới hạn độ
+trễ giữa các worker (mỗi worker có cache riêng). Đặt hàng chỉ đổi tồn kho nên
+chỉ xóa entry chi tiết của các sản phẩm trong đơn (invalidate_products), các
+danh sách sản phẩm chấp nhận tồn kho cũ tối đa một TTL.
+
+Body được nén (br/gzip) một lần cho mỗi entry và dùng lại, thay vì để
+CompressionMiddleware nén lại ở mọi request.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.services import compression
+
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "60"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "512"))
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "last_modified", "modified_at", "expires_at", "_encoded")
+
+    def __init__(self, body: bytes, ttl: int):
+        now = time.time()
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self.modified_at = int(now)
+        self.last_modified = formatdate(self.modified_at, usegmt=True)
+        self.expires_at = now + ttl
+        self._encoded = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """Body đã nén theo encoding (nén lần đầu, các lần sau dùng lại)"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = compression.compress(self.body, encoding)
+        return body
+
+class CatalogCache:
+    def __init__(self, ttl: int = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = {}
+        # Số lần từng key bị xóa riêng lẻ, để bỏ qua response build trước khi xóa
+        self._key_versions = {}
+        self._lock = threading.Lock()
+
+    def version_of(self, key):
+        return self.version, self._key_versions.get(key, 0)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.time():
+            return None
+        return entry
+
+    def set(self, key, body: bytes, version) -> CachedResponse:
+        entry = CachedResponse(body, self.ttl)
+        with self._lock:
+            # Bỏ qua nếu cache (hoặc key) đã bị invalidate trong lúc đang build response
+            if version != self.version_of(key):
+                return entry
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._key_versions.clear()
+
+    def invalidate_keys(self, keys):
+        with self._lock:
+            for key in keys:
+                self._key_versions[key] = self._key_versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+catalog_cache = CatalogCache()
+
+def invalidate_catalog():
+    """Gọi sau khi ghi vào products/categories"""
+    catalog_cache.invalidate()
+
+def invalidate_products(product_ids):
+    """Gọi sau khi chỉ tồn kho của các sản phẩm thay đổi (đặt hàng)"""
+    catalog_cache.invalidate_keys([("product", product_id) for product_id in product_ids])
+
+def _is_not_modified(request: Request, entry: CachedResponse, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return entry.modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def cached_json_response(request: Request, key, build) -> Response:
+    """Trả về response JSON từ cache, build lại bằng `build()` khi miss"""
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version = catalog_cache.version_of(key)
+        body = orjson.dumps(jsonable_encoder(build()))
+        entry = catalog_cache.set(key, body, version)
+
+    encoding = None
+    if compression.COMPRESSION_ENABLED and len(entry.body) >= compression.COMPRESSION_MIN_SIZE:
+        encoding = compression.choose_encoding(request.headers)
+    # Mỗi encoding là một representation riêng nên có ETag riêng
+    etag = compression.encoded_etag(entry.etag, encoding) if encoding else entry.etag
+    headers = {
+        "ETag": etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": f"public, max-age={catalog_cache.ttl}",
+        "Vary": "Accept-Encoding",
+    }
+    if _is_not_modified(request, entry, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=entry.encoded(encoding), media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
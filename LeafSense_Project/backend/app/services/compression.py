@@ -0,0 +1,165 @@
+"""
+Nén response (Brotli / gzip) theo Accept-Encoding
+
+CompressionMiddleware nén các response có loại nội dung nén được (JSON, text,
+svg...) và lớn hơn COMPRESSION_MIN_SIZE byte. Brotli được ưu tiên khi client
+hỗ trợ và đã cài package `brotli`; nếu không thì dùng gzip. Bỏ qua:
+
+- response đã có Content-Encoding (file nén sẵn, body đã nén trong catalog cache)
+- 206/304/204, ảnh và các loại nội dung đã nén sẵn
+- body nhỏ hơn ngưỡng (nén không lợi mà tốn CPU)
+
+Body lớn hơn COMPRESSION_THREAD_THRESHOLD được nén trong thread pool để không
+chặn event loop. Response dạng stream được nén theo từng khối. Body nén là
+một representation khác nên ETag của upstream được gắn thêm encoding.
+"""
+
+import os
+import zlib
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Brotli là tùy chọn; không có thì chỉ dùng gzip
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Quality 4-5 cho response động: nhỏ hơn gzip 6 mà vẫn nhanh hơn
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(256 * 1024)))
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript", "application/json", "application/xml", "image/svg+xml", "image/x-icon",
+}
+
+def compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith("+json")
+
+def accepts(headers: Headers, encoding: str) -> bool:
+    """Client chấp nhận `encoding` (có trong Accept-Encoding với q > 0)"""
+    for item in headers.get("accept-encoding", "").split(","):
+        token, _, params = item.strip().partition(";")
+        if token.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def choose_encoding(headers: Headers) -> Optional[str]:
+    if brotli is not None and accepts(headers, "br"):
+        return "br"
+    if accepts(headers, "gzip"):
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            # wbits=31: định dạng gzip (header + CRC), nhanh hơn gzip.GzipFile
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            output = self._brotli.process(data)
+            return output + (self._brotli.finish() if final else self._brotli.flush())
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Nén cả body một lần (dùng cho body được cache sẵn)"""
+    return _Compressor(encoding).compress(data, final=True)
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag riêng cho body nén: '"abc"' -> '"abc-br"' (giữ tiền tố W/ nếu có)"""
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _skip(self, headers: Headers) -> bool:
+        return (
+            self.start_message["status"] in (204, 206, 304)
+            or "content-encoding" in headers
+            or "content-range" in headers
+            or not compressible(headers.get("content-type", ""))
+        )
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Chờ khối body đầu tiên để biết kích thước trước khi gửi header
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = Headers(raw=self.start_message["headers"])
+            if self._skip(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            if not more_body:
+                if len(body) > COMPRESSION_THREAD_THRESHOLD:
+                    body = await anyio.to_thread.run_sync(self.compressor.compress, body, True)
+                else:
+                    body = self.compressor.compress(body, final=True)
+            else:
+                body = self.compressor.compress(body, final=False)
+
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["etag"] = encoded_etag(headers["etag"], self.encoding)
+            if more_body:
+                del headers["content-length"]
+            else:
+                headers["content-length"] = str(len(body))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        body = self.compressor.compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
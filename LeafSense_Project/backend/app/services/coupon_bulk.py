@@ -0,0 +1,160 @@
+"""
+Tạo và nhập coupon hàng loạt cho các đợt phát hành (campaign)
+
+- generate_coupons: sinh mã ngẫu nhiên theo từng chunk, bảng chữ bỏ các ký tự
+  dễ nhầm (0/O, 1/I/L). Mã trùng trong đợt hoặc đã có trong database bị loại
+  và sinh bù, nên luôn đủ số lượng mà không vi phạm unique index.
+- import_csv: đọc file CSV (header theo field của CouponCreate), validate từng
+  dòng bằng schema, bỏ qua mã đã tồn tại hoặc trùng trong file, lỗi báo theo
+  số dòng.
+
+Cả hai ghi bằng một câu INSERT nhiều dòng (executemany) cho mỗi chunk, trong
+một transaction, rồi invalidate coupon_index. Trạng thái EXPIRED/EXHAUSTED
+của mã nhập vào do job coupon_lifecycle cập nhật.
+"""
+
+import csv
+import secrets
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.models.coupon import Coupon
+from app.schemas.coupon_schema import CouponBulkGenerateRequest, CouponBulkResult, CouponCreate
+from app.services.coupon_index import invalidate_coupon
+
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+CHUNK_SIZE = 5000
+LOOKUP_CHUNK = 900  # Giữ số bind param dưới giới hạn 999 của SQLite cũ
+MAX_ERRORS = 100
+SAMPLE_SIZE = 10
+REQUIRED_COLUMNS = {"code", "name", "coupon_type", "value", "start_date", "end_date"}
+
+# Ánh xạ byte ngẫu nhiên -> ký tự; các byte >= 248 (= 31 * 8) bị bỏ để mọi ký tự
+# có xác suất như nhau
+_BYTE_TABLE = bytes(ord(CODE_ALPHABET[i % len(CODE_ALPHABET)]) for i in range(256))
+_REJECTED_BYTES = bytes(range(256 - 256 % len(CODE_ALPHABET), 256))
+
+def _random_codes(count: int, prefix: str, length: int) -> List[str]:
+    """Sinh count mã ngẫu nhiên (CSPRNG); dùng bytes.translate thay vì chọn từng ký tự"""
+    needed = count * length
+    chars = b""
+    while len(chars) < needed:
+        missing = needed - len(chars)
+        chars += secrets.token_bytes(missing + missing // 16 + 8).translate(_BYTE_TABLE, _REJECTED_BYTES)
+    chars = chars[:needed].decode("ascii")
+    return [prefix + chars[start:start + length] for start in range(0, needed, length)]
+
+def _existing_codes(db: Session, codes: Iterable[str]) -> Set[str]:
+    codes = list(codes)
+    existing = set()
+    for start in range(0, len(codes), LOOKUP_CHUNK):
+        existing.update(
+            code for (code,) in db.query(Coupon.code).filter(Coupon.code.in_(codes[start:start + LOOKUP_CHUNK]))
+        )
+    return existing
+
+def _insert(db: Session, rows: List[dict]):
+    if rows:
+        # Core INSERT (executemany), bỏ qua bước xử lý của ORM bulk insert
+        db.execute(Coupon.__table__.insert(), rows)
+
+def _default_campaign() -> str:
+    return f"BULK-{datetime.utcnow():%Y%m%d-%H%M%S}"
+
+def generate_coupons(db: Session, request: CouponBulkGenerateRequest) -> CouponBulkResult:
+    """Sinh request.count mã mới dùng chung các thuộc tính trong request"""
+    template = request.dict(exclude={"count", "prefix", "code_length"})
+    template["campaign"] = template["campaign"] or _default_campaign()
+    template["current_usage_count"] = 0
+    prefix = request.prefix or ""
+
+    seen: Set[str] = set()
+    sample: List[str] = []
+    inserted = 0
+    try:
+        while inserted < request.count:
+            needed = min(CHUNK_SIZE, request.count - inserted)
+            candidates = set()
+            while len(candidates) < needed:
+                candidates.update(_random_codes(needed - len(candidates), prefix, request.code_length))
+                candidates -= seen
+            candidates -= _existing_codes(db, candidates)
+            seen |= candidates
+
+            _insert(db, [{**template, "code": code} for code in candidates])
+            inserted += len(candidates)
+            sample.extend(list(candidates)[:SAMPLE_SIZE - len(sample)])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidate_coupon()
+    return CouponBulkResult(campaign=template["campaign"], inserted=inserted, sample_codes=sample)
+
+def import_csv(db: Session, lines: Iterable[str], campaign: Optional[str] = None) -> CouponBulkResult:
+    """Nhập coupon từ CSV; dòng lỗi được bỏ qua và liệt kê trong errors"""
+    reader = csv.DictReader(lines)
+    columns = {name.strip() for name in reader.fieldnames or [] if name}
+    missing = REQUIRED_COLUMNS - columns
+    if missing:
+        raise ValueError(f"File CSV thiếu cột: {', '.join(sorted(missing))}")
+
+    result = CouponBulkResult(campaign=campaign, inserted=0)
+    invalid = 0
+    batch: Dict[str, dict] = {}
+    seen: Set[str] = set()
+
+    def flush():
+        existing = _existing_codes(db, batch)
+        _insert(db, [row for code, row in batch.items() if code not in existing])
+        result.inserted += len(batch) - len(existing)
+        result.skipped_existing += len(existing)
+        batch.clear()
+
+    try:
+        for line_number, row in enumerate(reader, start=2):
+            data = {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and isinstance(value, str) and value.strip()
+            }
+            if campaign:
+                data.setdefault("campaign", campaign)
+            try:
+                coupon = CouponCreate(**data)
+            except ValidationError as e:
+                invalid += 1
+                if len(result.errors) < MAX_ERRORS:
+                    error = e.errors()[0]
+                    field = ".".join(str(part) for part in error["loc"])
+                    result.errors.append(f"Dòng {line_number}: {field} - {error['msg']}")
+                continue
+
+            if coupon.code in seen:
+                result.duplicates += 1
+                continue
+            seen.add(coupon.code)
+            batch[coupon.code] = {**coupon.dict(), "current_usage_count": 0}
+            if len(batch) >= CHUNK_SIZE:
+                flush()
+        flush()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if invalid > len(result.errors):
+        result.errors.append(f"... và {invalid - len(result.errors)} dòng lỗi khác")
+    result.sample_codes = list(seen)[:SAMPLE_SIZE]
+    invalidate_coupon()
+    return result
+
+def campaign_codes(db: Session, campaign: str) -> List[tuple]:
+    """(code, current_usage_count, status) của các mã trong một đợt, để xuất CSV"""
+    return db.query(Coupon.code, Coupon.current_usage_count, Coupon.status).filter(
+        Coupon.campaign == campaign
+    ).order_by(Coupon.id).all()
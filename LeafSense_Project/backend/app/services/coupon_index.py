@@ -0,0 +1,103 @@
+"""
+Index in-process: mã coupon -> snapshot bất biến của coupon đang bật
+
+Ô nhập mã ở trang checkout gọi /coupons/validate theo từng lần gõ phím, nên
+kết quả tra cứu (kể cả mã không tồn tại) được giữ trong bộ nhớ. Admin
+tạo/sửa/xóa coupon và mỗi lượt áp dụng thành công sẽ invalidate mã tương ứng;
+TTL giới hạn độ trễ giữa các worker (mỗi worker có index riêng).
+
+Snapshot dùng chung is_valid/calculate_discount với model Coupon. Số lượt đã
+dùng trong snapshot có thể cũ tối đa một TTL — chỉ ảnh hưởng thông báo khi
+validate, còn giới hạn thật được kiểm tra khi áp dụng (coupon_service).
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.coupon import Coupon, CouponStatusEnum, CouponTypeEnum
+
+COUPON_INDEX_TTL = int(os.getenv("COUPON_INDEX_TTL", "60"))
+COUPON_INDEX_NEGATIVE_TTL = int(os.getenv("COUPON_INDEX_NEGATIVE_TTL", "30"))
+COUPON_INDEX_MAX_ENTRIES = int(os.getenv("COUPON_INDEX_MAX_ENTRIES", "4096"))
+
+@dataclass(frozen=True)
+class CouponSnapshot:
+    id: int
+    code: str
+    name: str
+    description: Optional[str]
+    coupon_type: CouponTypeEnum
+    value: float
+    minimum_order_amount: Optional[float]
+    maximum_discount_amount: Optional[float]
+    total_usage_limit: Optional[int]
+    usage_limit_per_customer: Optional[int]
+    current_usage_count: int
+    start_date: datetime
+    end_date: datetime
+    status: CouponStatusEnum
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    is_valid = Coupon.is_valid
+    calculate_discount = Coupon.calculate_discount
+
+    @classmethod
+    def from_model(cls, coupon: Coupon) -> "CouponSnapshot":
+        return cls(**{field.name: getattr(coupon, field.name) for field in fields(cls)})
+
+class CouponIndex:
+    def __init__(
+        self,
+        ttl: int = COUPON_INDEX_TTL,
+        negative_ttl: int = COUPON_INDEX_NEGATIVE_TTL,
+        max_entries: int = COUPON_INDEX_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = {}  # code -> (snapshot hoặc None, expires_at)
+        self._lock = threading.Lock()
+
+    def lookup(self, db: Session, code: str) -> Optional[CouponSnapshot]:
+        """Coupon đang bật theo mã; None nếu không có (kết quả được cache cả hai trường hợp)"""
+        code = Coupon.normalize_code(code)
+        entry = self._entries.get(code)
+        if entry is not None and entry[1] >= time.time():
+            return entry[0]
+
+        version = self.version
+        coupon = db.query(Coupon).filter(Coupon.code == code, Coupon.is_active == True).first()
+        snapshot = CouponSnapshot.from_model(coupon) if coupon else None
+        ttl = self.ttl if snapshot else self.negative_ttl
+
+        with self._lock:
+            # Bỏ qua nếu mã vừa bị invalidate trong lúc đang đọc database
+            if version == self.version:
+                if code not in self._entries and len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[code] = (snapshot, time.time() + ttl)
+        return snapshot
+
+    def invalidate(self, code: Optional[str] = None):
+        """Xóa một mã (hoặc toàn bộ index nếu không truyền mã)"""
+        with self._lock:
+            self.version += 1
+            if code is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(Coupon.normalize_code(code), None)
+
+coupon_index = CouponIndex()
+
+def invalidate_coupon(code: Optional[str] = None):
+    """Gọi sau khi ghi vào coupons"""
+    coupon_index.invalidate(code)
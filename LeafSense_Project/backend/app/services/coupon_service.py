@@ -0,0 +1,150 @@
+"""
+Áp dụng mã giảm giá an toàn khi có nhiều request đồng thời
+
+- Giới hạn tổng: tăng current_usage_count bằng một câu UPDATE có điều kiện
+  (còn hiệu lực và chưa chạm total_usage_limit); không có dòng nào được cập
+  nhật nghĩa là mã đã hết lượt.
+- Giới hạn mỗi khách: mỗi lượt dùng mang số thứ tự usage_seq (1..giới hạn)
+  với unique (coupon_id, user_id, usage_seq), nên hai request cùng lấy một
+  số thứ tự thì request sau vi phạm ràng buộc thay vì vượt giới hạn. Mã
+  không giới hạn mỗi khách để usage_seq = NULL (NULL không bị ràng buộc
+  unique), nên user có thể dùng song song nhiều lần.
+
+Cả hai bước nằm trong cùng một transaction, lỗi ở bước nào cũng rollback.
+
+Trạng thái EXPIRED/EXHAUSTED được cập nhật hàng loạt bởi update_lifecycle
+(chạy định kỳ trong scheduler), nên các endpoint danh sách chỉ cần lọc theo
+status thay vì so sánh ngày trên từng request.
+"""
+
+from datetime import datetime
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import and_, case, func, literal, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.coupon import Coupon, CouponStatusEnum
+from app.models.coupon_usage import CouponUsage
+from app.services.coupon_index import invalidate_coupon
+
+logger = logging.getLogger(__name__)
+
+class CouponConflict(Exception):
+    """Mã giảm giá không thể áp dụng do đã chạm giới hạn sử dụng"""
+
+def user_usage_count(db: Session, coupon_id: int, user_id: int) -> int:
+    return db.query(func.count(CouponUsage.id)).filter(
+        CouponUsage.coupon_id == coupon_id,
+        CouponUsage.user_id == user_id
+    ).scalar() or 0
+
+def redeem_coupon(
+    db: Session,
+    coupon: Coupon,
+    user_id: int,
+    order_amount: float,
+    discount_amount: float,
+    order_id: Optional[int] = None,
+) -> CouponUsage:
+    """Ghi nhận một lượt dùng coupon; raise CouponConflict nếu đã hết lượt"""
+    limit = coupon.usage_limit_per_customer
+    usage_seq = None
+    if limit:
+        usage_seq = user_usage_count(db, coupon.id, user_id) + 1
+        if usage_seq > limit:
+            raise CouponConflict(f"Bạn đã sử dụng hết lượt áp dụng mã này (tối đa {limit} lần)")
+
+    try:
+        usage = CouponUsage(
+            coupon_id=coupon.id,
+            user_id=user_id,
+            order_id=order_id,
+            usage_seq=usage_seq,
+            discount_amount=discount_amount,
+            order_amount=order_amount
+        )
+        db.add(usage)
+        db.flush()
+    except IntegrityError:
+        # Request khác của cùng user vừa lấy số thứ tự này
+        db.rollback()
+        raise CouponConflict("Mã giảm giá đang được áp dụng cho một đơn khác của bạn, vui lòng thử lại")
+
+    now = datetime.utcnow()
+    new_count = func.coalesce(Coupon.current_usage_count, 0) + 1
+    result = db.execute(
+        update(Coupon)
+        .where(
+            Coupon.id == coupon.id,
+            Coupon.is_active == True,
+            Coupon.status == CouponStatusEnum.ACTIVE,
+            Coupon.start_date <= now,
+            Coupon.end_date >= now,
+            or_(
+                Coupon.total_usage_limit.is_(None),
+                Coupon.total_usage_limit <= 0,
+                func.coalesce(Coupon.current_usage_count, 0) < Coupon.total_usage_limit,
+            ),
+        )
+        .values(
+            current_usage_count=new_count,
+            # Lượt dùng cuối cùng chuyển coupon sang EXHAUSTED ngay trong cùng câu lệnh
+            status=case(
+                (and_(Coupon.total_usage_limit > 0, new_count >= Coupon.total_usage_limit),
+                 literal(CouponStatusEnum.EXHAUSTED, Coupon.status.type)),
+                else_=Coupon.status,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise CouponConflict("Mã giảm giá đã được sử dụng hết")
+
+    db.commit()
+    # Số lượt đã dùng thay đổi: snapshot trong index không còn đúng
+    invalidate_coupon(coupon.code)
+    return usage
+
+def update_lifecycle(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Chuyển trạng thái hàng loạt: hết hạn -> EXPIRED, hết lượt -> EXHAUSTED, được nới giới hạn -> ACTIVE"""
+    now = now or datetime.utcnow()
+    used = func.coalesce(Coupon.current_usage_count, 0)
+    exhausted = and_(Coupon.total_usage_limit > 0, used >= Coupon.total_usage_limit)
+    has_remaining = or_(
+        Coupon.total_usage_limit.is_(None),
+        Coupon.total_usage_limit <= 0,
+        used < Coupon.total_usage_limit,
+    )
+    transitions = {
+        "expired": (
+            and_(
+                Coupon.status.in_([CouponStatusEnum.ACTIVE, CouponStatusEnum.EXHAUSTED]),
+                Coupon.end_date < now,
+            ),
+            CouponStatusEnum.EXPIRED,
+        ),
+        "exhausted": (
+            and_(Coupon.status == CouponStatusEnum.ACTIVE, exhausted),
+            CouponStatusEnum.EXHAUSTED,
+        ),
+        # Admin tăng total_usage_limit cho coupon đã hết lượt
+        "reactivated": (
+            and_(Coupon.status == CouponStatusEnum.EXHAUSTED, Coupon.end_date >= now, has_remaining),
+            CouponStatusEnum.ACTIVE,
+        ),
+    }
+
+    changed = {}
+    for name, (condition, status) in transitions.items():
+        changed[name] = db.execute(
+            update(Coupon).where(condition).values(status=status).execution_options(synchronize_session=False)
+        ).rowcount
+    db.commit()
+
+    if any(changed.values()):
+        invalidate_coupon()
+        logger.info(f"Coupon lifecycle transitions: {changed}")
+    return changed
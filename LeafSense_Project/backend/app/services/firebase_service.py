@@ -3,6 +3,7 @@ import uuid
 import io
 import base64
 from PIL import Image
+from app.services.thumbnail_service import thumbnail_bytes
 
 def upload_image_to_firebase(local_path: str, folder: str = "uploads"):
     """Upload ảnh lên Firebase và trả về URL công khai"""
@@ -12,11 +13,12 @@ def upload_image_to_firebase(local_path: str, folder: str = "uploads"):
     blob.make_public()
     return blob.public_url
 
-def upload_image_from_bytes_to_firebase(image_bytes: bytes, folder: str = "uploads", filename_prefix: str = "image"):
+def upload_image_from_bytes_to_firebase(image_bytes: bytes, folder: str = "uploads", filename_prefix: str = "image",
+                                        extension: str = "jpg", content_type: str = "image/jpeg"):
     """Upload ảnh từ bytes lên Firebase và trả về URL công khai"""
-    blob_name = f"{folder}/{filename_prefix}_{uuid.uuid4()}.jpg"
+    blob_name = f"{folder}/{filename_prefix}_{uuid.uuid4()}.{extension}"
     blob = bucket.blob(blob_name)
-    blob.upload_from_string(image_bytes, content_type='image/jpeg')
+    blob.upload_from_string(image_bytes, content_type=content_type)
     blob.make_public()
     return blob.public_url
 
@@ -29,6 +31,13 @@ def upload_pil_image_to_firebase(pil_image: Image.Image, folder: str = "uploads"
     
     return upload_image_from_bytes_to_firebase(img_bytes, folder, filename_prefix)
 
+def upload_thumbnail_to_firebase(pil_image: Image.Image, folder: str = "thumbnails", filename_prefix: str = "thumb"):
+    """Tạo thumbnail WebP từ PIL Image, upload lên Firebase và trả về URL công khai"""
+    thumb_bytes = thumbnail_bytes(pil_image)
+    return upload_image_from_bytes_to_firebase(
+        thumb_bytes, folder, filename_prefix, extension="webp", content_type="image/webp"
+    )
+
 def upload_base64_image_to_firebase(base64_data: str, folder: str = "uploads", filename_prefix: str = "image"):
     """Upload ảnh từ base64 string lên Firebase và trả về URL công khai"""
     # Remove data URL prefix if present
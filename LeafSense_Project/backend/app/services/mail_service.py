@@ -0,0 +1,247 @@
+"""
+Gửi email qua outbox
+
+Handler chỉ ghi email vào bảng mail_outbox (cùng transaction với dữ liệu liên
+quan, ví dụ token đặt lại mật khẩu) rồi đánh thức job "mail_outbox" của
+scheduler. Job deliver_pending:
+
+- lấy các email đến hạn theo lô (MAIL_BATCH_SIZE), đánh dấu bằng claim_token
+  để nhiều worker không gửi trùng;
+- gửi qua một kết nối SMTP dùng lại giữa các email và các lượt chạy (chỉ
+  STARTTLS + login khi kết nối mới), tự kết nối lại nếu server đã đóng;
+- lỗi tạm thời được thử lại với backoff tăng dần, tối đa MAIL_MAX_ATTEMPTS
+  lần; lỗi 5xx từ server (địa chỉ sai...) đánh dấu failed ngay.
+
+Email gửi xong được xóa context (có thể chứa link đặt lại mật khẩu còn hiệu
+lực). Job "mail_outbox_purge" xóa theo lô các email sent/failed cũ hơn
+MAIL_OUTBOX_RETENTION_DAYS ngày để bảng không phình mãi.
+
+Template trong app/templates/email được Jinja2 biên dịch một lần và cache.
+Khi phát triển có thể chạy `python devtools/debug_smtp.py` và đặt
+MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_STARTTLS=0.
+"""
+
+import json
+import logging
+import os
+import secrets
+import smtplib
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+
+from app.models.mail_outbox import MailOutbox
+from app.services.purge import DEFAULT_PURGE_BATCH, delete_in_batches
+
+logger = logging.getLogger(__name__)
+
+MAIL_OUTBOX_INTERVAL = int(os.getenv("MAIL_OUTBOX_INTERVAL", "10"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE = int(os.getenv("MAIL_RETRY_BASE", "30"))  # giây, nhân đôi sau mỗi lần lỗi
+MAIL_RETRY_MAX = int(os.getenv("MAIL_RETRY_MAX", "3600"))
+MAIL_SEND_TIMEOUT = int(os.getenv("MAIL_SEND_TIMEOUT", "30"))
+# Kết nối nhàn rỗi lâu hơn mức này được kiểm tra bằng NOOP trước khi dùng lại
+MAIL_IDLE_CHECK = int(os.getenv("MAIL_IDLE_CHECK", "30"))
+# Email ở trạng thái sending quá lâu (worker dừng giữa chừng) được trả lại hàng đợi
+MAIL_CLAIM_TIMEOUT = int(os.getenv("MAIL_CLAIM_TIMEOUT", "300"))
+MAIL_OUTBOX_RETENTION_DAYS = int(os.getenv("MAIL_OUTBOX_RETENTION_DAYS", "7"))
+MAIL_OUTBOX_PURGE_INTERVAL = int(os.getenv("MAIL_OUTBOX_PURGE_INTERVAL", "3600"))
+MAIL_OUTBOX_PURGE_BATCH = int(os.getenv("MAIL_OUTBOX_PURGE_BATCH", str(DEFAULT_PURGE_BATCH)))
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "email")
+
+_templates = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+)
+
+def render(template: str, context: Dict) -> str:
+    return _templates.get_template(template).render(**context)
+
+# ==================== KẾT NỐI SMTP ====================
+
+class SMTPConnection:
+    """Kết nối SMTP dùng lại giữa các lần gửi; cấu hình đọc từ MAIL_* khi kết nối"""
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(os.getenv("MAIL_SERVER", "localhost"), int(os.getenv("MAIL_PORT", "587")), timeout=MAIL_SEND_TIMEOUT)
+        if os.getenv("MAIL_STARTTLS", "1") == "1":
+            smtp.starttls()
+        username = os.getenv("MAIL_USERNAME")
+        if username:
+            smtp.login(username, os.getenv("MAIL_PASSWORD"))
+        self.connects += 1
+        return smtp
+
+    def _alive(self) -> bool:
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message: EmailMessage):
+        with self._lock:
+            if self._smtp is not None and time.monotonic() - self._last_used > MAIL_IDLE_CHECK and not self._alive():
+                self._close()
+            for retry in (True, False):
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                try:
+                    self._smtp.send_message(message)
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    # Server đóng kết nối giữa chừng: kết nối lại và gửi lại một lần
+                    self._close()
+                    if not retry:
+                        raise
+            self._last_used = time.monotonic()
+
+    def _close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+connection = SMTPConnection()
+
+def close_connection():
+    connection.close()
+
+# ==================== OUTBOX ====================
+
+def enqueue_mail(db: Session, to_email: str, subject: str, template: str, context: Dict) -> MailOutbox:
+    """Thêm email vào outbox; được gửi sau khi caller commit"""
+    mail = MailOutbox(to_email=to_email, subject=subject, template=template, context=json.dumps(context))
+    db.add(mail)
+    return mail
+
+def notify_worker():
+    """Đánh thức job gửi email (gọi sau khi commit)"""
+    from app.services.scheduler import scheduler
+    scheduler.wake("mail_outbox")
+
+def _build_message(mail: MailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = mail.subject
+    message["From"] = os.getenv("MAIL_FROM") or os.getenv("MAIL_USERNAME") or "no-reply@leafsense.local"
+    message["To"] = mail.to_email
+    message.set_content(render(mail.template, json.loads(mail.context)), subtype="html")
+    return message
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(MAIL_RETRY_MAX, MAIL_RETRY_BASE * 2 ** (attempts - 1)))
+
+def _server_unavailable(error: Exception) -> bool:
+    """Lỗi của server/cấu hình chứ không phải của email: dừng lô, thử lại sau"""
+    return isinstance(error, (
+        smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError,
+        smtplib.SMTPSenderRefused, ConnectionError, TimeoutError, socket.gaierror,
+    ))
+
+def _permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+def _claim(db: Session, now: datetime, limit: int):
+    ids = [row.id for row in db.query(MailOutbox.id).filter(
+        MailOutbox.status == "pending",
+        MailOutbox.next_attempt_at <= now
+    ).order_by(MailOutbox.id).limit(limit)]
+    if not ids:
+        return []
+
+    token = secrets.token_hex(16)
+    db.execute(
+        update(MailOutbox)
+        .where(MailOutbox.id.in_(ids), MailOutbox.status == "pending")
+        .values(status="sending", claim_token=token, next_attempt_at=now + timedelta(seconds=MAIL_CLAIM_TIMEOUT))
+    )
+    db.commit()
+    return db.query(MailOutbox).filter(MailOutbox.claim_token == token).order_by(MailOutbox.id).all()
+
+def deliver_pending(db: Session, batch_size: int = MAIL_BATCH_SIZE, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Gửi toàn bộ email đến hạn theo từng lô; trả về số email sent/retry/failed"""
+    now = now or datetime.utcnow()
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+
+    db.execute(
+        update(MailOutbox)
+        .where(MailOutbox.status == "sending", MailOutbox.next_attempt_at <= now)
+        .values(status="pending")
+    )
+    db.commit()
+
+    while True:
+        batch = _claim(db, now, batch_size)
+        unavailable = False
+        for mail in batch:
+            if unavailable:
+                # Server không dùng được: trả các email còn lại về hàng đợi, không tính lượt thử
+                mail.status = "pending"
+                mail.next_attempt_at = datetime.utcnow() + _backoff(1)
+            else:
+                try:
+                    connection.send(_build_message(mail))
+                    mail.status = "sent"
+                    mail.sent_at = datetime.utcnow()
+                    mail.last_error = None
+                    # Không giữ lại link/token trong context sau khi đã gửi
+                    mail.context = "{}"
+                    counts["sent"] += 1
+                except Exception as e:
+                    unavailable = _server_unavailable(e)
+                    mail.attempts += 1
+                    mail.last_error = str(e)[:500]
+                    if (_permanent(e) and not unavailable) or mail.attempts >= MAIL_MAX_ATTEMPTS:
+                        mail.status = "failed"
+                        counts["failed"] += 1
+                        logger.error(f"Mail {mail.id} to {mail.to_email} failed: {e}")
+                    else:
+                        mail.status = "pending"
+                        mail.next_attempt_at = datetime.utcnow() + _backoff(mail.attempts)
+                        counts["retry"] += 1
+                        logger.warning(f"Mail {mail.id} to {mail.to_email} will be retried: {e}")
+            mail.claim_token = None
+            # Commit từng email để email đã gửi không bị gửi lại nếu worker dừng giữa lô
+            db.commit()
+        if unavailable or len(batch) < batch_size:
+            break
+
+    if any(counts.values()):
+        logger.info(f"Mail outbox: {counts}")
+    return counts
+
+def purge_finished(db: Session, now: Optional[datetime] = None, batch_size: int = MAIL_OUTBOX_PURGE_BATCH) -> int:
+    """Xóa email sent/failed cũ hơn MAIL_OUTBOX_RETENTION_DAYS; trả về số dòng đã xóa"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=MAIL_OUTBOX_RETENTION_DAYS)
+    purged = delete_in_batches(
+        db, MailOutbox,
+        and_(MailOutbox.status.in_(("sent", "failed")), MailOutbox.created_at < cutoff),
+        batch_size,
+    )
+
+    if purged:
+        logger.info(f"Purged {purged} finished mails from outbox")
+    return purged
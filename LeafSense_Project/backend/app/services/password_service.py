@@ -0,0 +1,107 @@
+"""
+Băm và kiểm tra mật khẩu trong một thread pool riêng có giới hạn
+
+bcrypt cố ý chậm (~0.2-0.3s mỗi lần ở cost 12). Nếu chạy ngay trong handler,
+một đợt đăng nhập dồn dập sẽ chiếm hết threadpool chung của FastAPI và các
+endpoint khác phải chờ. Ở đây:
+
+- Việc băm chạy trong PASSWORD_HASH_WORKERS thread riêng; handler chỉ await.
+- Tối đa PASSWORD_HASH_MAX_PENDING yêu cầu được xếp hàng cùng lúc; vượt quá thì
+  raise PasswordHasherBusy (app trả về 503 + Retry-After) thay vì để hàng đợi
+  dài vô hạn.
+- Cost factor cấu hình qua PASSWORD_HASH_ROUNDS. Hash có cost khác (hoặc hash
+  SHA-256 cũ do create_admin.py tạo) vẫn đăng nhập được và được băm lại với
+  cost hiện tại ngay khi đăng nhập thành công.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import bcrypt
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+RETRY_AFTER_SECONDS = 1
+
+# bcrypt chỉ dùng 72 byte đầu (bcrypt >= 5 báo lỗi nếu dài hơn)
+BCRYPT_MAX_BYTES = 72
+
+class PasswordHasherBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy"""
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+_pending_lock = threading.Lock()
+
+# ==================== HÀM ĐỒNG BỘ ====================
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+def _is_bcrypt(hashed: str) -> bool:
+    return hashed.startswith(("$2a$", "$2b$", "$2y$"))
+
+def hash_password_sync(password: str, rounds: int = None) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds or PASSWORD_HASH_ROUNDS)).decode("ascii")
+
+def verify_password_sync(password: str, hashed: Optional[str]) -> bool:
+    if not hashed:
+        return False
+    if _is_bcrypt(hashed):
+        try:
+            return bcrypt.checkpw(_secret(password), hashed.encode("ascii"))
+        except ValueError:
+            return False
+    # Hash SHA-256 dạng hex của các tài khoản tạo bằng create_admin.py
+    legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return hmac.compare_digest(legacy, hashed)
+
+def needs_rehash(hashed: str) -> bool:
+    """Hash không phải bcrypt hoặc có cost khác PASSWORD_HASH_ROUNDS"""
+    if not _is_bcrypt(hashed):
+        return True
+    try:
+        return int(hashed.split("$")[2]) != PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _verify_and_update(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if not verify_password_sync(password, hashed):
+        return False, None
+    return True, hash_password_sync(password) if needs_rehash(hashed) else None
+
+# ==================== HÀM ASYNC (DÙNG TRONG HANDLER) ====================
+
+@contextmanager
+def _slot():
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHasherBusy()
+        _pending += 1
+    try:
+        yield
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+async def _run(func, *args):
+    with _slot():
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+async def verify_password(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """(khớp hay không, hash mới nếu cần lưu lại với cost hiện tại)"""
+    return await _run(_verify_and_update, password, hashed)
+
+def pending() -> int:
+    return _pending
@@ -0,0 +1,196 @@
+"""
+Tìm kiếm full-text cho sản phẩm (tên, mô tả, danh mục)
+
+- SQLite: bảng ảo FTS5 `products_fts`, xếp hạng bằng bm25
+- PostgreSQL: bảng `products_search` chứa tsvector (GIN index), xếp hạng bằng ts_rank
+- Dialect khác: fallback về LIKE trên tên/mô tả
+
+Văn bản được bỏ dấu tiếng Việt trước khi đánh chỉ mục và trước khi tìm,
+nên "thuoc tri gi sat" khớp với "Thuốc trị gỉ sắt". Chỉ mục được cập nhật
+qua ORM event trong cùng transaction với thao tác trên products/categories.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import Float, Integer, event, func, inspect, or_, select, text
+from sqlalchemy.orm import Query
+
+from app.models.category import Category
+from app.models.product import Product
+
+SQLITE_TABLE = "products_fts"
+POSTGRES_TABLE = "products_search"
+
+# Trọng số cột cho bm25: tên > danh mục > mô tả
+BM25_WEIGHTS = "10.0, 1.0, 3.0"
+
+def normalize_text(value: Optional[str]) -> str:
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường"""
+    if not value:
+        return ""
+    value = value.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", value)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn").lower()
+
+def tokenize(search: str):
+    return re.findall(r"\w+", normalize_text(search))
+
+# ==================== SCHEMA ====================
+
+def init_search(engine):
+    """Tạo bảng chỉ mục nếu chưa có và rebuild khi lệch với bảng products"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+                "USING fts5(name, description, category, tokenize='unicode61', prefix='2 3')"
+            ))
+        elif dialect == "postgresql":
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+                "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL)"
+            ))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{POSTGRES_TABLE}_document "
+                f"ON {POSTGRES_TABLE} USING GIN (document)"
+            ))
+        else:
+            return
+
+        indexed = conn.execute(text(f"SELECT COUNT(*) FROM {_table_name(dialect)}")).scalar()
+        total = conn.execute(select(func.count()).select_from(Product.__table__)).scalar()
+        if indexed != total:
+            rebuild_index(conn)
+
+def rebuild_index(conn):
+    """Đánh chỉ mục lại toàn bộ sản phẩm"""
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return
+    conn.execute(text(f"DELETE FROM {_table_name(dialect)}"))
+    rows = conn.execute(
+        select(Product.id, Product.name, Product.description, Category.name)
+        .outerjoin(Category, Product.category_id == Category.id)
+    ).all()
+    if rows:
+        conn.execute(_insert_statement(dialect), [
+            _document_params(product_id, name, description, category_name)
+            for product_id, name, description, category_name in rows
+        ])
+
+def _table_name(dialect: str) -> str:
+    return SQLITE_TABLE if dialect == "sqlite" else POSTGRES_TABLE
+
+def _document_params(product_id, name, description, category_name) -> dict:
+    return {
+        "id": product_id,
+        "name": normalize_text(name),
+        "description": normalize_text(description),
+        "category": normalize_text(category_name),
+    }
+
+def _insert_statement(dialect: str):
+    if dialect == "sqlite":
+        return text(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, name, description, category) "
+            "VALUES (:id, :name, :description, :category)"
+        )
+    return text(
+        f"INSERT INTO {POSTGRES_TABLE} (product_id, document) VALUES (:id, "
+        "setweight(to_tsvector('simple', :name), 'A') || "
+        "setweight(to_tsvector('simple', :category), 'B') || "
+        "setweight(to_tsvector('simple', :description), 'C')) "
+        "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+    )
+
+def _delete_statement(dialect: str):
+    if dialect == "sqlite":
+        return text(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = :id")
+    return text(f"DELETE FROM {POSTGRES_TABLE} WHERE product_id = :id")
+
+# ==================== ĐỒNG BỘ CHỈ MỤC ====================
+
+def _index_products(conn, params: list):
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql") or not params:
+        return
+    if dialect == "sqlite":
+        # FTS5 không hỗ trợ upsert: xóa rồi chèn lại
+        conn.execute(_delete_statement(dialect), [{"id": p["id"]} for p in params])
+    conn.execute(_insert_statement(dialect), params)
+
+@event.listens_for(Product, "after_insert")
+@event.listens_for(Product, "after_update")
+def _sync_product(mapper, connection, target):
+    state = inspect(target)
+    if state.persistent and not any(
+        state.attrs[attr].history.has_changes() for attr in ("name", "description", "category_id")
+    ):
+        return
+    category_name = None
+    if target.category_id is not None:
+        category_name = connection.execute(
+            select(Category.name).where(Category.id == target.category_id)
+        ).scalar()
+    _index_products(connection, [
+        _document_params(target.id, target.name, target.description, category_name)
+    ])
+
+@event.listens_for(Product, "after_delete")
+def _remove_product(mapper, connection, target):
+    if connection.dialect.name in ("sqlite", "postgresql"):
+        connection.execute(_delete_statement(connection.dialect.name), {"id": target.id})
+
+@event.listens_for(Category, "after_update")
+def _sync_category(mapper, connection, target):
+    if not inspect(target).attrs.name.history.has_changes():
+        return
+    rows = connection.execute(
+        select(Product.id, Product.name, Product.description).where(Product.category_id == target.id)
+    ).all()
+    _index_products(connection, [
+        _document_params(product_id, name, description, target.name)
+        for product_id, name, description in rows
+    ])
+
+# ==================== TRUY VẤN ====================
+
+def search_subquery(dialect: str, search: str):
+    """Trả về subquery (product_id, rank) — rank nhỏ hơn là liên quan hơn"""
+    tokens = tokenize(search)
+    if not tokens:
+        return None
+
+    if dialect == "sqlite":
+        # AND các token, mỗi token khớp theo tiền tố
+        match = " ".join(f'"{token}"*' for token in tokens)
+        stmt = text(
+            f"SELECT rowid AS product_id, bm25({SQLITE_TABLE}, {BM25_WEIGHTS}) AS rank "
+            f"FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH :match"
+        ).bindparams(match=match)
+    elif dialect == "postgresql":
+        match = " & ".join(f"{token}:*" for token in tokens)
+        stmt = text(
+            f"SELECT product_id, -ts_rank(document, to_tsquery('simple', :match)) AS rank "
+            f"FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('simple', :match)"
+        ).bindparams(match=match)
+    else:
+        return None
+
+    return stmt.columns(product_id=Integer, rank=Float).subquery("product_search")
+
+def apply_search(query: Query, search: str) -> Query:
+    """Lọc và sắp xếp query Product theo độ liên quan với từ khóa"""
+    dialect = query.session.get_bind().dialect.name
+    subquery = search_subquery(dialect, search)
+    if subquery is None:
+        pattern = f"%{search.strip()}%"
+        return query.filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+
+    return query.join(subquery, subquery.c.product_id == Product.id).order_by(
+        subquery.c.rank, Product.id
+    )
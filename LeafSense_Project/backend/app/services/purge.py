@@ -0,0 +1,28 @@
+"""
+Xóa dữ liệu cũ theo lô cho các job dọn dẹp của scheduler
+
+Mỗi lô là một câu DELETE ... WHERE id IN (SELECT id ... LIMIT n) và được
+commit riêng, để không giữ lock lâu khi bảng còn nhiều dữ liệu cũ.
+"""
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+# Giữ dưới giới hạn 999 tham số của SQLite cũ (mỗi id là một tham số)
+DEFAULT_PURGE_BATCH = 900
+
+def delete_in_batches(db: Session, model, condition, batch_size: int = DEFAULT_PURGE_BATCH) -> int:
+    """Xóa các dòng của model thỏa condition; trả về số dòng đã xóa"""
+    stale = select(model.id).where(condition).limit(batch_size)
+
+    purged = 0
+    while True:
+        ids = db.execute(stale).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
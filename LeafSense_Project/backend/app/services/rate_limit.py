@@ -0,0 +1,229 @@
+"""
+Giới hạn tần suất request bằng token bucket
+
+Mỗi rule là một bucket có `capacity` token, được nạp lại đều đặn
+capacity/period token mỗi giây; mỗi request lấy 1 token, hết token thì trả
+429 kèm Retry-After. Bucket được tách theo khóa:
+
+- "ip":   địa chỉ client (X-Forwarded-For nếu RATE_LIMIT_TRUST_PROXY=1)
+- "user": email trong JWT; request không có token hợp lệ thì dùng IP
+
+RateLimitMiddleware áp các rule trong ROUTE_LIMITS theo (method, path). Các
+giới hạn cần dữ liệu trong body (ví dụ theo tài khoản + IP khi đăng nhập) được
+handler gọi trực tiếp qua rate_limiter.enforce().
+
+Mặc định bucket nằm trong bộ nhớ của từng worker. Khi chạy nhiều worker, đặt
+RATE_LIMIT_BACKEND_URL=redis://... để các worker dùng chung bucket trên Redis
+(cần cài package `redis`). Lỗi kết nối Redis không chặn request (fail-open).
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.services.auth_service import token_subject
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND_URL = os.getenv("RATE_LIMIT_BACKEND_URL", "")
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    name: str
+    capacity: int
+    period: float  # số giây để nạp đầy lại bucket
+    key: str = "ip"
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def from_env(cls, name: str, default: str, key: str = "ip") -> "RateLimitRule":
+        """Đọc cấu hình dạng "<số request>/<số giây>" từ RATE_LIMIT_<NAME>"""
+        capacity, period = os.getenv(f"RATE_LIMIT_{name.upper()}", default).split("/")
+        return cls(name, int(capacity), float(period), key)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def rate_limit_response(retry_after: float) -> JSONResponse:
+    seconds = max(1, math.ceil(retry_after))
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Bạn thao tác quá nhanh, vui lòng thử lại sau {seconds} giây"},
+        headers={"Retry-After": str(seconds)}
+    )
+
+# ==================== BACKEND ====================
+
+class MemoryBackend:
+    """Bucket trong bộ nhớ của worker hiện tại (LRU, tối đa max_buckets khóa)"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        """Lấy 1 token; trả về 0 nếu được phép, ngược lại số giây cần chờ"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            # Bucket bị bỏ ra ngoài coi như đã nạp đầy
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+# Nạp token và trừ trong một lệnh nguyên tử; dùng giờ của Redis để các worker
+# không phụ thuộc đồng hồ riêng
+_REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry)
+"""
+
+class RedisBackend:
+    """Bucket dùng chung giữa các worker trên Redis"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis  # dependency tùy chọn, chỉ cần khi dùng backend này
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[capacity, refill_rate]))
+        except Exception as e:
+            logger.warning(f"Rate limit backend unavailable, allowing request: {e}")
+            return 0.0
+
+def create_backend(url: str = RATE_LIMIT_BACKEND_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+# ==================== LIMITER ====================
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _request_key(request: Request, rule: RateLimitRule) -> str:
+    if rule.key == "user":
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        email = token_subject(token) if scheme.lower() == "bearer" and token else None
+        if email:
+            return f"user:{email}"
+    return f"ip:{client_ip(request)}"
+
+def login_account_key(request: Request, email: str) -> str:
+    """Khóa bucket đăng nhập theo (email, IP)
+
+    Chỉ theo email thì ai cũng có thể gửi sai mật khẩu liên tục để khóa đăng
+    nhập của người khác; ghép thêm IP để chỉ chặn chính client đang thử.
+    """
+    return f"{email.strip().lower()}|{client_ip(request)}"
+
+class RateLimiter:
+    def __init__(self, backend=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend or create_backend()
+        self.enabled = enabled
+
+    async def hit(self, rule: RateLimitRule, key: str) -> float:
+        """Lấy 1 token của rule cho key; trả về số giây cần chờ (0 nếu được phép)"""
+        if not self.enabled:
+            return 0.0
+        return await self.backend.take(f"{rule.name}:{key}", rule.capacity, rule.refill_rate)
+
+    async def enforce(self, rule: RateLimitRule, key: str):
+        """Dùng trong handler; raise RateLimitExceeded (-> 429) nếu hết token"""
+        retry_after = await self.hit(rule, key)
+        if retry_after > 0:
+            raise RateLimitExceeded(retry_after)
+
+    async def check_request(self, request: Request, rules: List[RateLimitRule]) -> float:
+        retry_after = 0.0
+        for rule in rules:
+            retry_after = max(retry_after, await self.hit(rule, _request_key(request, rule)))
+        return retry_after
+
+rate_limiter = RateLimiter()
+
+# ==================== CẤU HÌNH THEO ROUTE ====================
+
+LOGIN_IP = RateLimitRule.from_env("login_ip", "20/60")
+LOGIN_ACCOUNT = RateLimitRule.from_env("login_account", "10/300")
+FORGOT_PASSWORD_IP = RateLimitRule.from_env("forgot_password_ip", "5/300")
+FORGOT_PASSWORD_ACCOUNT = RateLimitRule.from_env("forgot_password_account", "3/3600")
+ANALYZE_USER = RateLimitRule.from_env("analyze_user", "10/60", key="user")
+ANALYZE_IP = RateLimitRule.from_env("analyze_ip", "30/60")
+
+ROUTE_LIMITS: Dict[Tuple[str, str], List[RateLimitRule]] = {
+    ("POST", "/api/auth/login"): [LOGIN_IP],
+    ("POST", "/api/admin/login"): [LOGIN_IP],
+    ("POST", "/api/auth/forgot-password"): [FORGOT_PASSWORD_IP],
+    ("POST", "/api/prediction/analyze"): [ANALYZE_USER, ANALYZE_IP],
+}
+
+class RateLimitMiddleware:
+    """ASGI middleware áp các rule trong ROUTE_LIMITS (hoặc `routes` truyền vào)"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, routes: Optional[Dict] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+        self.routes = ROUTE_LIMITS if routes is None else routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            rules = self.routes.get((scope["method"], scope["path"].rstrip("/") or "/"))
+            if rules:
+                retry_after = await self.limiter.check_request(Request(scope), rules)
+                if retry_after > 0:
+                    await rate_limit_response(retry_after)(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
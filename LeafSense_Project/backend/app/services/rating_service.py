@@ -0,0 +1,75 @@
+"""
+Điểm đánh giá tổng hợp của sản phẩm
+
+products lưu sẵn review_count, rating_sum, avg_rating và số review theo từng
+mức sao (rating_1_count .. rating_5_count). Mỗi lần tạo/sửa/xóa review chỉ
+cộng trừ delta bằng một câu UPDATE trong cùng transaction, nên trang catalog
+sắp xếp theo đánh giá không cần đọc bảng reviews.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.models.review import Review
+
+RATING_LEVELS = (1, 2, 3, 4, 5)
+
+def _count_column(level: int):
+    return getattr(Product, f"rating_{level}_count")
+
+def _average(rating_sum, review_count):
+    return case(
+        (review_count > 0, cast(rating_sum, Float) / review_count),
+        else_=0.0,
+    )
+
+def apply_review_change(db: Session, product_id: int, added: Optional[int] = None, removed: Optional[int] = None):
+    """Cập nhật tổng hợp khi một review được thêm (added), xóa (removed)
+    hoặc đổi số sao (cả hai)"""
+    if added == removed:
+        return
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+
+    # Vế phải của SET đọc giá trị cũ của dòng nên tính avg từ giá trị cũ + delta
+    review_count = Product.review_count + count_delta
+    rating_sum = Product.rating_sum + sum_delta
+    values = {
+        Product.review_count: review_count,
+        Product.rating_sum: rating_sum,
+        Product.avg_rating: _average(rating_sum, review_count),
+    }
+    if added is not None:
+        values[_count_column(added)] = _count_column(added) + 1
+    if removed is not None:
+        values[_count_column(removed)] = _count_column(removed) - 1
+
+    db.execute(
+        update(Product).where(Product.id == product_id).values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+def recompute_ratings(db: Session, product_ids: Optional[Iterable[int]] = None):
+    """Tính lại toàn bộ tổng hợp từ bảng reviews (migration / đối soát)"""
+    def aggregate(expression):
+        return select(func.coalesce(expression, 0)).where(
+            Review.product_id == Product.id
+        ).scalar_subquery()
+
+    review_count = aggregate(func.count(Review.id))
+    rating_sum = aggregate(func.sum(Review.rating))
+    values = {
+        Product.review_count: review_count,
+        Product.rating_sum: rating_sum,
+        Product.avg_rating: _average(rating_sum, review_count),
+    }
+    for level in RATING_LEVELS:
+        values[_count_column(level)] = aggregate(func.sum(case((Review.rating == level, 1), else_=0)))
+
+    stmt = update(Product).values(values)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(list(product_ids)))
+    db.execute(stmt.execution_options(synchronize_session=False))
@@ -0,0 +1,289 @@
+"""
+Gợi ý sản phẩm theo bệnh cây
+
+Điểm của mỗi sản phẩm cho một loại bệnh được tính từ:
+- độ liên quan: số từ khóa của bệnh khớp với tên/mô tả/danh mục (full-text search)
+- co-purchase: số lượng đã bán cho những user từng phát hiện bệnh đó (OrderItem)
+- đánh giá: điểm trung bình Review (làm mượt Bayes để sản phẩm ít review không lấn át)
+- tồn kho: sản phẩm hết hàng bị đẩy xuống cuối
+
+Kết quả được tính sẵn vào bảng product_recommendations. Việc refresh chạy
+tăng dần: chỉ những bệnh bị ảnh hưởng bởi OrderItem/Review/DiseasePrediction
+mới (sau watermark) mới được tính lại. Sản phẩm mới (watermark trên products)
+hoặc thay đổi catalog (invalidate_catalog: admin sửa/xóa sản phẩm) làm mọi
+danh sách được tính lại. Endpoint đọc bảng đã tính sẵn; khi lọc theo danh mục
+mà bảng không đủ sản phẩm thì bổ sung bằng truy vấn xếp hạng trong danh mục.
+
+Cần các cột đánh giá của products (migration_ratings.py); migration_recommendations.py
+tự chạy migration đó nếu database chưa có.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.disease_prediction import DiseasePrediction
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.models.product_recommendation import ProductRecommendation
+from app.models.review import Review
+from app.models.watermark import Watermark
+from app.services import product_search
+from app.services.catalog_cache import catalog_cache
+from app.services.watermarks import IncrementalRefresh, get_watermark, max_id
+
+logger = logging.getLogger(__name__)
+
+GENERAL = "general"
+HEALTHY = "nodisease"
+
+# Từ khóa tìm sản phẩm điều trị cho từng loại bệnh
+DISEASE_KEYWORDS = {
+    "rust": ["gỉ sắt", "rỉ sắt", "rust", "nấm"],
+    "phoma": ["phoma", "khô cành", "thối cành", "nấm"],
+    "miner": ["sâu đục lá", "sâu vẽ bùa", "miner", "trừ sâu"],
+    HEALTHY: ["phân bón", "dinh dưỡng"],
+}
+ALL_KEYS = list(DISEASE_KEYWORDS) + [GENERAL]
+
+WEIGHT_RELEVANCE = 0.4
+WEIGHT_CO_PURCHASE = 0.3
+WEIGHT_RATING = 0.2
+WEIGHT_STOCK = 0.1
+# Làm mượt Bayes: coi như mỗi sản phẩm có sẵn vài review ở mức trung bình
+RATING_PRIOR_COUNT = 3
+RATING_PRIOR_MEAN = 3.0
+
+TOP_N = int(os.getenv("RECOMMENDATION_TOP_N", "20"))
+REFRESH_INTERVAL = int(os.getenv("RECOMMENDATION_REFRESH_INTERVAL", "300"))
+# Khoảng cách tối thiểu giữa hai lượt refresh do catalog thay đổi (checkout cũng đổi tồn kho)
+CATALOG_REFRESH_INTERVAL = int(os.getenv("RECOMMENDATION_CATALOG_REFRESH_INTERVAL", "30"))
+RECENT_PREDICTIONS = 5
+
+WATERMARK_SOURCES = {
+    "recommendations.order_items": OrderItem,
+    "recommendations.reviews": Review,
+    "recommendations.disease_predictions": DiseasePrediction,
+    "recommendations.products": Product,
+}
+
+# Phiên bản catalog_cache tại lượt refresh gần nhất (tăng mỗi lần invalidate_catalog)
+_catalog_version = None
+
+# ==================== TÍNH ĐIỂM ====================
+
+def _keyword_hits(db: Session, disease: str) -> Dict[int, int]:
+    hits = defaultdict(int)
+    for keyword in DISEASE_KEYWORDS.get(disease, []):
+        query = product_search.apply_search(db.query(Product.id), keyword)
+        for (product_id,) in query.all():
+            hits[product_id] += 1
+    return hits
+
+def _co_purchases(db: Session, disease: str) -> Dict[int, int]:
+    query = db.query(OrderItem.product_id, func.sum(OrderItem.quantity)).join(
+        Order, Order.id == OrderItem.order_id
+    )
+    if disease != GENERAL:
+        buyers = db.query(DiseasePrediction.user_id).filter(
+            DiseasePrediction.disease_type == disease
+        ).distinct()
+        query = query.filter(Order.user_id.in_(buyers))
+    return {product_id: int(total or 0) for product_id, total in query.group_by(OrderItem.product_id).all()}
+
+def _ratings(db: Session, product_ids: Iterable[int]) -> Dict[int, float]:
+    # Đọc tổng hợp đã lưu trên products (rating_service), không quét bảng reviews
+    rows = db.query(Product.id, Product.rating_sum, Product.review_count).filter(
+        Product.id.in_(list(product_ids))
+    ).all()
+    return {
+        product_id: ((total or 0) + RATING_PRIOR_MEAN * RATING_PRIOR_COUNT) / ((count or 0) + RATING_PRIOR_COUNT)
+        for product_id, total, count in rows
+    }
+
+def score_products(db: Session, disease: str) -> List[tuple]:
+    """Trả về [(product_id, score)] đã sắp xếp giảm dần cho một loại bệnh"""
+    hits = _keyword_hits(db, disease) if disease != GENERAL else {}
+    purchases = _co_purchases(db, disease)
+
+    if disease == GENERAL:
+        candidates = {product_id for (product_id,) in db.query(Product.id).all()}
+    else:
+        candidates = set(hits) | set(purchases)
+    if not candidates:
+        return []
+
+    stock = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(candidates)).all())
+    ratings = _ratings(db, candidates)
+    keyword_count = max(len(DISEASE_KEYWORDS.get(disease, [])), 1)
+    max_purchases = max(purchases.values(), default=0) or 1
+
+    scored = []
+    for product_id in candidates:
+        if product_id not in stock:
+            continue
+        score = (
+            WEIGHT_RELEVANCE * hits.get(product_id, 0) / keyword_count
+            + WEIGHT_CO_PURCHASE * purchases.get(product_id, 0) / max_purchases
+            + WEIGHT_RATING * ratings.get(product_id, RATING_PRIOR_MEAN) / 5
+            + WEIGHT_STOCK * (1 if (stock[product_id] or 0) > 0 else 0)
+        )
+        scored.append((product_id, round(score, 6)))
+
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:TOP_N]
+
+# ==================== REFRESH ====================
+
+def _affected_diseases(db: Session, watermarks: Dict[str, Watermark]) -> Set[str]:
+    # Sản phẩm mới hoặc catalog thay đổi: điểm của mọi bệnh có thể đổi
+    last_product = watermarks["recommendations.products"].last_id
+    if _catalog_version != catalog_cache.version or db.query(
+        db.query(Product.id).filter(Product.id > last_product).exists()
+    ).scalar():
+        return set(ALL_KEYS)
+
+    affected = set()
+
+    last_prediction = watermarks["recommendations.disease_predictions"].last_id
+    affected.update(
+        disease for (disease,) in db.query(DiseasePrediction.disease_type).filter(
+            DiseasePrediction.id > last_prediction
+        ).distinct().all()
+    )
+
+    last_item = watermarks["recommendations.order_items"].last_id
+    new_buyers = db.query(Order.user_id).join(OrderItem, OrderItem.order_id == Order.id).filter(
+        OrderItem.id > last_item
+    ).distinct()
+    if db.query(new_buyers.exists()).scalar():
+        affected.add(GENERAL)
+        affected.update(
+            disease for (disease,) in db.query(DiseasePrediction.disease_type).filter(
+                DiseasePrediction.user_id.in_(new_buyers)
+            ).distinct().all()
+        )
+        # Tồn kho của sản phẩm vừa bán thay đổi (đặt hàng không invalidate_catalog)
+        sold = db.query(OrderItem.product_id).filter(OrderItem.id > last_item).distinct()
+        affected.update(
+            disease for (disease,) in db.query(ProductRecommendation.disease_type).filter(
+                ProductRecommendation.product_id.in_(sold)
+            ).distinct().all()
+        )
+
+    last_review = watermarks["recommendations.reviews"].last_id
+    reviewed = db.query(Review.product_id).filter(Review.id > last_review).distinct()
+    if db.query(reviewed.exists()).scalar():
+        affected.add(GENERAL)
+        affected.update(
+            disease for (disease,) in db.query(ProductRecommendation.disease_type).filter(
+                ProductRecommendation.product_id.in_(reviewed)
+            ).distinct().all()
+        )
+
+    return {disease for disease in affected if disease in ALL_KEYS}
+
+def refresh_recommendations(db: Session, full: bool = False) -> List[str]:
+    """Tính lại bảng gợi ý cho các bệnh bị ảnh hưởng; trả về danh sách đã tính lại"""
+    global _catalog_version
+    catalog_version = catalog_cache.version
+    watermarks = {name: get_watermark(db, name) for name in WATERMARK_SOURCES}
+    has_rows = db.query(ProductRecommendation.id).first() is not None
+    diseases = ALL_KEYS if full or not has_rows else sorted(_affected_diseases(db, watermarks))
+
+    new_marks = {name: max_id(db, model) for name, model in WATERMARK_SOURCES.items()}
+
+    now = datetime.utcnow()
+    for disease in diseases:
+        db.query(ProductRecommendation).filter(
+            ProductRecommendation.disease_type == disease
+        ).delete(synchronize_session=False)
+        db.bulk_insert_mappings(ProductRecommendation, [
+            {"disease_type": disease, "product_id": product_id, "rank": rank,
+             "score": score, "updated_at": now}
+            for rank, (product_id, score) in enumerate(score_products(db, disease), start=1)
+        ])
+
+    for name, last_id in new_marks.items():
+        watermarks[name].last_id = last_id
+    db.commit()
+    _catalog_version = catalog_version
+
+    if diseases:
+        logger.info(f"Refreshed recommendations for: {', '.join(diseases)}")
+    return list(diseases)
+
+_background = IncrementalRefresh("Recommendation", lambda db: refresh_recommendations(db))
+
+def refresh_in_background():
+    """Refresh với session riêng; bỏ qua nếu đang có lượt refresh khác"""
+    _background.run()
+
+def needs_refresh() -> bool:
+    elapsed = _background.elapsed()
+    if _catalog_version != catalog_cache.version:
+        return elapsed > CATALOG_REFRESH_INTERVAL
+    return elapsed > REFRESH_INTERVAL
+
+def has_recommendations(db: Session) -> bool:
+    return db.query(ProductRecommendation.id).first() is not None
+
+# ==================== ĐỌC GỢI Ý ====================
+
+def recent_disease(db: Session, user_id: int) -> Optional[str]:
+    """Bệnh được phát hiện gần đây nhất của user (ưu tiên bệnh thật hơn 'nodisease')"""
+    recent = db.query(DiseasePrediction.disease_type).filter(
+        DiseasePrediction.user_id == user_id
+    ).order_by(DiseasePrediction.created_at.desc()).limit(RECENT_PREDICTIONS).all()
+    diseases = [disease for (disease,) in recent if disease in DISEASE_KEYWORDS]
+    for disease in diseases:
+        if disease != HEALTHY:
+            return disease
+    return diseases[0] if diseases else None
+
+def _ranked_products(db: Session, category_id: Optional[int], exclude: Set[int], limit: int) -> List[Product]:
+    """Xếp hạng trực tiếp trong catalog: còn hàng, rồi điểm đánh giá (làm mượt Bayes)"""
+    smoothed_rating = (Product.rating_sum + RATING_PRIOR_MEAN * RATING_PRIOR_COUNT) / (
+        Product.review_count + RATING_PRIOR_COUNT
+    )
+    query = db.query(Product).options(joinedload(Product.category))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    if exclude:
+        query = query.filter(~Product.id.in_(exclude))
+    return query.order_by(
+        case((Product.stock > 0, 0), else_=1), smoothed_rating.desc(), Product.id
+    ).limit(limit).all()
+
+def get_recommendations(
+    db: Session,
+    disease: Optional[str] = None,
+    category_id: Optional[int] = None,
+    limit: int = 10,
+) -> List[Product]:
+    """Đọc gợi ý đã tính sẵn (bệnh, rồi danh sách chung); thiếu thì bổ sung bằng _ranked_products
+
+    Bảng chỉ giữ TOP_N sản phẩm mỗi bệnh, nên danh mục nằm ngoài top vẫn nhận
+    đủ `limit` sản phẩm (hoặc toàn bộ danh mục nếu ít hơn).
+    """
+    products = []
+    for key in ([disease] if disease else []) + [GENERAL]:
+        query = db.query(Product).join(
+            ProductRecommendation, ProductRecommendation.product_id == Product.id
+        ).options(joinedload(Product.category)).filter(ProductRecommendation.disease_type == key)
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        if products:
+            query = query.filter(~Product.id.in_([product.id for product in products]))
+        products += query.order_by(ProductRecommendation.rank).limit(limit - len(products)).all()
+        if len(products) >= limit:
+            return products
+
+    products += _ranked_products(db, category_id, {product.id for product in products}, limit - len(products))
+    return products
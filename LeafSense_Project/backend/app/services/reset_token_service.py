@@ -0,0 +1,38 @@
+"""
+Dọn token đặt lại mật khẩu đã dùng hoặc hết hạn
+
+Token chỉ có hiệu lực 1 giờ nhưng trước đây không bao giờ bị xóa. Job
+"reset_token_purge" của scheduler xóa theo lô (RESET_TOKEN_PURGE_BATCH dòng
+mỗi transaction) để không giữ lock lâu khi bảng còn nhiều dữ liệu cũ.
+Lookup theo token dùng unique index, xóa theo user_id dùng
+ix_password_reset_tokens_user_id, purge dùng ix_password_reset_tokens_expires_at.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.users import PasswordResetToken
+from app.services.purge import DEFAULT_PURGE_BATCH, delete_in_batches
+
+logger = logging.getLogger(__name__)
+
+RESET_TOKEN_PURGE_INTERVAL = int(os.getenv("RESET_TOKEN_PURGE_INTERVAL", "3600"))
+RESET_TOKEN_PURGE_BATCH = int(os.getenv("RESET_TOKEN_PURGE_BATCH", str(DEFAULT_PURGE_BATCH)))
+
+def purge_tokens(db: Session, now: Optional[datetime] = None, batch_size: int = RESET_TOKEN_PURGE_BATCH) -> int:
+    """Xóa token đã dùng hoặc đã hết hạn; trả về số dòng đã xóa"""
+    now = now or datetime.utcnow()
+    purged = delete_in_batches(
+        db, PasswordResetToken,
+        or_(PasswordResetToken.expires_at < now, PasswordResetToken.used == True),
+        batch_size,
+    )
+
+    if purged:
+        logger.info(f"Purged {purged} password reset tokens")
+    return purged
@@ -0,0 +1,145 @@
+"""
+Scheduler chạy các job định kỳ trong vòng đời của app
+
+Mỗi job là một hàm đồng bộ, chạy trong thread pool (không chặn event loop)
+theo chu kỳ riêng; một job chỉ chạy một lượt tại một thời điểm và lỗi chỉ
+được ghi log, không dừng scheduler. Job dùng database nên viết dạng
+func(db) và đăng ký bằng session_job(). wake(name) cho job chạy ngay thay
+vì chờ hết chu kỳ (ví dụ gửi email vừa được xếp vào outbox).
+
+Khi chạy nhiều worker, mỗi worker có scheduler riêng — các job phải an toàn
+khi chạy lặp lại (các job hiện tại đều idempotent).
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], object]
+    interval: float
+    initial_delay: float = 0
+
+def session_job(func: Callable[[Session], object]) -> Callable[[], object]:
+    """Bọc func(db) thành job tự mở/đóng session riêng"""
+    def run():
+        from core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            return func(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    run.__name__ = getattr(func, "__name__", "session_job")
+    return run
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def add_job(self, name: str, func: Callable[[], object], interval: float, initial_delay: float = 0):
+        """Đăng ký job (tên trùng sẽ thay job cũ); có hiệu lực từ lần start() tiếp theo"""
+        self._jobs[name] = Job(name, func, interval, initial_delay)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._event_loop = loop
+        self._wakeups = {name: asyncio.Event() for name in self._jobs}
+        self._tasks = [loop.create_task(self._loop(job), name=f"job:{job.name}") for job in self._jobs.values()]
+        logger.info(f"Scheduler started: {', '.join(self._jobs) or 'no jobs'}")
+
+    def wake(self, name: str):
+        """Chạy job ngay thay vì chờ hết chu kỳ (gọi được từ bất kỳ thread nào)"""
+        event = self._wakeups.get(name)
+        if self._tasks and event is not None:
+            self._event_loop.call_soon_threadsafe(event.set)
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _loop(self, job: Job):
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeups[job.name]
+        await asyncio.sleep(job.initial_delay)
+        while True:
+            wakeup.clear()
+            try:
+                await loop.run_in_executor(None, job.func)
+            except Exception as e:
+                logger.error(f"Scheduled job '{job.name}' failed: {e}")
+            try:
+                await asyncio.wait_for(wakeup.wait(), job.interval)
+            except asyncio.TimeoutError:
+                pass
+
+scheduler = Scheduler()
+
+def register_default_jobs(target: Optional[Scheduler] = None) -> Scheduler:
+    """Các job định kỳ của LeafSense; chu kỳ (giây) cấu hình qua biến môi trường"""
+    from app.services import (
+        analytics_service, coupon_service, mail_service, recommendation_service, reset_token_service, stats_service,
+        token_service
+    )
+
+    target = target or scheduler
+    target.add_job(
+        "coupon_lifecycle", session_job(coupon_service.update_lifecycle),
+        interval=int(os.getenv("COUPON_LIFECYCLE_INTERVAL", "60")),
+    )
+    target.add_job(
+        "recommendations_refresh", recommendation_service.refresh_in_background,
+        interval=recommendation_service.REFRESH_INTERVAL, initial_delay=5,
+    )
+    target.add_job(
+        "analytics_refresh", analytics_service.refresh_in_background,
+        interval=analytics_service.REFRESH_INTERVAL, initial_delay=10,
+    )
+    target.add_job(
+        "stats_rollup", session_job(stats_service.rollup),
+        interval=stats_service.STATS_ROLLUP_INTERVAL, initial_delay=5,
+    )
+    target.add_job(
+        "stats_reconcile", session_job(stats_service.reconcile),
+        interval=int(os.getenv("STATS_RECONCILE_INTERVAL", "3600")), initial_delay=30,
+    )
+    target.add_job(
+        "mail_outbox", session_job(mail_service.deliver_pending),
+        interval=mail_service.MAIL_OUTBOX_INTERVAL, initial_delay=1,
+    )
+    target.add_job(
+        "mail_outbox_purge", session_job(mail_service.purge_finished),
+        interval=mail_service.MAIL_OUTBOX_PURGE_INTERVAL, initial_delay=60,
+    )
+    target.add_job(
+        "reset_token_purge", session_job(reset_token_service.purge_tokens),
+        interval=reset_token_service.RESET_TOKEN_PURGE_INTERVAL, initial_delay=60,
+    )
+    target.add_job(
+        "token_revocations", session_job(token_service.sync_revocations),
+        interval=token_service.TOKEN_REVOCATION_SYNC_INTERVAL, initial_delay=0,
+    )
+    return target
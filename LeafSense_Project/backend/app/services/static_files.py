@@ -0,0 +1,175 @@
+"""
+Phục vụ /uploads với cache HTTP, Range và file nén sẵn
+
+StaticFiles mặc định của Starlette 0.27 không có Cache-Control, ETag không có
+dấu nháy (If-None-Match từ trình duyệt không khớp) và không hỗ trợ Range.
+CachedStaticFiles bổ sung:
+
+- Cache-Control: file có tên là hash nội dung hoặc uuid (avatar, ảnh sản phẩm,
+  thumbnail — nội dung không bao giờ đổi dưới cùng một tên) được cache
+  STATIC_IMMUTABLE_MAX_AGE giây với `immutable`; file khác STATIC_MAX_AGE giây.
+- ETag dạng "..." và so khớp If-None-Match (danh sách, W/, *) / If-Modified-Since -> 304.
+- Range một đoạn (bytes=a-b, a-, -n) -> 206, If-Range, 416 khi ngoài phạm vi.
+- File nén sẵn: với loại nội dung nén được (svg, css, js, json...), nếu có
+  <file>.br hoặc <file>.gz và client chấp nhận thì gửi file đó kèm Content-Encoding.
+"""
+
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate
+from hashlib import md5
+from mimetypes import guess_type
+from typing import Optional, Tuple, Union
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.services.compression import accepts, compressible
+
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv("STATIC_IMMUTABLE_MAX_AGE", str(365 * 86400)))
+
+# <hash 32 ký tự hex> hoặc <prefix_>uuid4, ví dụ 8329...c7a3.webp, 1f0e...-....jpg
+_HASHED_NAME = re.compile(
+    r"(?:^|[_-])(?:[0-9a-f]{32,}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.[A-Za-z0-9]+$"
+)
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+def cache_control(path: str) -> str:
+    if _HASHED_NAME.search(os.path.basename(path)):
+        return f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+def _etag(stat_result: os.stat_result) -> str:
+    base = f"{stat_result.st_mtime}-{stat_result.st_size}".encode()
+    return f'"{md5(base, usedforsecurity=False).hexdigest()}"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """So khớp yếu theo RFC 9110 (bỏ qua tiền tố W/)"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def _parse_range(header: str, size: int) -> Union[None, bool, Tuple[int, int]]:
+    """(start, end) bao gồm end; None nếu ngoài phạm vi (416); False nếu bỏ qua Range"""
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        # Nhiều đoạn (multipart/byteranges) hiếm dùng: trả cả file
+        return False
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return None
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return False
+    if start >= size:
+        return None
+    if start > end:
+        return False
+    return start, min(end, size - 1)
+
+class FileRangeResponse(Response):
+    """Gửi `length` byte của file bắt đầu từ `start` (cả file khi start=0, length=size)"""
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, start: int, length: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None, method: str = "GET"):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if self.start:
+                await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File bị cắt ngắn trong lúc gửi
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = guess_type(full_path)[0] or "text/plain"
+        range_header = request_headers.get("range") if status_code == 200 else None
+        headers = {"cache-control": cache_control(full_path), "accept-ranges": "bytes"}
+
+        path = full_path
+        if compressible(media_type):
+            headers["vary"] = "Accept-Encoding"
+            if range_header is None:
+                for encoding, suffix in _PRECOMPRESSED:
+                    if not accepts(request_headers, encoding):
+                        continue
+                    try:
+                        variant = os.stat(full_path + suffix)
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(variant.st_mode):
+                        path, stat_result = full_path + suffix, variant
+                        headers["content-encoding"] = encoding
+                        break
+
+        etag = _etag(stat_result)
+        headers["etag"] = etag
+        headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        if self._not_modified(request_headers, etag, stat_result.st_mtime):
+            return NotModifiedResponse(Headers(headers))
+
+        size = stat_result.st_size
+        start, length = 0, size
+        if range_header and self._if_range_matches(request_headers, etag, headers["last-modified"]):
+            byte_range = _parse_range(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+            if byte_range:
+                start, end = byte_range
+                length = end - start + 1
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        headers["content-length"] = str(length)
+        return FileRangeResponse(
+            path, start, length, status_code=status_code, headers=headers,
+            media_type=media_type, method=scope["method"]
+        )
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, mtime: float) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+        last_modified = parsedate(formatdate(mtime, usegmt=True))
+        return if_modified_since is not None and if_modified_since >= last_modified
+
+    @staticmethod
+    def _if_range_matches(request_headers: Headers, etag: str, last_modified: str) -> bool:
+        """Range chỉ áp dụng khi If-Range (nếu có) khớp với phiên bản hiện tại"""
+        if_range = request_headers.get("if-range")
+        return if_range is None or if_range.strip() in (etag, last_modified)
@@ -0,0 +1,250 @@
+"""
+Bộ đếm thống kê cho dashboard admin
+
+Bảng stat_counters giữ các bộ đếm (user theo trạng thái, order theo trạng
+thái, số sản phẩm, doanh thu), nên dashboard chỉ cần đọc bảng nhỏ thay vì
+COUNT/SUM toàn bảng.
+
+ORM event trong transaction ghi users/orders/products chỉ chèn thêm dòng vào
+stat_counter_deltas, không cập nhật dòng bộ đếm: nếu mọi checkout cùng UPDATE
+dòng `orders.pending`/`revenue`, khóa dòng đó (Postgres) sẽ xếp hàng tất cả
+checkout đồng thời tới lúc commit. Job rollup() định kỳ gộp các delta vào
+stat_counters; get_counters() cộng thêm delta chưa gộp nên số liệu vẫn chính xác.
+
+Thao tác bulk bằng Core (bỏ qua ORM event) có thể làm lệch bộ đếm — reconcile()
+so sánh với số liệu thật và ghi delta bù lại.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict
+
+from sqlalchemy import String, cast, delete, event, func, inspect, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.order import Order, OrderStatus, order_status_value
+from app.models.product import Product
+from app.models.stat_counter import StatCounter, StatCounterDelta
+from app.models.users import User
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = "products"
+REVENUE = "revenue"
+USER_STATUSES = ("active", "inactive")
+ORDER_STATUSES = tuple(status.value for status in OrderStatus)
+# Giữ nguyên quy ước cũ của dashboard: doanh thu tính trên đơn đã hoàn tất
+REVENUE_STATUSES = ("completed", "delivered")
+STATS_ROLLUP_INTERVAL = int(os.getenv("STATS_ROLLUP_INTERVAL", "10"))
+
+COUNTER_NAMES = (
+    [f"users.{status}" for status in USER_STATUSES]
+    + [f"orders.{status}" for status in ORDER_STATUSES]
+    + [PRODUCTS, REVENUE]
+)
+
+_UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _value(enum_or_str):
+    return getattr(enum_or_str, "value", enum_or_str)
+
+# ==================== GHI BỘ ĐẾM ====================
+
+def _write(conn, values: Dict[str, Decimal], increment: bool):
+    """Cộng (increment=True) hoặc ghi đè giá trị cho các bộ đếm"""
+    if not values:
+        return
+    now = datetime.utcnow()
+    insert = _UPSERT_DIALECTS.get(conn.dialect.name)
+    if insert is not None:
+        stmt = insert(StatCounter)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StatCounter.name],
+            set_={
+                "value": StatCounter.value + stmt.excluded.value if increment else stmt.excluded.value,
+                "updated_at": now,
+            },
+        )
+        conn.execute(stmt, [
+            {"name": name, "value": value, "updated_at": now} for name, value in values.items()
+        ])
+        return
+
+    for name, value in values.items():
+        new_value = StatCounter.value + value if increment else value
+        result = conn.execute(
+            update(StatCounter).where(StatCounter.name == name).values(value=new_value, updated_at=now)
+        )
+        if result.rowcount == 0:
+            conn.execute(StatCounter.__table__.insert().values(name=name, value=value, updated_at=now))
+
+def _record(conn, values: Dict[str, Decimal]):
+    """Chèn delta (không khóa dòng bộ đếm nào); rollup() cộng vào stat_counters sau"""
+    if values:
+        conn.execute(insert(StatCounterDelta), [{"name": name, "delta": value} for name, value in values.items()])
+
+def _apply_delta(conn, before: Dict[str, Decimal], after: Dict[str, Decimal]):
+    delta = defaultdict(Decimal)
+    for name, value in after.items():
+        delta[name] += value
+    for name, value in before.items():
+        delta[name] -= value
+    _record(conn, {name: value for name, value in delta.items() if value})
+
+# ==================== ORM EVENT ====================
+
+def _previous(target, attr: str):
+    """Giá trị trước khi flush (bằng giá trị hiện tại nếu không đổi)"""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+def _user_counters(role, status) -> Dict[str, Decimal]:
+    if role != "farmer" or status is None:
+        return {}
+    return {f"users.{status}": Decimal(1)}
+
+def _order_counters(status, amount) -> Dict[str, Decimal]:
+    status = _value(status)
+    if status is None:
+        return {}
+    counters = {f"orders.{status}": Decimal(1)}
+    if status in REVENUE_STATUSES:
+        counters[REVENUE] = Decimal(amount or 0)
+    return counters
+
+@event.listens_for(User, "after_insert")
+def _user_inserted(mapper, connection, target):
+    _apply_delta(connection, {}, _user_counters(target.role, target.status))
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    _apply_delta(
+        connection,
+        _user_counters(_previous(target, "role"), _previous(target, "status")),
+        _user_counters(target.role, target.status),
+    )
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _apply_delta(connection, _user_counters(target.role, target.status), {})
+
+@event.listens_for(Order, "after_insert")
+def _order_inserted(mapper, connection, target):
+    _apply_delta(connection, {}, _order_counters(target.status, target.total_amount))
+
+@event.listens_for(Order, "after_update")
+def _order_updated(mapper, connection, target):
+    _apply_delta(
+        connection,
+        _order_counters(_previous(target, "status"), _previous(target, "total_amount")),
+        _order_counters(target.status, target.total_amount),
+    )
+
+@event.listens_for(Order, "after_delete")
+def _order_deleted(mapper, connection, target):
+    _apply_delta(connection, _order_counters(target.status, target.total_amount), {})
+
+@event.listens_for(Product, "after_insert")
+def _product_inserted(mapper, connection, target):
+    _apply_delta(connection, {}, {PRODUCTS: Decimal(1)})
+
+@event.listens_for(Product, "after_delete")
+def _product_deleted(mapper, connection, target):
+    _apply_delta(connection, {PRODUCTS: Decimal(1)}, {})
+
+# ==================== ĐỌC / ĐỐI SOÁT ====================
+
+def compute_counters(db: Session) -> Dict[str, Decimal]:
+    """Số liệu thật tính trực tiếp từ các bảng gốc"""
+    counters = {name: Decimal(0) for name in COUNTER_NAMES}
+
+    for status, count in db.query(User.status, func.count(User.id)).filter(
+        User.role == "farmer"
+    ).group_by(User.status).all():
+        if status is not None:
+            counters[f"users.{status}"] = Decimal(count)
+
+    # Đọc trạng thái dạng chuỗi: dòng cũ có trạng thái ngoài OrderStatus làm Enum lỗi LookupError
+    raw_status = cast(Order.status, String)
+    for raw, count, amount in db.query(
+        raw_status, func.count(Order.id), func.sum(Order.total_amount)
+    ).group_by(raw_status).all():
+        status = order_status_value(raw)
+        if status is None:
+            if raw is not None:
+                logger.warning("Bỏ qua %s đơn hàng có trạng thái không hợp lệ: %r", count, raw)
+            continue
+        counters[f"orders.{status}"] = Decimal(count)
+        if status in REVENUE_STATUSES:
+            counters[REVENUE] += Decimal(amount or 0)
+
+    counters[PRODUCTS] = Decimal(db.query(func.count(Product.id)).scalar() or 0)
+    return counters
+
+def _pending(db: Session) -> Dict[str, Decimal]:
+    """Tổng các delta chưa gộp theo từng bộ đếm"""
+    return {
+        name: Decimal(total or 0) for name, total in db.query(
+            StatCounterDelta.name, func.sum(StatCounterDelta.delta)
+        ).group_by(StatCounterDelta.name).all()
+    }
+
+def _current(db: Session) -> Dict[str, Decimal]:
+    """Giá trị bộ đếm = stat_counters + delta chưa gộp"""
+    counters = defaultdict(Decimal, {
+        name: Decimal(value or 0) for name, value in db.query(StatCounter.name, StatCounter.value).all()
+    })
+    for name, value in _pending(db).items():
+        counters[name] += value
+    return counters
+
+def rollup(db: Session) -> int:
+    """Gộp các delta vào stat_counters; trả về số delta đã gộp
+
+    DELETE ... RETURNING: chỉ cộng đúng những dòng đã xóa, kể cả dòng được
+    commit muộn trong lúc job chạy.
+    """
+    rows = db.execute(
+        delete(StatCounterDelta).returning(StatCounterDelta.name, StatCounterDelta.delta)
+    ).all()
+    totals = defaultdict(Decimal)
+    for name, value in rows:
+        totals[name] += Decimal(value)
+    _write(db.connection(), {name: value for name, value in totals.items() if value}, increment=True)
+    db.commit()
+    return len(rows)
+
+def get_counters(db: Session) -> Dict[str, Decimal]:
+    """Đọc bộ đếm (cộng delta chưa gộp); khởi tạo từ số liệu thật nếu bảng trống"""
+    if db.query(StatCounter.name).first() is None:
+        # Số liệu thật đã bao gồm các delta đang chờ: ghi phần còn lại làm giá trị gốc
+        pending = _pending(db)
+        actual = compute_counters(db)
+        _write(db.connection(), {
+            name: value - pending.get(name, Decimal(0)) for name, value in actual.items()
+        }, increment=False)
+        db.commit()
+    counters = _current(db)
+    return {name: counters[name] for name in COUNTER_NAMES}
+
+def reconcile(db: Session, fix: bool = True) -> Dict[str, dict]:
+    """So sánh bộ đếm với số liệu thật; trả về các bộ đếm bị lệch và ghi delta bù nếu fix=True"""
+    actual = compute_counters(db)
+    stored = _current(db)
+    drift = {
+        name: {"stored": stored.get(name), "actual": value}
+        for name, value in actual.items()
+        if stored.get(name, Decimal(0)) != value
+    }
+    if drift and fix:
+        _record(db.connection(), {name: actual[name] - stored.get(name, Decimal(0)) for name in drift})
+        db.commit()
+    if drift and stored:
+        logger.warning(f"Stat counters drifted: {', '.join(sorted(drift))}")
+    return drift
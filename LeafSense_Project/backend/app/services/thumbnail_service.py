@@ -0,0 +1,33 @@
+import io
+import os
+from PIL import Image, ImageOps
+
+# Kích thước cố định cho thumbnail (danh sách lịch sử, sản phẩm, avatar)
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 75
+
+def make_thumbnail(pil_image: Image.Image, size=THUMBNAIL_SIZE) -> Image.Image:
+    """Cắt giữa và thu nhỏ ảnh về đúng kích thước thumbnail"""
+    image = ImageOps.exif_transpose(pil_image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+def thumbnail_bytes(pil_image: Image.Image, size=THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Tạo thumbnail WebP và trả về bytes"""
+    buffer = io.BytesIO()
+    make_thumbnail(pil_image, size).save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+def thumbnail_bytes_from_upload(image_bytes: bytes, size=THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Tạo thumbnail WebP từ bytes ảnh gốc (file upload)"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return thumbnail_bytes(image, size, quality)
+
+def save_thumbnail(image_bytes: bytes, directory: str, basename: str) -> str:
+    """Lưu thumbnail WebP xuống thư mục local và trả về tên file"""
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{basename}.webp"
+    with open(os.path.join(directory, filename), "wb") as buffer:
+        buffer.write(thumbnail_bytes_from_upload(image_bytes))
+    return filename
@@ -0,0 +1,225 @@
+"""
+Phát hành và kiểm tra JWT không cần database
+
+- Khóa ký được dựng một lần (KeyRing), header của các token hợp lệ được cache,
+  nên kiểm tra một token chỉ còn base64 + HMAC + json (không qua python-jose).
+  JWT_PREVIOUS_SECRET_KEYS (phân tách bằng dấu phẩy) cho phép xoay khóa: token
+  ký bằng khóa cũ vẫn hợp lệ tới khi hết hạn.
+- Access token mang uid/role/status nên route chỉ cần danh tính (Principal)
+  không phải đọc user. Refresh token (typ=refresh) đổi lấy cặp token mới qua
+  /api/auth/refresh và bị thu hồi ngay sau khi dùng.
+- Danh sách thu hồi trong bộ nhớ: theo jti, hoặc mọi token của một user phát
+  hành trước một thời điểm (khóa tài khoản, đổi quyền, xóa, đặt lại mật khẩu).
+  Worker thực hiện thao tác áp dụng ngay; các worker khác đồng bộ từ bảng
+  token_revocations qua job "token_revocations" mỗi TOKEN_REVOCATION_SYNC_INTERVAL giây.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from core.security import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
+from app.models.token_revocation import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL_MINUTES", str(ACCESS_TOKEN_EXPIRE_MINUTES))) * 60
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL_DAYS", "14")) * 86400
+TOKEN_REVOCATION_SYNC_INTERVAL = int(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", "5"))
+PREVIOUS_SECRET_KEYS = [key for key in os.getenv("JWT_PREVIOUS_SECRET_KEYS", "").split(",") if key]
+
+_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_HEADER_CACHE_SIZE = 64
+
+class InvalidToken(Exception):
+    """Token sai chữ ký, hết hạn, sai loại hoặc đã bị thu hồi"""
+
+class AccountLocked(Exception):
+    """Token của tài khoản đã bị khóa"""
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    role: str
+    status: str
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _json(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+# ==================== KÝ / KIỂM TRA ====================
+
+class KeyRing:
+    def __init__(self, secret: str, algorithm: str = ALGORITHM, previous=()):
+        if algorithm not in _DIGESTS:
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.digest = _DIGESTS[algorithm]
+        self.kid = self.key_id(secret)
+        self.keys = {self.key_id(key): key.encode() for key in previous}
+        self.keys[self.kid] = secret.encode()
+        self.header = _b64encode(_json({"alg": algorithm, "typ": "JWT", "kid": self.kid}))
+        self._headers: Dict[str, bytes] = {self.header: self.keys[self.kid]}
+
+    @staticmethod
+    def key_id(secret: str) -> str:
+        return hashlib.sha256(secret.encode()).hexdigest()[:8]
+
+    def _sign(self, signing_input: str, key: bytes) -> str:
+        return _b64encode(hmac.new(key, signing_input.encode(), self.digest).digest())
+
+    def _key_for(self, header_segment: str) -> Optional[bytes]:
+        key = self._headers.get(header_segment)
+        if key is not None:
+            return key
+        try:
+            header = json.loads(_b64decode(header_segment))
+        except ValueError:
+            return None
+        # Chỉ chấp nhận đúng thuật toán đã cấu hình (chặn alg=none / đổi thuật toán)
+        if not isinstance(header, dict) or header.get("alg") != self.algorithm:
+            return None
+        # Token cũ (python-jose) không có kid: dùng khóa hiện tại
+        kid = header.get("kid", self.kid)
+        key = self.keys.get(kid) if isinstance(kid, str) else None
+        if key is not None and len(self._headers) < _HEADER_CACHE_SIZE:
+            self._headers[header_segment] = key
+        return key
+
+    def encode(self, claims: dict) -> str:
+        signing_input = f"{self.header}.{_b64encode(_json(claims))}"
+        return f"{signing_input}.{self._sign(signing_input, self.keys[self.kid])}"
+
+    def decode(self, token: str) -> dict:
+        try:
+            header_segment, payload_segment, signature = token.split(".")
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        key = self._key_for(header_segment)
+        if key is None or not hmac.compare_digest(self._sign(f"{header_segment}.{payload_segment}", key), signature):
+            raise InvalidToken("Invalid signature")
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except ValueError:
+            raise InvalidToken("Malformed payload")
+        exp = claims.get("exp") if isinstance(claims, dict) else None
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            raise InvalidToken("Token expired")
+        return claims
+
+keyring = KeyRing(SECRET_KEY, ALGORITHM, PREVIOUS_SECRET_KEYS)
+
+# ==================== DANH SÁCH THU HỒI ====================
+
+class RevocationList:
+    def __init__(self):
+        self.last_id = 0
+        self._tokens: Dict[str, float] = {}  # jti -> expires_at
+        self._users: Dict[str, Tuple[float, bool, float]] = {}  # email -> (cutoff, locked, expires_at)
+        self._lock = threading.Lock()
+
+    def apply(self, kind: str, value: str, revoked_at: float, expires_at: float):
+        with self._lock:
+            if kind == "token":
+                self._tokens[value] = expires_at
+                return
+            cutoff, locked, until = self._users.get(value, (0.0, False, 0.0))
+            cutoff = max(cutoff, revoked_at)
+            locked = kind == "lock" or (locked and kind != "unlock")
+            self._users[value] = (cutoff, locked, max(until, expires_at))
+
+    def check(self, claims: dict):
+        jti = claims.get("jti")
+        if jti is not None and jti in self._tokens:
+            raise InvalidToken("Token revoked")
+        state = self._users.get(claims.get("sub"))
+        issued_at = claims.get("iat")
+        if not isinstance(issued_at, (int, float)):
+            issued_at = 0
+        if state is not None and issued_at < state[0]:
+            if state[1]:
+                raise AccountLocked()
+            raise InvalidToken("Token revoked")
+
+    def prune(self, now: float):
+        with self._lock:
+            self._tokens = {jti: until for jti, until in self._tokens.items() if until > now}
+            self._users = {email: state for email, state in self._users.items() if state[2] > now}
+
+revocations = RevocationList()
+
+def _record(db: Session, kind: str, value: str, expires_at: float):
+    """Ghi thu hồi (caller commit) và áp dụng ngay cho worker hiện tại"""
+    revoked_at = time.time()
+    db.add(TokenRevocation(kind=kind, value=value, revoked_at=revoked_at, expires_at=expires_at))
+    revocations.apply(kind, value, revoked_at, expires_at)
+
+def revoke_user(db: Session, email: str, lock: Optional[bool] = None):
+    """Thu hồi mọi token hiện có của user; lock=True/False đánh dấu khóa/mở khóa tài khoản"""
+    kind = "lock" if lock else "unlock" if lock is False else "user"
+    _record(db, kind, email, time.time() + max(ACCESS_TOKEN_TTL, REFRESH_TOKEN_TTL))
+
+def revoke_token(db: Session, claims: dict):
+    if claims.get("jti"):
+        _record(db, "token", claims["jti"], float(claims["exp"]))
+
+def sync_revocations(db: Session) -> int:
+    """Nạp các thu hồi mới từ database (job định kỳ của mỗi worker)"""
+    now = time.time()
+    rows = db.query(TokenRevocation).filter(TokenRevocation.id > revocations.last_id).order_by(TokenRevocation.id).all()
+    for row in rows:
+        revocations.apply(row.kind, row.value, row.revoked_at, row.expires_at)
+        revocations.last_id = row.id
+    revocations.prune(now)
+    db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at < now))
+    db.commit()
+    if rows:
+        logger.info(f"Applied {len(rows)} token revocations")
+    return len(rows)
+
+# ==================== PHÁT HÀNH / XÁC THỰC ====================
+
+def issue_tokens(user) -> dict:
+    """Cặp access/refresh token cho user (dùng trong response đăng nhập)"""
+    now = time.time()
+    access = keyring.encode({
+        "sub": user.email, "uid": user.id, "role": user.role, "status": user.status,
+        "typ": "access", "jti": secrets.token_urlsafe(12), "iat": now, "exp": int(now + ACCESS_TOKEN_TTL),
+    })
+    refresh = keyring.encode({
+        "sub": user.email, "uid": user.id,
+        "typ": "refresh", "jti": secrets.token_urlsafe(12), "iat": now, "exp": int(now + REFRESH_TOKEN_TTL),
+    })
+    return {"access_token": access, "refresh_token": refresh, "token_type": "bearer"}
+
+def authenticate(token: str, token_type: str = "access") -> dict:
+    """Claims của token hợp lệ; raise InvalidToken / AccountLocked"""
+    claims = keyring.decode(token)
+    # Token cũ (trước khi có refresh token) không có typ và được coi là access token
+    if claims.get("typ", "access") != token_type or not claims.get("sub"):
+        raise InvalidToken("Wrong token type")
+    revocations.check(claims)
+    return claims
+
+def principal_from_claims(claims: dict) -> Optional[Principal]:
+    """None với token cũ chưa có uid/role (caller tự đọc user)"""
+    if "uid" not in claims or "role" not in claims:
+        return None
+    return Principal(claims["uid"], claims["sub"], claims["role"], claims.get("status", "active"))
@@ -0,0 +1,66 @@
+"""
+Phần dùng chung của các job tổng hợp chạy tăng dần theo watermark
+
+- get_watermark / max_id: đọc vị trí đã xử lý và chốt vị trí mới của một nguồn
+- IncrementalRefresh: chạy refresh với session riêng (mỗi lúc một lượt) và
+  ghi lại thời điểm refresh thành công gần nhất để endpoint quyết định có cần
+  xếp lượt refresh mới vào background hay không
+
+Dùng bởi recommendation_service và analytics_service.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.watermark import Watermark
+
+logger = logging.getLogger(__name__)
+
+def get_watermark(db: Session, name: str) -> Watermark:
+    """Watermark theo tên; tạo mới (last_id = 0) nếu chưa có"""
+    watermark = db.query(Watermark).filter(Watermark.name == name).first()
+    if not watermark:
+        watermark = Watermark(name=name, last_id=0)
+        db.add(watermark)
+    return watermark
+
+def max_id(db: Session, model) -> int:
+    """Id lớn nhất hiện có của bảng
+
+    Chốt watermark bằng giá trị này trước khi tính để không bỏ sót dòng mới
+    chèn trong lúc tính (dòng đó sẽ được xử lý ở lượt sau).
+    """
+    return db.query(func.max(model.id)).scalar() or 0
+
+class IncrementalRefresh:
+    """Chạy refresh(db) với session riêng; bỏ qua nếu đang có lượt refresh khác"""
+
+    def __init__(self, label: str, refresh: Callable[[Session], object]):
+        self.label = label
+        self.refresh = refresh
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def run(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        from core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            self.refresh(db)
+            self.last_refresh = time.time()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"{self.label} refresh failed: {e}")
+        finally:
+            db.close()
+            self._lock.release()
+
+    def elapsed(self) -> float:
+        """Số giây từ lượt refresh thành công gần nhất"""
+        return time.time() - self.last_refresh
@@ -0,0 +1,205 @@
+"""
+Benchmark: độ trễ event loop trong lúc nhiều request /api/prediction/analyze chạy đồng thời
+
+Chạy app trong tiến trình (httpx.ASGITransport) trên một database SQLite tạm:
+
+    python benchmarks/analyze_event_loop.py --analyses 40 --concurrency 10
+
+Model YOLO, Gemini và upload Firebase được thay bằng hàm chặn (time.sleep) với
+thời gian giả lập --inference-ms, --gemini-ms, --upload-ms. Mỗi chế độ gửi
+--analyses request phân tích (đã đăng nhập, có lưu DiseasePrediction) trong khi
+đo song song:
+
+- lag của event loop: asyncio.sleep(5ms) bị trễ thêm bao lâu
+- độ trễ /health
+
+Chế độ:
+- blocking: handler cũ — inference, Gemini, upload và Session đồng bộ chạy thẳng trên event loop
+- async:    handler hiện tại — inference trong worker riêng, Gemini/upload trong
+            threadpool, lưu kết quả qua AsyncSession
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+class _FakeModel:
+    """Thay model YOLO: chặn thread trong `seconds` giây rồi trả kết quả cố định"""
+
+    def __init__(self, seconds: float, segmentation: bool):
+        self.seconds = seconds
+        self.segmentation = segmentation
+
+    def __call__(self, image):
+        from types import SimpleNamespace
+        time.sleep(self.seconds)
+        if self.segmentation:
+            return [SimpleNamespace(boxes=None, names={})]
+        return [SimpleNamespace(names={0: "rust"}, probs=SimpleNamespace(top1=0, top1conf=0.91))]
+
+async def _run_mode(app, path, args, image_bytes, headers):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    lags, probe_latencies = [], []
+    failed = 0
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def lag_probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - started - 0.005)
+
+        async def health_probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def analyze(i):
+            nonlocal failed
+            async with semaphore:
+                response = await client.post(
+                    path, headers=headers, files={"file": (f"leaf{i}.jpg", image_bytes, "image/jpeg")}
+                )
+                if response.status_code != 200 or not response.json().get("saved"):
+                    failed += 1
+
+        probes = [asyncio.create_task(lag_probe()), asyncio.create_task(health_probe())]
+        started = time.perf_counter()
+        await asyncio.gather(*(analyze(i) for i in range(args.analyses)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*probes)
+
+    return {
+        "elapsed": elapsed,
+        "rate": args.analyses / elapsed,
+        "failed": failed,
+        "lag_p50": statistics.median(lags) if lags else 0.0,
+        "lag_max": max(lags) if lags else 0.0,
+        "p50": statistics.median(probe_latencies) if probe_latencies else 0.0,
+        "p95": _percentile(probe_latencies, 95),
+        "max": max(probe_latencies) if probe_latencies else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop latency under concurrent analyses")
+    parser.add_argument("--analyses", type=int, default=40, help="Tổng số request phân tích")
+    parser.add_argument("--concurrency", type=int, default=10, help="Số client phân tích đồng thời")
+    parser.add_argument("--inference-ms", type=float, default=60, help="Thời gian mỗi lần gọi model (cls, seg)")
+    parser.add_argument("--gemini-ms", type=float, default=400, help="Thời gian gọi Gemini")
+    parser.add_argument("--upload-ms", type=float, default=200, help="Thời gian upload 4 ảnh lên Firebase")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="analyze_bench_"))
+    os.makedirs("uploads", exist_ok=True)
+    # Đo độ trễ, không đo giới hạn tần suất của /analyze
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from fastapi import Depends, File, UploadFile
+    from PIL import Image
+    from sqlalchemy.orm import Session
+    from core.database import Base, async_engine, engine, get_db, SessionLocal
+    from app import create_app
+    from app.models.disease_prediction import DiseasePrediction
+    from app.models.users import User
+    from app.routers import prediction
+    from app.services import token_service
+    from app.services.auth_service import get_optional_principal
+
+    engine.echo = False
+    async_engine.echo = False
+    Base.metadata.create_all(bind=engine)
+
+    prediction.cls_model = _FakeModel(args.inference_ms / 1000, segmentation=False)
+    prediction.seg_model = _FakeModel(args.inference_ms / 1000, segmentation=True)
+
+    def fake_treatment(disease_name, confidence):
+        time.sleep(args.gemini_ms / 1000)
+        return f"Hướng dẫn điều trị {disease_name}"
+
+    def fake_upload(original_image, image, user_id):
+        time.sleep(args.upload_ms / 1000)
+        return {key: f"https://storage.example.com/{key}/{user_id}.jpg" for key in
+                ("image_url", "highlight_image_url", "image_thumbnail_url", "highlight_thumbnail_url")}
+
+    prediction.get_treatment_suggestion = fake_treatment
+    prediction.upload_prediction_images = fake_upload
+
+    app = create_app()
+
+    # Handler cũ: mọi bước đồng bộ chạy thẳng trong `async def`
+    @app.post("/bench/analyze-blocking")
+    async def analyze_blocking(file: UploadFile = File(...), db: Session = Depends(get_db),
+                               current_user=Depends(get_optional_principal)):
+        contents = await file.read()
+        original_image, image, cls_prediction, seg_predictions, data_uri = prediction.run_inference(contents)
+        treatment = prediction.get_treatment_suggestion(cls_prediction["class"], cls_prediction["confidence"])
+        record = DiseasePrediction(
+            user_id=current_user.id, disease_type=cls_prediction["class"],
+            confidence=cls_prediction["confidence"], treatment_recommendation=treatment,
+            **prediction.upload_prediction_images(original_image, image, current_user.id)
+        )
+        db.add(record)
+        db.commit()
+        db.refresh(record)
+        return {"prediction_id": record.id, "saved": True, "highlight_image": data_uri}
+
+    db = SessionLocal()
+    user = User(name="Bench", email="bench@example.com", password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {token_service.issue_tokens(user)['access_token']}"}
+    db.close()
+
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (40, 120, 40)).save(buf, format="JPEG")
+    image_bytes = buf.getvalue()
+
+    print(f"{args.analyses} lượt phân tích | {args.concurrency} client đồng thời | "
+          f"model {args.inference_ms:.0f}ms x2, Gemini {args.gemini_ms:.0f}ms, upload {args.upload_ms:.0f}ms")
+
+    results = {}
+    for mode, path in (("blocking", "/bench/analyze-blocking"), ("async", "/api/prediction/analyze")):
+        results[mode] = asyncio.run(_run_mode(app, path, args, image_bytes, headers))
+        # Mỗi asyncio.run tạo event loop mới: bỏ các connection async của loop trước
+        asyncio.run(async_engine.dispose())
+
+    for mode, r in results.items():
+        print(f"{mode:>8}: {r['rate']:5.1f} phân tích/s ({r['elapsed']:.2f}s) | lỗi: {r['failed']} | "
+              f"lag event loop p50 {r['lag_p50'] * 1000:.1f}ms max {r['lag_max'] * 1000:.1f}ms | "
+              f"/health p50 {r['p50'] * 1000:.1f}ms p95 {r['p95'] * 1000:.1f}ms max {r['max'] * 1000:.1f}ms")
+
+    db = SessionLocal()
+    saved = db.query(DiseasePrediction).count()
+    db.close()
+    ok = all(r["failed"] == 0 for r in results.values()) and saved == 2 * args.analyses
+    print("✅ Tất cả lượt phân tích được lưu" if ok else f"❌ Có lượt phân tích thất bại (đã lưu {saved})")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
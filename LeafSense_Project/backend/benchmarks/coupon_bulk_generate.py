@@ -0,0 +1,89 @@
+"""
+Benchmark: tạo và nhập coupon hàng loạt
+
+Chạy trên một database SQLite tạm (không đụng tới instance/leafsense.db):
+
+    python benchmarks/coupon_bulk_generate.py --count 100000
+
+So sánh coupon_bulk.generate_coupons / import_csv với cách cũ (mỗi coupon một
+ORM object, như create_sample_coupons.py) trên một mẫu nhỏ hơn, rồi kiểm tra
+toàn bộ mã là duy nhất.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Coupon bulk generation benchmark")
+    parser.add_argument("--count", type=int, default=100000, help="Số mã tạo hàng loạt")
+    parser.add_argument("--baseline", type=int, default=5000, help="Số mã tạo bằng ORM từng dòng để so sánh")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="coupon_bulk_"))
+
+    from sqlalchemy import func
+    from core.database import Base, engine, SessionLocal
+    from app.models.coupon import Coupon, CouponTypeEnum
+    from app.schemas.coupon_schema import CouponBulkGenerateRequest
+    from app.services import coupon_bulk
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    end = now + timedelta(days=30)
+
+    db = SessionLocal()
+
+    # Cách cũ: một ORM object cho mỗi coupon
+    started = time.perf_counter()
+    for i in range(args.baseline):
+        db.add(Coupon(
+            code=f"BASE{i:08d}", name="Baseline", coupon_type=CouponTypeEnum.FIXED, value=10,
+            total_usage_limit=1, start_date=now, end_date=end, campaign="BASELINE"
+        ))
+    db.commit()
+    baseline = time.perf_counter() - started
+    print(f"ORM từng dòng: {args.baseline} mã trong {baseline:.2f}s ({args.baseline / baseline:,.0f} mã/s)")
+
+    started = time.perf_counter()
+    result = coupon_bulk.generate_coupons(db, CouponBulkGenerateRequest(
+        campaign="BENCH", count=args.count, prefix="B", name="Bench", coupon_type="fixed",
+        value=10, start_date=now, end_date=end
+    ))
+    generated = time.perf_counter() - started
+    print(f"generate_coupons: {result.inserted} mã trong {generated:.2f}s ({result.inserted / generated:,.0f} mã/s)")
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["code", "name", "coupon_type", "value", "total_usage_limit", "start_date", "end_date"])
+    for i in range(args.count):
+        writer.writerow([f"imp{i:08d}", "Import", "fixed", 10, 1, now.isoformat(), end.isoformat()])
+    output.seek(0)
+
+    started = time.perf_counter()
+    imported = coupon_bulk.import_csv(db, output, campaign="IMPORT")
+    elapsed = time.perf_counter() - started
+    print(f"import_csv: {imported.inserted} mã trong {elapsed:.2f}s ({imported.inserted / elapsed:,.0f} mã/s)")
+
+    total = db.query(func.count(Coupon.id)).scalar()
+    distinct = db.query(func.count(func.distinct(Coupon.code))).scalar()
+    db.close()
+
+    expected = args.baseline + args.count * 2
+    ok = total == distinct == expected and not imported.errors
+    print(f"Tổng số mã: {total} | Mã khác nhau: {distinct} | Kỳ vọng: {expected}")
+    print("✅ Toàn bộ mã là duy nhất" if ok else "❌ Số lượng mã không khớp")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Stress test: áp dụng coupon song song, kiểm tra giới hạn không bị vượt
+
+Chạy trên một database SQLite tạm (không đụng tới instance/leafsense.db):
+
+    python benchmarks/coupon_redemption_stress.py --workers 200 --limit 50
+
+Mỗi worker là một request apply coupon với session riêng. Một phần worker
+dùng chung user (giả lập double-click) để kiểm tra giới hạn mỗi khách.
+Script thoát với mã lỗi 1 nếu số lượt dùng vượt total_usage_limit hoặc có
+user vượt usage_limit_per_customer.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Coupon redemption stress test")
+    parser.add_argument("--workers", type=int, default=200, help="Số request song song")
+    parser.add_argument("--users", type=int, default=120, help="Số user khác nhau")
+    parser.add_argument("--limit", type=int, default=50, help="total_usage_limit của coupon")
+    parser.add_argument("--per-customer", type=int, default=1, help="usage_limit_per_customer (0: không giới hạn)")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="coupon_stress_"))
+
+    from core.database import Base, engine, SessionLocal
+    from app.models.coupon import Coupon, CouponTypeEnum
+    from app.models.coupon_usage import CouponUsage
+    from app.models.users import User
+    from app.services import coupon_service
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    db.add_all([User(name=f"user{i}", email=f"user{i}@stress.local") for i in range(args.users)])
+    now = datetime.utcnow()
+    coupon = Coupon(
+        code="STRESS", name="Stress test", coupon_type=CouponTypeEnum.FIXED, value=10,
+        total_usage_limit=args.limit, usage_limit_per_customer=args.per_customer,
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1)
+    )
+    db.add(coupon)
+    db.commit()
+    coupon_id = coupon.id
+    db.refresh(coupon)
+    db.expunge(coupon)
+    db.close()
+
+    results = Counter()
+    start = threading.Event()
+
+    def worker(index):
+        start.wait()
+        session = SessionLocal()
+        try:
+            coupon_service.redeem_coupon(
+                session, coupon, user_id=index % args.users + 1,
+                order_amount=100, discount_amount=10
+            )
+            results["redeemed"] += 1
+        except coupon_service.CouponConflict:
+            results["conflict"] += 1
+        except Exception as e:
+            session.rollback()
+            results[type(e).__name__] += 1
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    usage_count = db.query(CouponUsage).filter(CouponUsage.coupon_id == coupon_id).count()
+    counter = db.get(Coupon, coupon_id).current_usage_count
+    per_user = Counter(user_id for (user_id,) in db.query(CouponUsage.user_id).filter(
+        CouponUsage.coupon_id == coupon_id
+    ))
+    db.close()
+
+    print(f"Workers: {args.workers} | Thời gian: {elapsed:.2f}s | Kết quả: {dict(results)}")
+    print(f"Lượt dùng ghi nhận: {usage_count} | current_usage_count: {counter} | Giới hạn: {args.limit}")
+    print(f"Lượt dùng nhiều nhất của một user: {max(per_user.values(), default=0)} | Giới hạn: {args.per_customer}")
+
+    ok = (
+        usage_count == counter == results["redeemed"]
+        and usage_count <= args.limit
+        and (not args.per_customer or max(per_user.values(), default=0) <= args.per_customer)
+        # Không giới hạn mỗi khách: lượt dùng trùng user không được báo xung đột
+        and (args.per_customer or results["redeemed"] == min(args.workers, args.limit))
+    )
+    print("✅ Giới hạn được giữ đúng" if ok else "❌ Vượt giới hạn sử dụng")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
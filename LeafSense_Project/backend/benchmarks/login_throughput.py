@@ -0,0 +1,150 @@
+"""
+Benchmark: thông lượng đăng nhập và độ trễ các endpoint khác trong lúc đăng nhập dồn dập
+
+Chạy app trong tiến trình (httpx.ASGITransport) trên một database SQLite tạm:
+
+    python benchmarks/login_throughput.py --logins 300 --concurrency 100 --rounds 12
+
+Mỗi chế độ gửi --logins request /api/auth/login với --concurrency client đồng
+thời, trong khi một client khác gọi /health liên tục để đo độ trễ của các
+endpoint đồng bộ (chạy trong threadpool chung của FastAPI):
+
+- inline: bcrypt chạy trong threadpool chung như handler `def` cũ
+- pool:   bcrypt chạy trong pool riêng của password_service (có giới hạn hàng đợi)
+
+Request bị trả 503 sẽ được thử lại sau Retry-After (rút ngắn cho benchmark).
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def _run_mode(app, args, users):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    probe_latencies = []
+    rejected = 0
+    failed = 0
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login(i):
+            nonlocal rejected, failed
+            email = users[i % len(users)]
+            async with semaphore:
+                while True:
+                    response = await client.post("/api/auth/login", json={"email": email, "password": args.password})
+                    if response.status_code != 503:
+                        break
+                    rejected += 1
+                    await asyncio.sleep(0.05)
+                if response.status_code != 200:
+                    failed += 1
+
+        probe_task = asyncio.create_task(probe())
+        await asyncio.sleep(0.2)
+        idle = list(probe_latencies)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - started
+
+        done.set()
+        await probe_task
+
+    storm = probe_latencies[len(idle):]
+    return {
+        "elapsed": elapsed,
+        "rate": args.logins / elapsed,
+        "rejected": rejected,
+        "failed": failed,
+        "idle_p50": statistics.median(idle) if idle else 0.0,
+        "p50": statistics.median(storm) if storm else 0.0,
+        "p95": _percentile(storm, 95),
+        "max": max(storm) if storm else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--logins", type=int, default=300, help="Tổng số request đăng nhập")
+    parser.add_argument("--concurrency", type=int, default=100, help="Số client đăng nhập đồng thời")
+    parser.add_argument("--users", type=int, default=50, help="Số tài khoản dùng để đăng nhập")
+    parser.add_argument("--rounds", type=int, default=12, help="Cost factor bcrypt")
+    parser.add_argument("--password", default="benchmark-password")
+    args = parser.parse_args()
+
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.rounds)
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="login_bench_"))
+    os.makedirs("uploads", exist_ok=True)
+    # Đo thông lượng băm mật khẩu, không đo giới hạn tần suất đăng nhập
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from starlette.concurrency import run_in_threadpool
+    from core.database import engine, SessionLocal
+    from app import create_app
+    from app.models.users import User
+    from app.services import password_service
+
+    engine.echo = False
+    app = create_app()
+
+    hashed = password_service.hash_password_sync(args.password)
+    db = SessionLocal()
+    users = [f"bench{i}@example.com" for i in range(args.users)]
+    db.add_all(User(name=f"Bench {i}", email=email, password=hashed) for i, email in enumerate(users))
+    db.commit()
+    db.close()
+
+    pooled_verify = password_service.verify_password
+
+    async def inline_verify(password, hashed_password):
+        return await run_in_threadpool(password_service._verify_and_update, password, hashed_password)
+
+    print(f"bcrypt cost {args.rounds} | {args.logins} lượt đăng nhập | {args.concurrency} client đồng thời | "
+          f"pool {password_service.PASSWORD_HASH_WORKERS} worker, hàng đợi {password_service.PASSWORD_HASH_MAX_PENDING}")
+
+    results = {}
+    for mode, verify in (("inline", inline_verify), ("pool", pooled_verify)):
+        password_service.verify_password = verify
+        results[mode] = asyncio.run(_run_mode(app, args, users))
+    password_service.verify_password = pooled_verify
+
+    for mode, r in results.items():
+        print(f"{mode:>6}: {r['rate']:7.1f} đăng nhập/s ({r['elapsed']:.2f}s) | 503: {r['rejected']} | lỗi: {r['failed']} | "
+              f"/health p50 {r['p50'] * 1000:.1f}ms p95 {r['p95'] * 1000:.1f}ms max {r['max'] * 1000:.1f}ms "
+              f"(lúc rảnh {r['idle_p50'] * 1000:.1f}ms)")
+
+    ok = all(r["failed"] == 0 for r in results.values())
+    print("✅ Tất cả lượt đăng nhập thành công" if ok else "❌ Có lượt đăng nhập thất bại")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Stress test: checkout song song trên sản phẩm tồn kho giới hạn, kiểm tra không bán vượt
+
+Chạy trên một database SQLite tạm (không đụng tới instance/leafsense.db):
+
+    python benchmarks/order_checkout_stress.py --workers 100 --stock 30
+
+Mỗi worker là một request create_order với session riêng, mua 1 sản phẩm
+"flash sale" (tồn kho --stock) kèm 1 sản phẩm còn nhiều hàng. Script thoát
+với mã lỗi 1 nếu số lượng bán ra khác tồn kho ban đầu, tồn kho âm, hoặc có
+request thất bại với lỗi khác 409 (hết hàng).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Order checkout stress test")
+    parser.add_argument("--workers", type=int, default=100, help="Số checkout song song")
+    parser.add_argument("--stock", type=int, default=30, help="Tồn kho ban đầu của sản phẩm flash sale")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="checkout_stress_"))
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from fastapi import HTTPException
+    from sqlalchemy import func
+    from core.database import Base, engine, SessionLocal
+    from app.models.order import Order
+    from app.models.order_item import OrderItem
+    from app.models.product import Product
+    from app.models.users import User
+    from app.routers import shop
+    from app.schemas.shop_schema import OrderCreate
+    from app.services.product_search import init_search
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    init_search(engine)
+
+    db = SessionLocal()
+    db.add_all([User(name=f"user{i}", email=f"user{i}@stress.local") for i in range(args.workers)])
+    flash = Product(name="Flash sale", price=Decimal("99000"), stock=args.stock)
+    regular = Product(name="Regular", price=Decimal("10000"), stock=args.workers * 10)
+    db.add_all([flash, regular])
+    db.commit()
+    flash_id, regular_id = flash.id, regular.id
+    db.close()
+
+    order = OrderCreate(
+        total_amount=Decimal("0"), shipping_name="Stress", shipping_phone="0900000000",
+        shipping_address="Stress test",
+        order_items=[
+            {"product_id": flash_id, "quantity": 1, "price": Decimal("1")},
+            {"product_id": regular_id, "quantity": 1, "price": Decimal("1")},
+        ],
+    )
+
+    results = Counter()
+    start = threading.Event()
+
+    def worker(index):
+        start.wait()
+        session = SessionLocal()
+        try:
+            shop.create_order(order, user_id=index + 1, db=session)
+            results["created"] += 1
+        except HTTPException as e:
+            results[e.status_code] += 1
+        except Exception as e:
+            session.rollback()
+            results[type(e).__name__] += 1
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    sold = db.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(OrderItem.product_id == flash_id).scalar()
+    orders = db.query(Order).count()
+    flash_stock = db.get(Product, flash_id).stock
+    regular_sold = args.workers * 10 - db.get(Product, regular_id).stock
+    db.close()
+
+    expected = min(args.stock, args.workers)
+    print(f"Workers: {args.workers} | Thời gian: {elapsed:.2f}s | Kết quả: {dict(results)}")
+    print(f"Đã bán: {sold} | Tồn kho ban đầu: {args.stock} | Tồn kho còn lại: {flash_stock} | Đơn hàng: {orders}")
+
+    ok = (
+        sold == expected == results["created"] == orders == regular_sold
+        and flash_stock == args.stock - sold
+        and results[409] == args.workers - expected
+    )
+    print("✅ Không bán vượt tồn kho, các checkout còn lại nhận 409" if ok else "❌ Bán vượt tồn kho hoặc có lỗi ngoài 409")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Kiểm tra số câu SQL của các endpoint danh sách không tăng theo số dòng (N+1)
+
+Chạy app trong tiến trình trên một database SQLite tạm:
+
+    python benchmarks/query_budget.py --rows 20
+
+Gọi /api/shop/products, /api/shop/cart, /api/shop/orders với --rows dòng
+rồi với 10 lần số dòng, mỗi lần trong count_queries(max_queries=ngân sách).
+Script thoát với mã lỗi 1 nếu endpoint vượt ngân sách hoặc số query tăng
+theo số dòng.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+USER_ID = 1
+# Số câu SQL tối đa của mỗi endpoint, không phụ thuộc số dòng
+QUERY_BUDGETS = {
+    # products + category (joinedload)
+    "/api/shop/products?limit=100000": 1,
+    # cart; cart_items + product + category (selectinload)
+    f"/api/shop/cart?user_id={USER_ID}": 2,
+    # orders; order_items + product + category (selectinload)
+    f"/api/shop/orders?user_id={USER_ID}": 2,
+}
+
+def _seed(db, rows: int, offset: int):
+    """Thêm `rows` sản phẩm (mỗi sản phẩm một danh mục), dòng giỏ hàng và đơn hàng 3 món"""
+    from app.models.cart import Cart
+    from app.models.cart_item import CartItem
+    from app.models.category import Category
+    from app.models.order import Order
+    from app.models.order_item import OrderItem
+    from app.models.product import Product
+
+    categories = [Category(name=f"Danh mục {offset + i}") for i in range(rows)]
+    db.add_all(categories)
+    db.flush()
+    products = [
+        Product(name=f"Sản phẩm {offset + i}", price=Decimal("50000"), stock=100, category_id=category.id)
+        for i, category in enumerate(categories)
+    ]
+    db.add_all(products)
+    cart = db.query(Cart).filter(Cart.user_id == USER_ID).first()
+    if not cart:
+        cart = Cart(user_id=USER_ID)
+        db.add(cart)
+    db.flush()
+    db.add_all(CartItem(cart_id=cart.id, product_id=product.id, quantity=1) for product in products)
+    for i in range(rows):
+        db.add(Order(
+            user_id=USER_ID, total_amount=Decimal("150000"), shipping_name="Nguyễn Văn An",
+            shipping_phone="0901234567", shipping_address="TP. Hồ Chí Minh",
+            order_items=[
+                OrderItem(product_id=products[(i + k) % rows].id, quantity=1, price=Decimal("50000"))
+                for k in range(3)
+            ],
+        ))
+    db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query budget check for list endpoints")
+    parser.add_argument("--rows", type=int, default=20, help="Số dòng mỗi bảng ở lần đo đầu (lần sau gấp 10)")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="query_budget_"))
+    os.makedirs("uploads", exist_ok=True)
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+    from app import create_app
+    from app.models.users import User
+    from app.services.catalog_cache import invalidate_catalog
+    from core.database import SessionLocal, count_queries, engine
+
+    engine.echo = False
+    client = TestClient(create_app())
+
+    db = SessionLocal()
+    db.add(User(id=USER_ID, name="Budget", email="budget@example.com"))
+    db.commit()
+
+    counts = {}
+    ok = True
+    for rows, offset in ((args.rows, 0), (args.rows * 9, args.rows)):
+        _seed(db, rows, offset)
+        total = offset + rows
+        for path, budget in QUERY_BUDGETS.items():
+            # Đo query thật, không đọc từ cache catalog
+            invalidate_catalog()
+            try:
+                with count_queries(max_queries=budget) as counter:
+                    response = client.get(path)
+                response.raise_for_status()
+                status = "✅"
+            except AssertionError as e:
+                status = "❌"
+                ok = False
+                print(e)
+            counts.setdefault(path, []).append(counter.count)
+            payload = response.json()
+            items = payload["cart_items"] if isinstance(payload, dict) else payload
+            print(f"{status} {path:<40} {total:>5} dòng: {counter.count} query (ngân sách {budget}), "
+                  f"{len(items)} phần tử")
+    db.close()
+
+    grown = [path for path, values in counts.items() if values[-1] > values[0]]
+    for path in grown:
+        print(f"❌ {path}: số query tăng theo số dòng {counts[path]}")
+    ok = ok and not grown
+    print("✅ Số query không phụ thuộc số dòng" if ok else "❌ Có endpoint vượt ngân sách query")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: lookup token đặt lại mật khẩu khi bảng có rất nhiều token cũ
+
+Chạy trên một database SQLite tạm (không đụng tới instance/leafsense.db):
+
+    python benchmarks/reset_token_lookup.py --tokens 2000000
+
+Nạp dần token lịch sử (đã dùng/hết hạn) theo các mốc 10^4, 10^5, 10^6...
+và đo ở mỗi mốc:
+- lookup của reset_password (token + used + expires_at)
+- câu xóa token chưa dùng theo user_id của forgot_password, có và không có
+  ix_password_reset_tokens_user_id
+Cuối cùng chạy reset_token_service.purge_tokens và đo thời gian dọn.
+"""
+
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+INSERT_CHUNK = 20000
+
+def _timed(func, repeat: int) -> float:
+    """Thời gian trung bình (ms) của func qua `repeat` lần"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Password reset token lookup benchmark")
+    parser.add_argument("--tokens", type=int, default=2000000, help="Tổng số token lịch sử")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200, help="Số lần đo mỗi query")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="reset_tokens_"))
+
+    from sqlalchemy import delete, select, text
+    from core.database import Base, engine, SessionLocal
+    from app.models.users import PasswordResetToken, User
+    from app.services.reset_token_service import purge_tokens
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, PasswordResetToken.__table__])
+    user_index = next(index for index in PasswordResetToken.__table__.indexes if index.name == "ix_password_reset_tokens_user_id")
+
+    now = datetime.utcnow()
+    tokens = PasswordResetToken.__table__
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "name": f"User {i}", "email": f"user{i}@example.com"} for i in range(1, args.users + 1)
+        ])
+
+    # Token còn hiệu lực cần tìm: nằm ở đầu bảng, các token cũ được nạp sau
+    live_token = secrets.token_urlsafe(32)
+    with engine.begin() as conn:
+        conn.execute(tokens.insert(), [{
+            "user_id": 1, "token": live_token, "created_at": now,
+            "expires_at": now + timedelta(hours=1), "used": False,
+        }])
+
+    def find_token():
+        with SessionLocal() as db:
+            db.execute(select(PasswordResetToken).where(
+                PasswordResetToken.token == live_token,
+                PasswordResetToken.used == False,
+                PasswordResetToken.expires_at > datetime.utcnow()
+            )).scalar_one()
+
+    def delete_unused():
+        with SessionLocal() as db:
+            db.execute(delete(PasswordResetToken).where(
+                PasswordResetToken.user_id == args.users,
+                PasswordResetToken.used == False
+            ))
+            db.rollback()
+
+    print(f"{'Số token':>10} | {'lookup token':>12} | {'xóa theo user (index)':>21} | {'xóa theo user (không index)':>27}")
+    loaded = 1
+    milestone = 10000
+    while loaded < args.tokens:
+        target = min(milestone, args.tokens)
+        while loaded < target:
+            count = min(INSERT_CHUNK, target - loaded)
+            with engine.begin() as conn:
+                conn.execute(tokens.insert(), [{
+                    "user_id": (loaded + i) % args.users + 1,
+                    "token": secrets.token_urlsafe(32),
+                    "created_at": now - timedelta(days=1),
+                    "expires_at": now - timedelta(hours=23),
+                    "used": (loaded + i) % 2 == 0,
+                } for i in range(count)])
+            loaded += count
+
+        lookup = _timed(find_token, args.repeat)
+        indexed = _timed(delete_unused, args.repeat)
+        user_index.drop(bind=engine)
+        unindexed = _timed(delete_unused, max(3, args.repeat // 50))
+        user_index.create(bind=engine)
+        print(f"{loaded:>10,} | {lookup:>10.3f}ms | {indexed:>19.3f}ms | {unindexed:>25.3f}ms")
+        milestone *= 10
+
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM password_reset_tokens WHERE token = :t AND used = 0 AND expires_at > :n"
+        ), {"t": live_token, "n": now}).fetchall()
+    print("Query plan lookup:", "; ".join(row[-1] for row in plan))
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    purged = purge_tokens(db)
+    elapsed = time.perf_counter() - started
+    remaining = db.query(PasswordResetToken).count()
+    db.close()
+    print(f"purge_tokens: xóa {purged:,} token trong {elapsed:.2f}s, còn lại {remaining}")
+
+    ok = purged == loaded - 1 and remaining == 1
+    print("✅ Chỉ còn token đang hiệu lực" if ok else "❌ Số token sau khi dọn không đúng")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: serialize JSON và nén response trên các endpoint danh sách lớn
+
+Chạy app trong tiến trình trên một database SQLite tạm:
+
+    python benchmarks/response_encoding.py --orders 2000 --predictions 500 --repeat 200
+
+Với mỗi endpoint (/api/admin/orders, /api/shop/products, /api/history; mỗi
+trang 100 dòng), lấy payload đã được route chuẩn hóa rồi đo:
+- thời gian render body: json chuẩn (JSONResponse cũ) và orjson (ORJSONResponse)
+- số byte gửi đi: không nén, gzip và br (nếu đã cài `brotli`), cùng thời gian nén
+- response thực tế khi client gửi Accept-Encoding: gzip, br
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+TREATMENT = (
+    "Cắt bỏ lá bị bệnh và tiêu hủy xa vườn. Phun thuốc gốc đồng (Copper "
+    "oxychloride) 7-10 ngày một lần khi thời tiết ẩm. Tưới gốc vào buổi sáng, "
+    "tránh làm ướt lá; bón cân đối NPK, tăng cường kali để cây cứng cáp. "
+)
+
+def _timed(func, repeat: int) -> float:
+    """Thời gian trung bình (ms) của func qua `repeat` lần"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization and compression benchmark")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--predictions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200, help="Số lần đo mỗi phép")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="response_encoding_"))
+    os.makedirs("uploads", exist_ok=True)
+    os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.testclient import TestClient
+    from app import create_app
+    from core.database import engine, SessionLocal
+    from app.models.category import Category
+    from app.models.disease_prediction import DiseasePrediction
+    from app.models.order import Order
+    from app.models.order_item import OrderItem
+    from app.models.product import Product
+    from app.models.users import User
+    from app.services import compression, password_service
+
+    engine.echo = False
+    app = create_app()
+    client = TestClient(app)
+
+    db = SessionLocal()
+    admin = User(name="Admin", email="admin@example.com", role="admin",
+                 password=password_service.hash_password_sync("admin123"))
+    category = Category(name="Thuốc bảo vệ thực vật")
+    db.add_all([admin, category])
+    db.commit()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [{
+            "name": f"Thuốc trừ bệnh {i}", "description": "Đặc trị đốm lá, thán thư. " * 8,
+            "price": 50000 + i * 1000, "stock": 100, "category_id": category.id,
+            "image_url": f"/uploads/products/{i:032x}.jpg",
+        } for i in range(args.products)])
+        conn.execute(Order.__table__.insert(), [{
+            "user_id": admin.id, "total_amount": 150000 + i, "status": "PENDING", "payment_method": "COD",
+            "shipping_name": "Nguyễn Văn An", "shipping_phone": "0901234567",
+            "shipping_address": "123 Đường Lê Lợi, Phường Bến Thành, Quận 1, TP. Hồ Chí Minh",
+            "created_at": now - timedelta(minutes=i), "updated_at": now,
+        } for i in range(args.orders)])
+        conn.execute(OrderItem.__table__.insert(), [{
+            "order_id": i // 3 + 1, "product_id": i % args.products + 1, "quantity": 2, "price": 50000,
+        } for i in range(args.orders * 3)])
+        conn.execute(DiseasePrediction.__table__.insert(), [{
+            "user_id": admin.id, "image_url": f"https://storage.example.com/originals/{i}.jpg",
+            "highlight_image_url": f"https://storage.example.com/highlights/{i}.jpg",
+            "disease_type": "Leaf Spot", "confidence": 0.93, "treatment_recommendation": TREATMENT * 6,
+            "created_at": now - timedelta(hours=i),
+        } for i in range(args.predictions)])
+    db.close()
+
+    token = client.post("/api/auth/login", json={"email": "admin@example.com", "password": "admin123"}).json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    endpoints = [
+        ("/api/admin/orders?limit=100", auth),
+        ("/api/shop/products?limit=100", {}),
+        ("/api/history?limit=100", auth),
+    ]
+
+    encodings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+    if compression.brotli is None:
+        print("(chưa cài `brotli`: chỉ đo gzip)")
+
+    ok = True
+    for path, headers in endpoints:
+        response = client.get(path, headers={**headers, "Accept-Encoding": "identity"})
+        response.raise_for_status()
+        payload = response.json()
+
+        json_ms = _timed(lambda: JSONResponse(payload).body, args.repeat)
+        orjson_ms = _timed(lambda: ORJSONResponse(payload).body, args.repeat)
+        body = ORJSONResponse(payload).body
+        same = JSONResponse(payload).body == body
+
+        rows = payload["history"] if isinstance(payload, dict) else payload
+        print(f"\n{path}  ({len(rows)} dòng)")
+        print(f"  render   json: {json_ms:.3f}ms   orjson: {orjson_ms:.3f}ms   (x{json_ms / orjson_ms:.1f}, body giống nhau: {same})")
+        print(f"  bytes    không nén: {len(body):,}")
+        for encoding in encodings:
+            compress_ms = _timed(lambda: compression.compress(body, encoding), max(10, args.repeat // 10))
+            size = len(compression.compress(body, encoding))
+            print(f"  {encoding:<8} {size:,} bytes ({size / len(body):.1%}) trong {compress_ms:.3f}ms")
+
+        served = client.get(path, headers={**headers, "Accept-Encoding": ", ".join(reversed(encodings))})
+        print(f"  response: Content-Encoding={served.headers.get('content-encoding')} "
+              f"Content-Length={served.headers.get('content-length')}")
+        ok = ok and same and served.headers.get("content-encoding") in encodings
+
+    print()
+    print("✅ Body orjson giống json chuẩn và response được nén" if ok else "❌ Body khác nhau hoặc response không được nén")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
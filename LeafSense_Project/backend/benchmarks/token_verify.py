@@ -0,0 +1,86 @@
+"""
+Benchmark: chi phí xác thực một request có Bearer token
+
+Chạy trên một database SQLite tạm (không đụng tới instance/leafsense.db):
+
+    python benchmarks/token_verify.py --iterations 20000 --revoked 100000
+
+So sánh:
+- jose + query user: cách cũ (python-jose decode rồi đọc user theo email)
+- token_service.authenticate: kiểm tra chữ ký bằng khóa đã dựng sẵn và danh
+  sách thu hồi trong bộ nhớ (đã nạp --revoked jti), không chạm database
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+def _timed(func, repeat: int) -> float:
+    """Thời gian trung bình (µs) của func qua `repeat` lần"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1e6 / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="JWT verification benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--revoked", type=int, default=100000, help="Số jti trong danh sách thu hồi")
+    args = parser.parse_args()
+
+    # core.database dùng ./instance/leafsense.db theo thư mục hiện tại
+    os.chdir(tempfile.mkdtemp(prefix="token_verify_"))
+
+    from jose import jwt
+    from sqlalchemy import event
+    from core.database import Base, engine, SessionLocal
+    from core.security import ALGORITHM, SECRET_KEY, create_access_token
+    from app.models.users import User
+    from app.services import token_service
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(name="Bench", email="bench@example.com", role="farmer", status="active")
+    db.add(user)
+    db.commit()
+
+    legacy_token = create_access_token(data={"sub": user.email}, expires_delta=timedelta(minutes=30))
+    access_token = token_service.issue_tokens(user)["access_token"]
+    expires_at = time.time() + 3600
+    for i in range(args.revoked):
+        token_service.revocations.apply("token", f"revoked-{i}", time.time(), expires_at)
+
+    def legacy():
+        email = jwt.decode(legacy_token, SECRET_KEY, algorithms=[ALGORITHM])["sub"]
+        db.query(User).filter(User.email == email).first()
+        db.rollback()
+
+    def stateless():
+        token_service.principal_from_claims(token_service.authenticate(access_token))
+
+    queries = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    legacy_us = _timed(legacy, args.iterations)
+    legacy_queries, queries[0] = queries[0], 0
+    stateless_us = _timed(stateless, args.iterations)
+    stateless_queries = queries[0]
+    db.close()
+
+    print(f"{'Cách xác thực':<32} | {'µs/request':>10} | {'query/request':>13}")
+    print(f"{'jose + query user':<32} | {legacy_us:>10.1f} | {legacy_queries / args.iterations:>13.2f}")
+    print(f"{'token_service.authenticate':<32} | {stateless_us:>10.1f} | {stateless_queries / args.iterations:>13.2f}")
+
+    ok = stateless_queries == 0 and stateless_us < 1000
+    print("✅ Xác thực không cần database, dưới 1ms" if ok else "❌ Xác thực vẫn chạm database hoặc chậm hơn 1ms")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Script tạo/nhập/xuất mã ưu đãi hàng loạt cho một đợt phát hành
+
+Ví dụ:
+    python bulk_coupons.py generate --campaign TET2025 --count 50000 --prefix TET \\
+        --name "Tết 2025" --type fixed --value 20000 --days 30 --output tet2025.csv
+    python bulk_coupons.py import coupons.csv --campaign PARTNER_A
+    python bulk_coupons.py export TET2025 --output tet2025.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine
+from app.schemas.coupon_schema import CouponBulkGenerateRequest
+from app.services import coupon_bulk
+
+def _write_codes(db: Session, campaign: str, output: str) -> int:
+    rows = coupon_bulk.campaign_codes(db, campaign)
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["code", "current_usage_count", "status"])
+        writer.writerows((code, count, getattr(status, "value", status)) for code, count, status in rows)
+    return len(rows)
+
+def generate(args):
+    now = datetime.utcnow()
+    request = CouponBulkGenerateRequest(
+        campaign=args.campaign,
+        count=args.count,
+        prefix=args.prefix,
+        code_length=args.length,
+        name=args.name or f"Campaign {args.campaign}",
+        coupon_type=args.type,
+        value=args.value,
+        minimum_order_amount=args.min_order,
+        maximum_discount_amount=args.max_discount,
+        total_usage_limit=args.uses,
+        usage_limit_per_customer=1,
+        start_date=now,
+        end_date=now + timedelta(days=args.days),
+    )
+
+    db = Session(bind=engine)
+    try:
+        started = time.perf_counter()
+        result = coupon_bulk.generate_coupons(db, request)
+        print(f"✅ Đã tạo {result.inserted} mã cho đợt {result.campaign} trong {time.perf_counter() - started:.2f}s")
+        print(f"   Ví dụ: {', '.join(result.sample_codes[:5])}")
+        if args.output:
+            exported = _write_codes(db, result.campaign, args.output)
+            print(f"📄 Đã xuất {exported} mã ra {args.output}")
+    finally:
+        db.close()
+
+def import_file(args):
+    db = Session(bind=engine)
+    try:
+        started = time.perf_counter()
+        with open(args.file, newline="", encoding="utf-8-sig") as f:
+            result = coupon_bulk.import_csv(db, f, campaign=args.campaign)
+        print(f"✅ Đã nhập {result.inserted} mã trong {time.perf_counter() - started:.2f}s")
+        print(f"   Đã tồn tại: {result.skipped_existing} | Trùng trong file: {result.duplicates}")
+        for error in result.errors:
+            print(f"❌ {error}")
+    except ValueError as e:
+        print(f"❌ {e}")
+    finally:
+        db.close()
+
+def export(args):
+    db = Session(bind=engine)
+    try:
+        exported = _write_codes(db, args.campaign, args.output)
+        print(f"📄 Đã xuất {exported} mã của đợt {args.campaign} ra {args.output}")
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Quản lý mã ưu đãi hàng loạt")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gen = subparsers.add_parser("generate", help="Sinh mã ngẫu nhiên cho một đợt")
+    gen.add_argument("--campaign", required=True)
+    gen.add_argument("--count", type=int, required=True)
+    gen.add_argument("--prefix", default=None)
+    gen.add_argument("--length", type=int, default=10, help="Số ký tự ngẫu nhiên sau prefix")
+    gen.add_argument("--name", default=None)
+    gen.add_argument("--type", default="fixed", choices=["percentage", "fixed", "free_shipping"])
+    gen.add_argument("--value", type=float, required=True)
+    gen.add_argument("--min-order", type=float, default=0)
+    gen.add_argument("--max-discount", type=float, default=None)
+    gen.add_argument("--uses", type=int, default=1, help="Số lần dùng tối đa của mỗi mã")
+    gen.add_argument("--days", type=int, default=30, help="Số ngày hiệu lực")
+    gen.add_argument("--output", default=None, help="Xuất danh sách mã ra file CSV")
+    gen.set_defaults(func=generate)
+
+    imp = subparsers.add_parser("import", help="Nhập mã từ file CSV")
+    imp.add_argument("file")
+    imp.add_argument("--campaign", default=None)
+    imp.set_defaults(func=import_file)
+
+    exp = subparsers.add_parser("export", help="Xuất mã của một đợt ra file CSV")
+    exp.add_argument("campaign")
+    exp.add_argument("--output", required=True)
+    exp.set_defaults(func=export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
@@ -17,9 +20,77 @@ engine = create_engine(
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
+# Engine async cho các handler `async def` (driver async tương ứng với DATABASE_URL:
+# aiosqlite cho SQLite, asyncpg cho Postgres); ghi đè bằng ASYNC_DATABASE_URL
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def async_database_url(url: str):
+    url = make_url(url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(
+            f"No async driver for database '{url.get_backend_name()}' "
+            f"(supported: {', '.join(_ASYNC_DRIVERS)}); set ASYNC_DATABASE_URL explicitly"
+        )
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+async_engine = create_async_engine(
+    os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL),
+    echo=engine.echo,
+)
+
+# expire_on_commit=False: object vẫn dùng được sau commit mà không cần query lại
+# (trong session async, lazy load ngầm sẽ lỗi)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
+    """Session đồng bộ: chỉ dùng cho handler `def` (FastAPI chạy trong threadpool)
+
+    Handler `async def` dùng get_async_db; query bằng Session đồng bộ trong
+    `async def` sẽ chặn event loop.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Session async cho handler `async def`: query không chặn event loop
+
+    Sau khi đọc xong, `await db.commit()` trả connection về pool trước khi await
+    việc chậm (băm mật khẩu, upload...); object đã load vẫn gắn với session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+class QueryCounter:
+    """Đếm các câu SQL được thực thi trên engine (dùng để phát hiện N+1 query)"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(bind=engine, max_queries=None):
+    """Đếm số query trong block; lỗi nếu vượt quá max_queries
+
+    Ví dụ: with count_queries(max_queries=3): client.get("/api/shop/products")
+    """
+    counter = QueryCounter()
+    event.listen(bind, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", counter)
+    if max_queries is not None and counter.count > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {counter.count}:\n"
+            + "\n".join(counter.statements)
+        )
@@ -0,0 +1,118 @@
+"""
+SMTP server giả lập để phát triển và kiểm thử gửi email
+
+Công cụ phát triển, không phải một phần của app. Nhận mọi email (không
+STARTTLS, không xác thực) và giữ trong bộ nhớ:
+
+    python devtools/debug_smtp.py --port 1025
+
+    from devtools.debug_smtp import DebugSMTPServer
+    server = DebugSMTPServer(port=0).start()   # port ngẫu nhiên
+    os.environ.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=str(server.port), MAIL_STARTTLS="0")
+    ...
+    server.messages      # các email.message.EmailMessage đã nhận
+    server.connections   # số kết nối đã mở (kiểm tra việc dùng lại kết nối)
+    server.stop()
+
+reject_recipients giả lập lỗi 550 cho các địa chỉ trong tập này.
+"""
+
+import argparse
+import socketserver
+import threading
+from email import policy
+from email.parser import BytesParser
+from typing import List, Set
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server: "DebugSMTPServer" = self.server.owner
+        with server._lock:
+            server.connections += 1
+        self._reply("220 leafsense-debug ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+            if command in ("EHLO", "HELO"):
+                self._reply("250-leafsense-debug" if command == "EHLO" else "250 leafsense-debug")
+                if command == "EHLO":
+                    self._reply("250 8BITMIME")
+            elif command == "MAIL":
+                recipients = []
+                self._reply("250 OK")
+            elif command == "RCPT":
+                address = argument.partition(":")[2].strip().strip("<>")
+                if address in server.reject_recipients:
+                    self._reply("550 Mailbox unavailable")
+                else:
+                    recipients.append(address)
+                    self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                message = BytesParser(policy=policy.default).parsebytes(b"".join(lines))
+                with server._lock:
+                    server.messages.append(message)
+                if server.verbose:
+                    print(f"📧 {message['From']} -> {', '.join(recipients)}: {message['Subject']}")
+                self._reply("250 OK")
+            elif command in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class DebugSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025, verbose: bool = False):
+        self.messages: List = []
+        self.connections = 0
+        self.reject_recipients: Set[str] = set()
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _SMTPHandler)
+        self._server.owner = self
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "DebugSMTPServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SMTP server giả lập cho LeafSense")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    server = DebugSMTPServer(args.host, args.port, verbose=True)
+    print(f"🚀 Debug SMTP server đang chạy tại {args.host}:{server.port} (Ctrl+C để dừng)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
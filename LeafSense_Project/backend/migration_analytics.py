@@ -0,0 +1,62 @@
+"""
+Migration script: bảng rollup thống kê theo thời gian cho admin
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại và tính rollup lần đầu
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, engine, SessionLocal
+from app.models.analytics_rollup import CouponRollup, PredictionRollup, SalesRollup
+from app.models.watermark import Watermark
+from app.services.analytics_service import refresh_rollups
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_updated_at ON orders (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_coupon_usages_used_at ON coupon_usages (used_at)",
+    "CREATE INDEX IF NOT EXISTS ix_disease_predictions_created_at ON disease_predictions (created_at)",
+]
+
+def run_migration():
+    try:
+        with engine.begin() as conn:
+            existing = {column["name"] for column in inspect(conn).get_columns("orders")}
+            if "updated_at" in existing:
+                print("✅ Cột orders.updated_at đã tồn tại")
+            else:
+                conn.execute(text("ALTER TABLE orders ADD COLUMN updated_at DATETIME"))
+                conn.execute(text("UPDATE orders SET updated_at = created_at"))
+                print("✅ Đã thêm cột orders.updated_at")
+
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            print("✅ Index theo thời gian cho orders, coupon_usages, disease_predictions đã sẵn sàng")
+
+        Base.metadata.create_all(bind=engine, tables=[
+            SalesRollup.__table__, CouponRollup.__table__, PredictionRollup.__table__, Watermark.__table__,
+        ])
+        print("✅ Bảng sales_rollups, coupon_rollups, prediction_rollups đã sẵn sàng")
+
+        db = SessionLocal()
+        try:
+            refreshed = refresh_rollups(db, full=True)
+            for name, days in refreshed.items():
+                print(f"✅ {name}: đã tổng hợp {days} ngày")
+        finally:
+            db.close()
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho thống kê theo thời gian...")
+    run_migration()
@@ -0,0 +1,92 @@
+"""
+Migration script: unique constraint cho carts/cart_items và cột tổng giỏ hàng
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại
+
+Dữ liệu trùng (nhiều giỏ cho một user, nhiều dòng cùng sản phẩm trong một giỏ)
+được gộp lại trước khi tạo unique index.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine, SessionLocal
+
+NEW_COLUMNS = [
+    ("item_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("subtotal", "DECIMAL(10, 2) NOT NULL DEFAULT 0"),
+]
+
+def _merge_duplicate_carts(conn):
+    # Chuyển sản phẩm của các giỏ trùng về giỏ có id nhỏ nhất của user
+    moved = conn.execute(text(
+        "UPDATE cart_items SET cart_id = ("
+        "  SELECT MIN(c2.id) FROM carts c1 JOIN carts c2 ON c2.user_id = c1.user_id"
+        "  WHERE c1.id = cart_items.cart_id"
+        ") WHERE cart_id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)"
+    )).rowcount
+    deleted = conn.execute(text(
+        "DELETE FROM carts WHERE id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)"
+    )).rowcount
+    print(f"✅ Đã gộp giỏ hàng trùng: xóa {deleted} giỏ, chuyển {moved} sản phẩm")
+
+def _merge_duplicate_items(conn):
+    conn.execute(text(
+        "UPDATE cart_items SET quantity = ("
+        "  SELECT SUM(ci.quantity) FROM cart_items ci"
+        "  WHERE ci.cart_id = cart_items.cart_id AND ci.product_id = cart_items.product_id"
+        ") WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1)"
+    ))
+    deleted = conn.execute(text(
+        "DELETE FROM cart_items WHERE id NOT IN ("
+        "  SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id"
+        ")"
+    )).rowcount
+    print(f"✅ Đã gộp {deleted} dòng trùng trong cart_items")
+
+def run_migration():
+    try:
+        with engine.begin() as conn:
+            existing = {column["name"] for column in inspect(conn).get_columns("carts")}
+            for name, ddl in NEW_COLUMNS:
+                if name in existing:
+                    print(f"✅ Cột carts.{name} đã tồn tại")
+                    continue
+                conn.execute(text(f"ALTER TABLE carts ADD COLUMN {name} {ddl}"))
+                print(f"✅ Đã thêm cột carts.{name}")
+
+            _merge_duplicate_carts(conn)
+            _merge_duplicate_items(conn)
+
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_carts_user_id ON carts (user_id)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_cart_product "
+                "ON cart_items (cart_id, product_id)"
+            ))
+            print("✅ Đã tạo unique index cho carts.user_id và cart_items(cart_id, product_id)")
+
+        # Import sau khi schema đã được cập nhật
+        from app.services import cart_service
+        db = SessionLocal()
+        try:
+            cart_service.refresh_summary(db)
+            db.commit()
+        finally:
+            db.close()
+        print("✅ Đã tính lại item_count/subtotal cho tất cả giỏ hàng")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho giỏ hàng...")
+    run_migration()
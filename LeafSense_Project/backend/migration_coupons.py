@@ -0,0 +1,111 @@
+"""
+Migration script: index và ràng buộc cho coupons/coupon_usages
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine, SessionLocal
+from app.models.coupon import ACTIVE_COUPON_WHERE
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_coupon_usages_coupon_user ON coupon_usages (coupon_id, user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_coupon_usages_user_seq ON coupon_usages (coupon_id, user_id, usage_seq)",
+    "CREATE INDEX IF NOT EXISTS ix_coupons_campaign ON coupons (campaign)",
+]
+
+def _create_active_index(conn):
+    where = ACTIVE_COUPON_WHERE.get(conn.dialect.name)
+    if where is None:
+        print("⚠️  Dialect không hỗ trợ partial index, bỏ qua ix_coupons_active")
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_coupons_active ON coupons (start_date) WHERE {where}"))
+
+def _add_exhausted_status():
+    """PostgreSQL lưu status bằng kiểu ENUM riêng; SQLite lưu chuỗi nên không cần"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ALTER TYPE couponstatusenum ADD VALUE IF NOT EXISTS 'EXHAUSTED'"))
+    print("✅ Đã thêm giá trị EXHAUSTED cho couponstatusenum")
+
+def _update_lifecycle():
+    from app.services.coupon_service import update_lifecycle
+    db = SessionLocal()
+    try:
+        changed = update_lifecycle(db)
+    finally:
+        db.close()
+    print(
+        f"✅ Cập nhật trạng thái coupon: {changed['expired']} hết hạn, "
+        f"{changed['exhausted']} hết lượt, {changed['reactivated']} hoạt động lại"
+    )
+
+def _add_usage_seq(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("coupon_usages")}
+    if "usage_seq" in existing:
+        print("✅ Cột coupon_usages.usage_seq đã tồn tại")
+    else:
+        conn.execute(text("ALTER TABLE coupon_usages ADD COLUMN usage_seq INTEGER"))
+        print("✅ Đã thêm cột coupon_usages.usage_seq")
+
+    # Đánh số thứ tự các lượt dùng cũ theo id cho từng (coupon, user)
+    updated = conn.execute(text(
+        "UPDATE coupon_usages SET usage_seq = ("
+        "  SELECT COUNT(*) FROM coupon_usages cu"
+        "  WHERE cu.coupon_id = coupon_usages.coupon_id AND cu.user_id = coupon_usages.user_id"
+        "  AND cu.id <= coupon_usages.id"
+        ") WHERE usage_seq IS NULL"
+    )).rowcount
+    print(f"✅ Đã đánh số usage_seq cho {updated} lượt dùng cũ")
+
+def _add_campaign(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("coupons")}
+    if "campaign" in existing:
+        print("✅ Cột coupons.campaign đã tồn tại")
+    else:
+        conn.execute(text("ALTER TABLE coupons ADD COLUMN campaign VARCHAR(100)"))
+        print("✅ Đã thêm cột coupons.campaign")
+
+def _normalize_codes(conn):
+    """Viết hoa toàn bộ mã coupon; dừng lại nếu có hai mã chỉ khác nhau chữ hoa/thường"""
+    collisions = conn.execute(text(
+        "SELECT UPPER(TRIM(code)), COUNT(*) FROM coupons GROUP BY UPPER(TRIM(code)) HAVING COUNT(*) > 1"
+    )).fetchall()
+    if collisions:
+        codes = ", ".join(code for code, _ in collisions)
+        raise RuntimeError(f"Các mã trùng nhau khi viết hoa, cần đổi tên thủ công trước: {codes}")
+
+    updated = conn.execute(text(
+        "UPDATE coupons SET code = UPPER(TRIM(code)) WHERE code != UPPER(TRIM(code))"
+    )).rowcount
+    print(f"✅ Đã chuẩn hóa {updated} mã coupon về dạng viết hoa")
+
+def run_migration():
+    try:
+        _add_exhausted_status()
+        with engine.begin() as conn:
+            _normalize_codes(conn)
+            _add_usage_seq(conn)
+            _add_campaign(conn)
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            _create_active_index(conn)
+            print("✅ Các index ix_coupon_usages_coupon_user, uq_coupon_usages_user_seq, ix_coupons_campaign và ix_coupons_active đã sẵn sàng")
+        _update_lifecycle()
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho coupon...")
+    run_migration()
@@ -0,0 +1,29 @@
+"""
+Migration script: bảng mail_outbox cho việc gửi email qua hàng đợi
+Chạy script này để tạo bảng trên cơ sở dữ liệu hiện tại
+"""
+
+import sys
+import os
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, engine
+from app.models.mail_outbox import MailOutbox
+
+def run_migration():
+    try:
+        Base.metadata.create_all(bind=engine, tables=[MailOutbox.__table__])
+        print("✅ Bảng mail_outbox đã sẵn sàng")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho mail outbox...")
+    run_migration()
@@ -0,0 +1,60 @@
+"""
+Migration script: thêm các cột tổng hợp đánh giá cho products
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine, SessionLocal
+
+NEW_COLUMNS = [
+    ("avg_rating", "FLOAT NOT NULL DEFAULT 0"),
+    ("review_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("rating_sum", "INTEGER NOT NULL DEFAULT 0"),
+] + [(f"rating_{level}_count", "INTEGER NOT NULL DEFAULT 0") for level in range(1, 6)]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_products_rating ON products (avg_rating, review_count)",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_product_created ON reviews (product_id, created_at)",
+]
+
+def run_migration():
+    try:
+        with engine.begin() as conn:
+            existing = {column["name"] for column in inspect(conn).get_columns("products")}
+            for name, ddl in NEW_COLUMNS:
+                if name in existing:
+                    print(f"✅ Cột products.{name} đã tồn tại")
+                    continue
+                conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} {ddl}"))
+                print(f"✅ Đã thêm cột products.{name}")
+
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            print("✅ Đã tạo index cho products(avg_rating) và reviews(product_id, created_at)")
+
+        # Import sau khi schema đã được cập nhật
+        from app.services import rating_service
+        db = SessionLocal()
+        try:
+            rating_service.recompute_ratings(db)
+            db.commit()
+        finally:
+            db.close()
+        print("✅ Đã tính lại điểm đánh giá cho tất cả sản phẩm")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho đánh giá sản phẩm...")
+    run_migration()
@@ -0,0 +1,70 @@
+"""
+Migration script: bảng gợi ý sản phẩm theo bệnh
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại và tính gợi ý lần đầu
+
+Gợi ý xếp hạng theo products.rating_sum: nếu migration_ratings.py chưa chạy,
+script sẽ chạy nó trước.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, engine, SessionLocal
+from app.models.product_recommendation import ProductRecommendation
+from app.models.watermark import Watermark
+from app.services.product_search import init_search
+from app.services.recommendation_service import refresh_recommendations
+
+def _ensure_rating_columns() -> bool:
+    """Chạy migration_ratings.py nếu products chưa có các cột đánh giá"""
+    import migration_ratings
+
+    existing = {column["name"] for column in inspect(engine).get_columns("products")}
+    missing = [name for name, _ in migration_ratings.NEW_COLUMNS if name not in existing]
+    if not missing:
+        return True
+    print(f"⚠️ Thiếu cột {', '.join(missing)}, chạy migration_ratings.py trước")
+    return migration_ratings.run_migration()
+
+def run_migration():
+    try:
+        # Tạo bảng product_recommendations và watermarks
+        Base.metadata.create_all(bind=engine)
+        print("✅ Bảng product_recommendations và watermarks đã sẵn sàng")
+
+        # create_all không thêm cột vào bảng products đã có
+        if not _ensure_rating_columns():
+            print("❌ Không thể thêm cột đánh giá cho products")
+            return False
+
+        # Gợi ý dùng chỉ mục full-text để tìm sản phẩm điều trị
+        init_search(engine)
+
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_disease_predictions_user_created "
+                "ON disease_predictions (user_id, created_at)"
+            ))
+        print("✅ Index ix_disease_predictions_user_created đã sẵn sàng")
+
+        db = SessionLocal()
+        try:
+            diseases = refresh_recommendations(db, full=True)
+            print(f"✅ Đã tính gợi ý cho: {', '.join(diseases)}")
+        finally:
+            db.close()
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho gợi ý sản phẩm...")
+    run_migration()
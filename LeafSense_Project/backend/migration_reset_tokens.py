@@ -0,0 +1,39 @@
+"""
+Migration script: index cho password_reset_tokens và dọn token cũ
+Chạy script này để thêm index (user_id, expires_at) và xóa token đã dùng/hết hạn
+"""
+
+import sys
+import os
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine, SessionLocal
+from app.models.users import PasswordResetToken
+from app.services.reset_token_service import purge_tokens
+
+def run_migration():
+    try:
+        with engine.begin() as conn:
+            for index in PasswordResetToken.__table__.indexes:
+                index.create(conn, checkfirst=True)
+                print(f"✅ Index {index.name} đã sẵn sàng")
+
+        db = SessionLocal()
+        try:
+            purged = purge_tokens(db)
+            print(f"✅ Đã xóa {purged} token đã dùng hoặc hết hạn")
+        finally:
+            db.close()
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho token đặt lại mật khẩu...")
+    run_migration()
@@ -0,0 +1,37 @@
+"""
+Migration script: bảng stat_counters (và stat_counter_deltas) cho dashboard admin
+Chạy script này để tạo bảng và khởi tạo bộ đếm từ dữ liệu hiện có
+"""
+
+import sys
+import os
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, engine, SessionLocal
+from app.models.stat_counter import StatCounter, StatCounterDelta
+from app.services.stats_service import reconcile
+
+def run_migration():
+    try:
+        Base.metadata.create_all(bind=engine, tables=[StatCounter.__table__, StatCounterDelta.__table__])
+        print("✅ Bảng stat_counters và stat_counter_deltas đã sẵn sàng")
+
+        db = SessionLocal()
+        try:
+            drift = reconcile(db)
+            print(f"✅ Đã đối soát bộ đếm với dữ liệu hiện có ({len(drift)} bộ đếm được cập nhật)")
+        finally:
+            db.close()
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho thống kê dashboard...")
+    run_migration()
@@ -0,0 +1,47 @@
+"""
+Migration script: thêm các cột thumbnail (ảnh WebP thu nhỏ)
+Chạy script này để cập nhật cơ sở dữ liệu hiện tại
+"""
+
+import sys
+import os
+from sqlalchemy import inspect, text
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import engine
+
+NEW_COLUMNS = {
+    "disease_predictions": [
+        ("image_thumbnail_url", "VARCHAR(500)"),
+        ("highlight_thumbnail_url", "VARCHAR(500)"),
+    ],
+    "products": [("thumbnail_url", "VARCHAR(255)")],
+    "users": [("avatar_thumbnail_url", "VARCHAR(250)")],
+}
+
+def run_migration():
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            for table, columns in NEW_COLUMNS.items():
+                existing = {column["name"] for column in inspector.get_columns(table)}
+                for name, ddl in columns:
+                    if name in existing:
+                        print(f"✅ Cột {table}.{name} đã tồn tại")
+                        continue
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    print(f"✅ Đã thêm cột {table}.{name}")
+
+        print("\n✅ Migration completed successfully!")
+        print("ℹ️  Các bản ghi cũ chưa có thumbnail sẽ dùng ảnh gốc cho đến khi được upload lại")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho thumbnail...")
+    run_migration()
@@ -0,0 +1,29 @@
+"""
+Migration script: bảng token_revocations cho danh sách thu hồi JWT
+Chạy script này để tạo bảng trên cơ sở dữ liệu hiện tại
+"""
+
+import sys
+import os
+
+# Thêm đường dẫn backend vào Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, engine
+from app.models.token_revocation import TokenRevocation
+
+def run_migration():
+    try:
+        Base.metadata.create_all(bind=engine, tables=[TokenRevocation.__table__])
+        print("✅ Bảng token_revocations đã sẵn sàng")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi migration: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("🚀 Bắt đầu migration cho danh sách thu hồi token...")
+    run_migration()
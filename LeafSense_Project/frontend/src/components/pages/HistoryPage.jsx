@@ -55,6 +55,7 @@ const HistoryPage = () => {
       const formattedData = data.history ? data.history.map((item) => ({
         id: item.id,
         image: item.image || '/api/placeholder/60/60',
+        thumbnail: item.thumbnail || item.image || '/api/placeholder/60/60',
         highlight_image: item.highlight_image || null,
         disease: item.disease || 'Unknown',
         confidence: Math.round(item.confidence || 0),
@@ -360,7 +361,7 @@ Generated on: ${new Date().toLocaleString()}
                     <td className="image-cell">
                       <div className="analysis-image">
                         <img 
-                          src={item.image} 
+                          src={item.thumbnail} 
                           alt={`Analysis ${item.id}`}
                           onError={(e) => {
                             e.target.style.display = 'none'
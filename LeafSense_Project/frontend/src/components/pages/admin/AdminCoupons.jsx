@@ -241,6 +241,7 @@ const AdminCoupons = () => {
     
     if (!coupon.is_active || coupon.status === 'inactive') return '#f44336'
     if (now > endDate || coupon.status === 'expired') return '#ff9800'
+    if (coupon.status === 'exhausted') return '#9e9e9e'
     return '#4caf50'
   }
 
@@ -251,6 +252,7 @@ const AdminCoupons = () => {
     
     if (!coupon.is_active || coupon.status === 'inactive') return 'Không hoạt động'
     if (now > endDate || coupon.status === 'expired') return 'Đã hết hạn'
+    if (coupon.status === 'exhausted') return 'Đã hết lượt'
     if (now < startDate) return 'Chưa bắt đầu'
     return 'Đang hoạt động'
   }
@@ -334,6 +336,7 @@ const AdminCoupons = () => {
             <option value="active">Đang hoạt động</option>
             <option value="inactive">Không hoạt động</option>
             <option value="expired">Đã hết hạn</option>
+            <option value="exhausted">Đã hết lượt</option>
           </select>
         </div>
         <button 
@@ -30,6 +30,7 @@ class ShopService {
       if (params.limit) queryParams.append('limit', params.limit);
       if (params.category_id) queryParams.append('category_id', params.category_id);
       if (params.search) queryParams.append('search', params.search);
+      if (params.sort_by) queryParams.append('sort_by', params.sort_by);
 
       const response = await fetch(`${API_BASE_URL}/products?${queryParams}`, {
         method: 'GET',
@@ -106,6 +107,54 @@ class ShopService {
     }
   }
 
+  async getCartSummary() {
+    try {
+      const userId = this.getUserId();
+      if (!userId) throw new Error('User not logged in');
+
+      const response = await fetch(`${API_BASE_URL}/cart/summary?user_id=${userId}`, {
+        method: 'GET',
+        headers: this.getHeaders()
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error fetching cart summary:', error);
+      throw error;
+    }
+  }
+
+  async addManyToCart(items) {
+    try {
+      const userId = this.getUserId();
+      if (!userId) throw new Error('User not logged in');
+
+      const response = await fetch(`${API_BASE_URL}/cart/items/bulk?user_id=${userId}`, {
+        method: 'POST',
+        headers: this.getHeaders(),
+        body: JSON.stringify({
+          items: items.map(({ productId, quantity = 1 }) => ({
+            product_id: productId,
+            quantity: quantity
+          }))
+        })
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error adding items to cart:', error);
+      throw error;
+    }
+  }
+
   async addToCart(productId, quantity = 1) {
     try {
       const userId = this.getUserId();
@@ -302,9 +351,9 @@ class ShopService {
     }
   }
 
-  async getProductReviews(productId) {
+  async getProductReviews(productId, skip = 0, limit = 20) {
     try {
-      const response = await fetch(`${API_BASE_URL}/products/${productId}/reviews`, {
+      const response = await fetch(`${API_BASE_URL}/products/${productId}/reviews?skip=${skip}&limit=${limit}`, {
         method: 'GET',
         headers: this.getHeaders()
       });